@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import bus
 from app.routes.csv_preview import router as csv_preview_router 
@@ -20,7 +21,16 @@ from app.routes import alerts_router
 from app.routes import forecast_router
 from app.routes import route_performance
 from app.routes import route_forecast_api
+from app.routes import historical
+from app.services.historical_crowd_service import refresh_historical_index
+from app.services import tfnsw_bus
+from app.services import trip_updates_service
+from app.services import alerts_service
+from app.services import warmup
+from app.utils import http_client
+from app.utils.geo_cache import ors_cache
 from fastapi.middleware.cors import CORSMiddleware
+import threading
 
 
 app = FastAPI()
@@ -53,7 +63,45 @@ app.include_router(alerts_router.router)
 app.include_router(forecast_router.router)
 app.include_router(route_performance.router)
 app.include_router(route_forecast_api.router)
+app.include_router(historical.router)
+
+@app.on_event("startup")
+def start_historical_index_refresh():
+    # Pick up new or changed dataset files without blocking startup
+    threading.Thread(target=refresh_historical_index, daemon=True).start()
+
+@app.on_event("startup")
+def start_warmup():
+    # GTFS static map, model bundle and dropdown JSON load in parallel; /ready reports progress
+    warmup.start_warmup()
+
+@app.on_event("startup")
+async def start_realtime_pollers():
+    # One upstream fetch per feed per interval, shared by every bus position, trip update and alerts client
+    if tfnsw_bus.TFNSW_API_KEY:
+        tfnsw_bus.vehicle_positions.start()
+        trip_updates_service.trip_updates.start()
+        alerts_service.bus_alerts.start()
+
+@app.on_event("shutdown")
+async def stop_realtime_pollers():
+    await tfnsw_bus.vehicle_positions.stop()
+    await trip_updates_service.trip_updates.stop()
+    await alerts_service.bus_alerts.stop()
+    await http_client.close_client()
+
+@app.on_event("shutdown")
+def close_ors_cache():
+    ors_cache.close()
 
 @app.get("/")
 def root():
     return {"message": "CrowdEase API is running"}
+
+@app.get("/ready")
+def ready():
+    # 503 while warming up, so load balancers hold traffic back; components that
+    # gave up after their retries leave the service ready but "degraded"
+    is_ready, state, components = warmup.get_readiness()
+    return JSONResponse(status_code=200 if is_ready else 503,
+                        content={"ready": is_ready, "status": state, "components": components})
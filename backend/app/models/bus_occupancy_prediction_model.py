@@ -16,6 +16,10 @@ from xgboost import XGBClassifier
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix, ConfusionMatrixDisplay
 from sklearn.preprocessing import LabelEncoder
 from app.utils.setup_data import download_and_unzip_force
+from app.utils.parquet_cache import iter_frames, concat_frames
+from app.models import model_registry
+from app.models.feature_encoder import FeatureEncoder
+from app.models import streaming_training
 
 if os.getenv("RENDER") == "true":
     download_and_unzip_force()
@@ -29,6 +33,7 @@ data_dir = os.path.join(BASE_DIR, "..", "processed_with_route")
 feedback_file = os.path.join(BASE_DIR, "..", "feedback.csv")
 report_dir = os.path.join(model_dir, "..", "model_metrics")
 route_encoder_path = os.path.join(model_dir, "route_label_encoder.pkl")
+feature_encoder_path = os.path.join(model_dir, "feature_encoder.pkl")
 
 # Ensure directories exist
 os.makedirs(model_dir, exist_ok=True)
@@ -36,33 +41,27 @@ os.makedirs(report_dir, exist_ok=True)
 
 
 
+TRAINING_COLUMNS = [
+    "ROUTE", "TIMETABLE_HOUR_BAND", "TRIP_POINT", "TIMETABLE_TIME",
+    "ACTUAL_TIME", "CAPACITY_BUCKET", "CAPACITY_BUCKET_ENCODED"
+]
+
 def load_all_data():
-    all_files = sorted(glob.glob(os.path.join(data_dir, "*.csv")))
     df_list = []
     total_rows = 0
-    for file in all_files:
-        try:
-            df = pd.read_csv(file, dtype=str, usecols=[
-                "ROUTE", "TIMETABLE_HOUR_BAND", "TRIP_POINT", "TIMETABLE_TIME",
-                "ACTUAL_TIME", "CAPACITY_BUCKET", "CAPACITY_BUCKET_ENCODED"
-            ], low_memory=False)
-            total_rows += len(df)
-            df_list.append(df)
-        except Exception as e:
-            print(f"[ERROR] Failed to read {file}: {e}")
+    for file, df in iter_frames("processed_with_route", TRAINING_COLUMNS):
+        total_rows += len(df)
+        df_list.append(df)
     if os.path.exists(feedback_file):
         try:
-            df = pd.read_csv(feedback_file, dtype=str, usecols=[
-                "ROUTE", "TIMETABLE_HOUR_BAND", "TRIP_POINT", "TIMETABLE_TIME",
-                "ACTUAL_TIME", "CAPACITY_BUCKET", "CAPACITY_BUCKET_ENCODED"
-            ], low_memory=False)
+            df = pd.read_csv(feedback_file, dtype=str, usecols=TRAINING_COLUMNS, low_memory=False)
             print(f"[INFO] Loaded feedback file with {len(df):,} rows.")
             df_list.append(df)
         except Exception as e:
             print(f"[ERROR] Failed to read feedback file: {e}")
     if not df_list:
         raise ValueError("No valid data files found to concatenate.")
-    combined_df = pd.concat(df_list, ignore_index=True)
+    combined_df = concat_frames(df_list)
     print(f"[INFO] Loaded total rows before cleaning: {len(combined_df):,}")
     before_drop = len(combined_df)
     combined_df = combined_df[combined_df["ROUTE"].notna() & (combined_df["ROUTE"] != "N/A") & (combined_df["ROUTE"] != "")]
@@ -72,21 +71,32 @@ def load_all_data():
 
 def prepare_features(df):
     df = df.copy()
+    # Categorical columns from the Parquet cache need 'Unknown' registered before fillna
+    for col in df.select_dtypes("category").columns:
+        if "Unknown" not in df[col].cat.categories:
+            df[col] = df[col].cat.add_categories("Unknown")
     df.fillna("Unknown", inplace=True)
     df["CAPACITY_BUCKET_ENCODED"] = pd.to_numeric(df["CAPACITY_BUCKET_ENCODED"], errors="coerce")
     df.dropna(subset=["CAPACITY_BUCKET_ENCODED"], inplace=True)
     le_route = LabelEncoder()
-    df["ROUTE_ENCODED"] = le_route.fit_transform(df["ROUTE"])
-    joblib.dump(le_route, route_encoder_path)
-    df = pd.get_dummies(df, columns=["TRIP_POINT", "TIMETABLE_HOUR_BAND"])
-    X = df.drop(columns=["CAPACITY_BUCKET", "CAPACITY_BUCKET_ENCODED", "ROUTE", "TIMETABLE_TIME", "ACTUAL_TIME"])
+    # Reserve a code for 'Unknown' so unseen routes at inference never touch the encoder
+    le_route.fit(np.append(df["ROUTE"].unique(), model_registry.UNKNOWN_ROUTE))
+    route_codes = le_route.transform(df["ROUTE"])
+    encoder = FeatureEncoder.fit(df)
+    X = encoder.encode_frame(df, route_codes)
     y = df["CAPACITY_BUCKET_ENCODED"].astype(int)
-    return X, y
+    return X, y, le_route, encoder
+
+def train_models(out_of_core=None):
+    # TRAINING_MODE=out_of_core selects the memory-bounded path for the full dataset
+    if out_of_core is None:
+        out_of_core = os.getenv("TRAINING_MODE") == "out_of_core"
+    if out_of_core:
+        return train_models_out_of_core()
 
-def train_models():
     df = load_all_data()
     print(f"[INFO] Training on full dataset: {len(df):,} rows")
-    X, y = prepare_features(df)
+    X, y, route_encoder, feature_encoder = prepare_features(df)
     print("[INFO] Class distribution:\n", y.value_counts())
 
     X_temp, X_test, y_temp, y_test = train_test_split(X, y, test_size=0.15, stratify=y, random_state=42)
@@ -123,6 +133,38 @@ def train_models():
             best_name = name
             best_preds = y_pred
 
+    save_training_results(best_model, best_name, metrics, train_times, X_train.columns.tolist(), y_val, best_preds,
+                          route_encoder, feature_encoder)
+
+def train_models_out_of_core():
+    """Train XGBoost on category codes streamed into a compact matrix, without loading the data as frames."""
+    sources = streaming_training.training_sources(data_dir, feedback_file)
+    dataset = streaming_training.build_coded_dataset(sources, model_registry.UNKNOWN_ROUTE)
+    print(f"[INFO] Training on full dataset: {len(dataset):,} rows (out-of-core)")
+    counts = np.bincount(dataset.labels, minlength=len(dataset.classes))
+    print("[INFO] Class distribution:\n", pd.Series(counts, index=dataset.classes))
+
+    train_index, val_index, _ = streaming_training.split_indices(dataset.labels)
+
+    name = "XGBoost"
+    print(f"[INFO] Training {name} on {len(train_index):,} rows...")
+    start_time = time.time()
+    model = streaming_training.train_booster(dataset, train_index, val_index, cache_dir=model_dir)
+    y_pred = streaming_training.predict_indices(model, dataset, val_index)
+    elapsed_time = time.time() - start_time
+
+    y_val = dataset.classes[dataset.labels[val_index]]
+    metrics = {name: {
+        "accuracy": accuracy_score(y_val, y_pred),
+        "precision": precision_score(y_val, y_pred, average="weighted", zero_division=0),
+        "recall": recall_score(y_val, y_pred, average="weighted", zero_division=0),
+        "f1": f1_score(y_val, y_pred, average="weighted", zero_division=0)
+    }}
+    save_training_results(model, name, metrics, {name: elapsed_time}, dataset.feature_encoder.feature_columns,
+                          y_val, y_pred, dataset.route_encoder, dataset.feature_encoder)
+
+def save_training_results(best_model, best_name, metrics, train_times, feature_columns, y_val, best_preds,
+                          route_encoder, feature_encoder):
     all_metrics_path = os.path.join(report_dir, "all_models_metrics.txt")
     with open(all_metrics_path, "w") as f:
         f.write(f"Model Comparison Report ({datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')})\n")
@@ -138,8 +180,12 @@ def train_models():
             print(line)
             f.write(line)
 
+    # All artifacts of one model are written before model_version.txt, which
+    # the registry watches, so a reload never pairs a new model with old encoders
     joblib.dump(best_model, os.path.join(model_dir, "best_model.pkl"))
-    joblib.dump(X_train.columns.tolist(), os.path.join(model_dir, "feature_columns.pkl"))
+    joblib.dump(feature_columns, os.path.join(model_dir, "feature_columns.pkl"))
+    joblib.dump(route_encoder, route_encoder_path)
+    joblib.dump(feature_encoder, feature_encoder_path)
     with open("new_model_flag.txt", "w") as f:
         f.write("new model ready")
 
@@ -155,6 +201,9 @@ def train_models():
         f.write(f"Recall: {metrics[best_name]['recall']:.4f}\n")
         f.write(f"F1 Score: {metrics[best_name]['f1']:.4f}\n")
 
+    # Swap the freshly written artifacts into the in-process registry
+    model_registry.refresh()
+
     for metric in ["accuracy", "precision", "recall", "f1"]:
         labels = list(metrics.keys())
         values = [metrics[m][metric] for m in labels]
@@ -173,32 +222,43 @@ def train_models():
     plt.close()
 
 def predict(input_dict):
-    model_path = os.path.join(model_dir, "best_model.pkl")
-    feature_path = os.path.join(model_dir, "feature_columns.pkl")
-    if not os.path.exists(model_path):
-        raise FileNotFoundError("No trained model found.")
-    if not os.path.exists(feature_path):
-        raise FileNotFoundError("Feature columns file not found.")
-    if not os.path.exists(route_encoder_path):
-        raise FileNotFoundError("Route encoder file not found.")
-
-    model = joblib.load(model_path)
-    feature_columns = joblib.load(feature_path)
-    le_route = joblib.load(route_encoder_path)
-
-    input_df = pd.DataFrame([input_dict])
-    input_df.fillna("Unknown", inplace=True)
-    route = input_df["ROUTE"].iloc[0]
-    if route not in le_route.classes_:
-        print(f"[WARNING] Unseen route: {route}. Mapping to 'Unknown'.")
-        le_route.classes_ = np.append(le_route.classes_, "Unknown")
-        input_df["ROUTE"] = "Unknown"
-
-    input_df["ROUTE_ENCODED"] = le_route.transform(input_df["ROUTE"])
-    input_df = pd.get_dummies(input_df)
-    input_df = input_df.reindex(columns=feature_columns, fill_value=0)
-    prediction = model.predict(input_df)[0]
-    return int(prediction)
+    return predict_batch([input_dict])[0]
+
+def predict_batch(rows):
+    if not rows:
+        return []
+    bundle = model_registry.get_model_bundle()
+    model = bundle.model
+
+    routes = [row.get("ROUTE") for row in rows]
+    routes = [model_registry.UNKNOWN_ROUTE if route is None else route for route in routes]
+    route_codes, unseen_routes = bundle.encode_routes(routes)
+    if unseen_routes:
+        model_registry.record_unseen_routes(len(unseen_routes))
+        print(f"[WARNING] Unseen route(s): {sorted(set(unseen_routes))[:10]}. Mapping to 'Unknown'.")
+
+    encoder = bundle.feature_encoder
+    features = encoder.to_frame(encoder.encode_rows(rows, route_codes))
+    predictions = model.predict(features)
+    return [int(p) for p in predictions]
+
+def predict_each(rows, default=None):
+    """predict_batch(rows), falling back to row-by-row predictions when the batch fails.
+
+    Rows that fail on their own get default, so one bad input no longer
+    costs the predictions for the whole batch.
+    """
+    try:
+        return predict_batch(rows)
+    except Exception as e:
+        print(f"[WARNING] Batch prediction failed ({e}); predicting {len(rows)} rows one by one.")
+    predictions = []
+    for row in rows:
+        try:
+            predictions.append(predict(row))
+        except Exception:
+            predictions.append(default)
+    return predictions
 
 def append_feedback(feedback_row):
     columns = ["ROUTE", "TIMETABLE_HOUR_BAND", "TRIP_POINT", "TIMETABLE_TIME", "ACTUAL_TIME", "CAPACITY_BUCKET", "CAPACITY_BUCKET_ENCODED"]
@@ -1,6 +1,12 @@
 import os
+import time
+import shutil
+import argparse
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
+from app.models.route_lookup_index import load_index
+from app.utils.file_manifest import scan_csv_files, file_hash, load_manifest, save_manifest
 
 # === CONFIG ===
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
@@ -8,60 +14,172 @@ LOOKUP_PATH = os.path.join(BASE_DIR, "lookup_route_mapping.csv")
 DATASET_FOLDER = os.path.join(BASE_DIR, "datasets")
 OUTPUT_FOLDER = os.path.join(BASE_DIR, "processed_with_route")
 UNMATCHED_LOG_PATH = os.path.join(OUTPUT_FOLDER, "unmatched_route_log.txt")
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+# Per-file unmatched logs, concatenated into UNMATCHED_LOG_PATH after each run
+UNMATCHED_FOLDER = os.path.join(OUTPUT_FOLDER, "unmatched")
+MANIFEST_PATH = os.path.join(OUTPUT_FOLDER, "route_mapping_manifest.json")
+SUMMARY_PATH = os.path.join(OUTPUT_FOLDER, "route_mapping_summary.json")
+UNMATCHED_COLUMNS = ["TRANSIT_STOP", "TIMETABLE_TIME", "dataset_route_id"]
+CHUNK_SIZE = int(os.getenv("ROUTE_MAPPER_CHUNK_SIZE", "250000"))
 
-def encode_capacity_bucket(value):
-    return {
-        "MANY_SEATS_AVAILABLE": 0,
-        "FEW_SEATS_AVAILABLE": 1,
-        "STANDING_ROOM_ONLY": 2,
-        "CRUSH_CAPACITY": 3
-    }.get(value, -1)
-
-print(" Loading route lookup...")
-lookup_df = pd.read_csv(LOOKUP_PATH, dtype=str)
+CAPACITY_BUCKET_CODES = {
+    "MANY_SEATS_AVAILABLE": 0,
+    "FEW_SEATS_AVAILABLE": 1,
+    "STANDING_ROOM_ONLY": 2,
+    "CRUSH_CAPACITY": 3
+}
 
-print(f"\n Scanning dataset folder: {DATASET_FOLDER}")
-csv_files = [f for f in os.listdir(DATASET_FOLDER) if f.endswith(".csv")]
 
-# === STATS TRACKERS ===
-total_rows, total_matched = 0, 0
-unmatched_records = []
+def encode_capacity_bucket(value):
+    return CAPACITY_BUCKET_CODES.get(value, -1)
 
-for file_name in tqdm(csv_files, desc=" Files"):
-    input_path = os.path.join(DATASET_FOLDER, file_name)
-    output_path = os.path.join(OUTPUT_FOLDER, file_name)
-    df = pd.read_csv(input_path, dtype=str)
 
+def map_chunk(df, index):
+    """Swap the dataset ROUTE for the looked-up GTFS route, keeping the old column layout."""
     df["dataset_route_id"] = df["ROUTE"]  # Backup original
     df = df.drop(columns=["ROUTE"], errors="ignore")
 
-    df = df.merge(lookup_df, on=["TRANSIT_STOP", "TIMETABLE_TIME"], how="left")
+    route_codes = index.lookup(df["TRANSIT_STOP"], df["TIMETABLE_TIME"])
+    df["ROUTE"], df["matched_route_name"] = index.route_columns(route_codes)
 
-    # Rename columns
-    df = df.rename(columns={
-        "ROUTE_y": "ROUTE"
-    })
+    df["CAPACITY_BUCKET_ENCODED"] = df["CAPACITY_BUCKET"].map(CAPACITY_BUCKET_CODES).fillna(-1).astype(int)
+    return df, route_codes >= 0
+
+
+def map_file(input_path, output_path, unmatched_path, index):
+    """Stream one dataset through the lookup; returns (rows, matched rows).
+
+    Output and the file's unmatched log are written to temp files and renamed
+    into place, so a failed run never leaves a partial file behind.
+    """
+    rows, matched_rows = 0, 0
+    tmp_paths = [output_path + ".tmp", unmatched_path + ".tmp"]
+    try:
+        with open(tmp_paths[0], "w", newline="") as out, open(tmp_paths[1], "w", newline="") as unmatched_out:
+            for chunk_num, chunk in enumerate(pd.read_csv(input_path, dtype=str, chunksize=CHUNK_SIZE)):
+                df, matched = map_chunk(chunk, index)
+                df.to_csv(out, index=False, header=chunk_num == 0)
+
+                unmatched = df.loc[~matched, UNMATCHED_COLUMNS]
+                unmatched.to_csv(unmatched_out, index=False, header=chunk_num == 0)
+                rows += len(df)
+                matched_rows += int(np.count_nonzero(matched))
+        os.replace(tmp_paths[0], output_path)
+        os.replace(tmp_paths[1], unmatched_path)
+    finally:
+        for tmp_path in tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return rows, matched_rows
+
+
+def _combine_unmatched_logs(file_names):
+    # Concatenate the per-file logs block by block, keeping a single header
+    with open(UNMATCHED_LOG_PATH + ".tmp", "wb") as out:
+        out.write((",".join(UNMATCHED_COLUMNS) + "\n").encode())
+        for file_name in file_names:
+            path = os.path.join(UNMATCHED_FOLDER, file_name)
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                f.readline()
+                shutil.copyfileobj(f, out)
+    os.replace(UNMATCHED_LOG_PATH + ".tmp", UNMATCHED_LOG_PATH)
 
-    df["CAPACITY_BUCKET_ENCODED"] = df["CAPACITY_BUCKET"].apply(encode_capacity_bucket)
 
-    # Track stats
-    total_rows += len(df)
-    matched = df["ROUTE"].notna().sum()
-    total_matched += matched
+def _match_rate(rows, matched):
+    return round(matched / rows * 100, 2) if rows else 0
 
-    unmatched = df[df["ROUTE"].isna()][["TRANSIT_STOP", "TIMETABLE_TIME", "dataset_route_id"]]
-    unmatched_records.append(unmatched)
 
-    df.to_csv(output_path, index=False)
+def _unchanged(entry, input_path, signature, lookup_version):
+    """True if input_path was mapped with this lookup and its content is the same."""
+    if not entry or entry.get("lookup_version") != lookup_version:
+        return False
+    if entry.get("input") == signature:
+        return True
+    # Touched but possibly identical: fall back to the content hash
+    return entry.get("input_hash") == file_hash(input_path)
+
+
+def main(full=False):
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    os.makedirs(UNMATCHED_FOLDER, exist_ok=True)
+    print(" Loading route lookup...")
+    index = load_index(LOOKUP_PATH)
+
+    print(f"\n Scanning dataset folder: {DATASET_FOLDER}")
+    current = scan_csv_files(DATASET_FOLDER)
+    manifest = {} if full else load_manifest(MANIFEST_PATH)
+    run_start = time.time()
+    summary_files = {}
+
+    for file_name in tqdm(current, desc=" Files"):
+        input_path = os.path.join(DATASET_FOLDER, file_name)
+        output_path = os.path.join(OUTPUT_FOLDER, file_name)
+        entry = manifest.get(file_name)
+        if os.path.exists(output_path) and _unchanged(entry, input_path, current[file_name], index.version):
+            entry["input"] = current[file_name]
+            summary_files[file_name] = {**entry["stats"], "status": "skipped"}
+            continue
+
+        start_time = time.time()
+        try:
+            rows, matched = map_file(input_path, output_path, os.path.join(UNMATCHED_FOLDER, file_name), index)
+        except Exception as e:
+            print(f" Failed to map {file_name}: {e}")
+            manifest.pop(file_name, None)
+            summary_files[file_name] = {"status": "failed", "error": str(e)}
+            continue
+
+        stats = {
+            "rows": rows,
+            "matched": matched,
+            "match_rate": _match_rate(rows, matched),
+            "seconds": round(time.time() - start_time, 2)
+        }
+        manifest[file_name] = {
+            "input": current[file_name],
+            "input_hash": file_hash(input_path),
+            "lookup_version": index.version,
+            "stats": stats
+        }
+        # Saved after every file so an interrupted run resumes where it stopped
+        save_manifest(MANIFEST_PATH, manifest)
+        summary_files[file_name] = {**stats, "status": "mapped"}
+
+    for file_name in [name for name in manifest if name not in current]:
+        del manifest[file_name]
+        stale_log = os.path.join(UNMATCHED_FOLDER, file_name)
+        if os.path.exists(stale_log):
+            os.remove(stale_log)
+    save_manifest(MANIFEST_PATH, manifest)
+    _combine_unmatched_logs(manifest)
+
+    # === FINAL SUMMARY ===
+    total_rows = sum(f.get("rows", 0) for f in summary_files.values())
+    total_matched = sum(f.get("matched", 0) for f in summary_files.values())
+    save_manifest(SUMMARY_PATH, {
+        "lookup_version": index.version,
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seconds": round(time.time() - run_start, 2),
+        "rows": total_rows,
+        "matched": total_matched,
+        "match_rate": _match_rate(total_rows, total_matched),
+        "files": summary_files
+    })
+
+    statuses = [f["status"] for f in summary_files.values()]
+    print(f"\n Summary:")
+    print(f"    Files          : {statuses.count('mapped')} mapped, {statuses.count('skipped')} unchanged, "
+          f"{statuses.count('failed')} failed")
+    print(f"    Matched rows   : {total_matched:,}")
+    print(f"    Unmatched rows : {total_rows - total_matched:,}")
+    print(f"    Match rate     : {_match_rate(total_rows, total_matched):.2f}%")
+    print(f"    Log saved to   : {UNMATCHED_LOG_PATH}")
+    print(f"    Run summary    : {SUMMARY_PATH}")
 
-# === FINAL SUMMARY ===
-unmatched_df = pd.concat(unmatched_records, ignore_index=True)
-unmatched_df.to_csv(UNMATCHED_LOG_PATH, index=False)
 
-match_pct = (total_matched / total_rows) * 100 if total_rows else 0
-print(f"\n Summary:")
-print(f"    Matched rows   : {total_matched:,}")
-print(f"    Unmatched rows : {total_rows - total_matched:,}")
-print(f"    Match rate     : {match_pct:.2f}%")
-print(f"    Log saved to   : {UNMATCHED_LOG_PATH}")
+if __name__ == "__main__":
+    # Usage: python -m app.models.fast_route_mapper [--full]
+    parser = argparse.ArgumentParser(description="Map dataset rows to GTFS routes via the lookup index")
+    parser.add_argument("--full", action="store_true", help="remap every file, ignoring the manifest")
+    main(full=parser.parse_args().full)
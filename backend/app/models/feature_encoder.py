@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+ROUTE_FEATURE = "ROUTE_ENCODED"
+CATEGORICAL_COLUMNS = ["TRIP_POINT", "TIMETABLE_HOUR_BAND"]
+
+
+def _fill_unknown(value):
+    # Mirrors fillna("Unknown") for missing values in a raw input dict
+    if value is None or value != value:
+        return "Unknown"
+    return value
+
+
+class FeatureEncoder:
+    """Feature schema shared by training and inference.
+
+    The default "one_hot" layout matches prepare_features: each
+    TRIP_POINT / TIMETABLE_HOUR_BAND value is mapped straight to its column
+    position, so encoding a row is a couple of dict lookups into a
+    preallocated NumPy array instead of pd.get_dummies + reindex.
+
+    The "ordinal" layout (see ordinal()) has one column per feature holding
+    the category code, for models trained on categorical features directly;
+    values not seen in training encode as NaN.
+    """
+
+    # Class default so encoders pickled before layouts existed stay one-hot
+    layout = "one_hot"
+
+    def __init__(self, feature_columns):
+        self.feature_columns = list(feature_columns)
+        self.route_position = self.feature_columns.index(ROUTE_FEATURE)
+        self.category_positions = {col: {} for col in CATEGORICAL_COLUMNS}
+        for position, name in enumerate(self.feature_columns):
+            for col in CATEGORICAL_COLUMNS:
+                prefix = f"{col}_"
+                if name.startswith(prefix):
+                    self.category_positions[col][name[len(prefix):]] = position
+                    break
+
+    @classmethod
+    def ordinal(cls, categories):
+        """Ordinal encoder from {column: [values in code order]} for CATEGORICAL_COLUMNS."""
+        encoder = cls([ROUTE_FEATURE] + CATEGORICAL_COLUMNS)
+        encoder.layout = "ordinal"
+        # In this layout the dicts map a value to its category code, not a column position
+        encoder.category_positions = {
+            col: {value: code for code, value in enumerate(categories[col])} for col in CATEGORICAL_COLUMNS
+        }
+        return encoder
+
+    @classmethod
+    def fit(cls, df):
+        # Same column order pd.get_dummies produced: route code, then sorted dummies per column
+        columns = [ROUTE_FEATURE]
+        for col in CATEGORICAL_COLUMNS:
+            values = sorted(df[col].astype(str).unique())
+            columns.extend(f"{col}_{value}" for value in values)
+        return cls(columns)
+
+    @property
+    def n_features(self):
+        return len(self.feature_columns)
+
+    def encode_rows(self, rows, route_codes):
+        """Encode a list of input dicts into a dense (n_rows, n_features) matrix."""
+        if self.layout == "ordinal":
+            matrix = np.empty((len(rows), self.n_features), dtype=np.float32)
+            matrix[:, self.route_position] = route_codes
+            for col in CATEGORICAL_COLUMNS:
+                codes = self.category_positions[col]
+                position = self.feature_columns.index(col)
+                for i, row in enumerate(rows):
+                    matrix[i, position] = codes.get(_fill_unknown(row.get(col)), np.nan)
+            return matrix
+
+        matrix = np.zeros((len(rows), self.n_features), dtype=np.float32)
+        matrix[:, self.route_position] = route_codes
+        trip_positions = self.category_positions["TRIP_POINT"]
+        band_positions = self.category_positions["TIMETABLE_HOUR_BAND"]
+        for i, row in enumerate(rows):
+            position = trip_positions.get(_fill_unknown(row.get("TRIP_POINT")))
+            if position is not None:
+                matrix[i, position] = 1
+            position = band_positions.get(_fill_unknown(row.get("TIMETABLE_HOUR_BAND")))
+            if position is not None:
+                matrix[i, position] = 1
+        return matrix
+
+    def encode_frame(self, df, route_codes):
+        """Vectorized encoding of a whole DataFrame into the training frame.
+
+        One-hot columns are uint8 (a byte per cell, like get_dummies' bools)
+        and the route code keeps its integer dtype, so the full dataset is not
+        held as float32. Inference goes through encode_rows instead.
+        """
+        if self.layout == "ordinal":
+            matrix = np.empty((len(df), self.n_features), dtype=np.float32)
+            matrix[:, self.route_position] = route_codes
+            for col in CATEGORICAL_COLUMNS:
+                codes = pd.Categorical(df[col].astype(str), categories=list(self.category_positions[col])).codes
+                matrix[:, self.feature_columns.index(col)] = np.where(codes >= 0, codes, np.nan)
+            return self.to_frame(matrix, index=df.index)
+
+        # Dummy columns without the route column, which is inserted afterwards
+        dummy_columns = [name for name in self.feature_columns if name != ROUTE_FEATURE]
+        matrix = np.zeros((len(df), len(dummy_columns)), dtype=np.uint8)
+        for col in CATEGORICAL_COLUMNS:
+            positions = self.category_positions[col]
+            if not positions:
+                continue
+            lookup = np.fromiter(positions.values(), dtype=np.intp, count=len(positions))
+            lookup -= lookup > self.route_position
+            codes = pd.Categorical(df[col].astype(str), categories=list(positions)).codes
+            rows = np.flatnonzero(codes >= 0)
+            matrix[rows, lookup[codes[rows]]] = 1
+        frame = pd.DataFrame(matrix, columns=dummy_columns, index=df.index, copy=False)
+        frame.insert(self.route_position, ROUTE_FEATURE, np.asarray(route_codes))
+        return frame
+
+    def to_frame(self, matrix, index=None):
+        # For encode_rows output. Models were fitted on a DataFrame, so keep the column names they expect
+        return pd.DataFrame(matrix, columns=self.feature_columns, index=index, copy=False)
@@ -1,7 +1,12 @@
 import os
+import time
+import argparse
+import tempfile
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from app.utils.streaming_aggregator import map_files
 
 # === CONFIG ===
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
@@ -10,21 +15,28 @@ DATASET_FOLDER = os.path.join(BASE_DIR, "datasets")
 LOOKUP_OUTPUT_PATH = os.path.join(BASE_DIR, "lookup_route_mapping.csv")
 TIME_TOLERANCE = 3
 
-print(f" Loading GTFS files from: {GTFS_FOLDER}")
-stop_times_df = pd.read_csv(os.path.join(GTFS_FOLDER, "stop_times.txt"), low_memory=False)
-trips_df = pd.read_csv(os.path.join(GTFS_FOLDER, "trips.txt"), low_memory=False)
-routes_df = pd.read_csv(os.path.join(GTFS_FOLDER, "routes.txt"), low_memory=False)
+# Matching rules (unchanged from the row-by-row matcher):
+# 1. departures at the stop within +/- TIME_TOLERANCE minutes of the timetabled
+#    time -> the one with the lowest stop_sequence;
+# 2. otherwise the departure with the smallest absolute time difference.
+# Ties go to the row that comes first in stop_times.txt.
 
-trip_to_route = trips_df.set_index("trip_id")["route_id"].to_dict()
-route_to_name = routes_df.set_index("route_id")["route_long_name"].to_dict()
 
-stop_times_df["departure_minutes"] = stop_times_df["departure_time"].str.split(":").apply(
-    lambda x: int(x[0]) * 60 + int(x[1]) if len(x) >= 2 and x[0].isdigit() else -1
-)
-stop_times_df["stop_sequence"] = pd.to_numeric(stop_times_df["stop_sequence"], errors="coerce")
-stop_times_df.dropna(subset=["stop_sequence"], inplace=True)
+def load_gtfs(gtfs_folder=GTFS_FOLDER):
+    print(f" Loading GTFS files from: {gtfs_folder}")
+    stop_times_df = pd.read_csv(
+        os.path.join(gtfs_folder, "stop_times.txt"),
+        usecols=["trip_id", "stop_id", "departure_time", "stop_sequence"],
+        dtype={"trip_id": str, "stop_id": str, "departure_time": str},
+        low_memory=False
+    )
+    trips_df = pd.read_csv(os.path.join(gtfs_folder, "trips.txt"), dtype={"trip_id": str}, low_memory=False)
+    routes_df = pd.read_csv(os.path.join(gtfs_folder, "routes.txt"), low_memory=False)
+
+    trip_to_route = trips_df.set_index("trip_id")["route_id"].to_dict()
+    route_to_name = routes_df.set_index("route_id")["route_long_name"].to_dict()
+    return stop_times_df, trip_to_route, route_to_name
 
-stop_times_dict = {stop_id: group.copy() for stop_id, group in stop_times_df.groupby("stop_id")}
 
 def time_to_minutes(t):
     try:
@@ -33,47 +45,260 @@ def time_to_minutes(t):
     except:
         return None
 
-def match_route(stop_id, timetable_time):
-    target_min = time_to_minutes(timetable_time)
-    group = stop_times_dict.get(str(stop_id))
-    if target_min is None or group is None or group.empty:
-        return pd.Series([None, None])
-    try:
-        candidates = group[
-            (group["departure_minutes"] >= target_min - TIME_TOLERANCE) &
-            (group["departure_minutes"] <= target_min + TIME_TOLERANCE)
-        ]
-        if not candidates.empty:
-            closest_row = candidates.loc[candidates["stop_sequence"].idxmin()]
-        else:
-            group["abs_diff"] = (group["departure_minutes"] - target_min).abs()
-            closest_row = group.loc[group["abs_diff"].idxmin()]
-        trip_id = closest_row["trip_id"]
-        route_id = trip_to_route.get(trip_id)
-        route_name = route_to_name.get(route_id)
-        return pd.Series([route_id, route_name])
-    except:
-        return pd.Series([None, None])
-
-# === Collect Unique Pairs ===
-print(" Collecting unique (TRANSIT_STOP, TIMETABLE_TIME) pairs...")
-unique_keys = set()
-for file in tqdm(os.listdir(DATASET_FOLDER), desc="Scanning"):
-    if file.endswith(".csv"):
-        df = pd.read_csv(os.path.join(DATASET_FOLDER, file), usecols=["TRANSIT_STOP", "TIMETABLE_TIME"], dtype=str)
-        unique_keys.update(tuple(x) for x in df.dropna().drop_duplicates().to_numpy())
-
-print(f" Total unique keys: {len(unique_keys):,}")
-
-# === Match all unique pairs ===
-print(" Matching routes...")
-keys_df = pd.DataFrame(list(unique_keys), columns=["TRANSIT_STOP", "TIMETABLE_TIME"])
-matched_df = keys_df.copy()
-matched_df[["ROUTE", "matched_route_name"]] = keys_df.apply(
-    lambda row: match_route(row["TRANSIT_STOP"], row["TIMETABLE_TIME"]),
-    axis=1
-)
-
-# === Save Lookup ===
-matched_df.to_csv(LOOKUP_OUTPUT_PATH, index=False)
-print(f"\n Lookup saved to: {LOOKUP_OUTPUT_PATH}")
+
+def departure_minutes(departure_time):
+    """GTFS departure_time -> minutes; -1 when the hour is not numeric."""
+    parts = departure_time.astype(str).str.split(":", n=2, expand=True)
+    if parts.shape[1] < 2:
+        return np.full(len(departure_time), -1, dtype=np.int64)
+    hours = pd.to_numeric(parts[0].where(parts[0].str.isdigit()), errors="coerce")
+    minutes = pd.to_numeric(parts[1], errors="coerce")
+    total = hours * 60 + minutes
+    return total.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def timetable_minutes(timetable_time):
+    """Vectorized time_to_minutes: NaN where the first two fields are not integers."""
+    parts = timetable_time.astype(str).str.extract(r"^\s*(\d+)\s*:\s*(\d+)\s*(?::|$)")
+    return (pd.to_numeric(parts[0]) * 60 + pd.to_numeric(parts[1])).to_numpy(dtype=float)
+
+
+def build_stop_departures(stop_times_df, shards=1):
+    """Sort every stop's departures once into flat NumPy arrays.
+
+    Rows are ordered by (stop, departure minute, original row), so each stop
+    is a contiguous block and every departure minute a contiguous run inside
+    it; `key` is the composite stop_code * span + shifted minute used by
+    searchsorted. Stop codes are numbered shard by shard (stop_id hash modulo
+    `shards`), so each shard is also one contiguous slice, given by
+    shard_bounds.
+    """
+    stop_times_df = stop_times_df.copy()
+    stop_times_df["departure_minutes"] = departure_minutes(stop_times_df["departure_time"])
+    stop_times_df["stop_sequence"] = pd.to_numeric(stop_times_df["stop_sequence"], errors="coerce")
+    stop_times_df = stop_times_df.dropna(subset=["stop_sequence", "stop_id"]).reset_index(drop=True)
+
+    stop_codes, stop_ids = pd.factorize(stop_times_df["stop_id"])
+    stop_shard = stop_shards(stop_ids, shards)
+    shard_order = np.lexsort((np.arange(len(stop_ids)), stop_shard))
+    renumber = np.empty(len(stop_ids), dtype=np.int64)
+    renumber[shard_order] = np.arange(len(stop_ids))
+    stop_codes = renumber[stop_codes]
+    stop_ids = stop_ids[shard_order]
+
+    trip_codes, trip_ids = pd.factorize(stop_times_df["trip_id"])
+    minutes = stop_times_df["departure_minutes"].to_numpy()
+    sequence = stop_times_df["stop_sequence"].to_numpy()
+    position = np.arange(len(stop_times_df))
+
+    # Targets are clipped to [lowest - TOLERANCE - 1, highest + TOLERANCE + 1], so
+    # every +/- TOLERANCE window fits inside its stop's block of `span` keys
+    lowest = int(minutes.min()) if len(minutes) else 0
+    highest = int(minutes.max()) if len(minutes) else 0
+    offset = lowest - 2 * TIME_TOLERANCE - 1
+    span = highest + 2 * TIME_TOLERANCE + 2 - offset
+
+    order = np.lexsort((position, minutes, stop_codes))
+    # Rank of every row by (stop_sequence, original row)
+    rank = np.empty(len(position), dtype=np.int64)
+    rank[np.lexsort((position, sequence))] = np.arange(len(position))
+
+    key = stop_codes[order].astype(np.int64) * span + (minutes[order] - offset)
+    first_code = np.searchsorted(stop_shard[shard_order], np.arange(shards + 1))
+    return {
+        "stop_ids": pd.Index(stop_ids),
+        "trip_ids": np.asarray(trip_ids, dtype=object),
+        "key": key,
+        "minutes": minutes[order],
+        "position": position[order],
+        "sequence_rank": rank[order],
+        "trip_code": trip_codes[order].astype(np.int32),
+        "shard_codes": first_code,
+        "shard_bounds": np.searchsorted(key, first_code.astype(np.int64) * span),
+        "offset": offset,
+        "span": span,
+        "lowest": lowest,
+        "highest": highest,
+    }
+
+
+def stop_shards(stop_ids, shards):
+    """Stable shard number of every stop_id, independent of process and run."""
+    hashes = pd.util.hash_array(np.asarray(stop_ids, dtype=object))
+    return (hashes % np.uint64(max(shards, 1))).astype(np.int64)
+
+
+def match_keys(codes, targets, departures):
+    """Index into departures' sorted rows of the matched departure, -1 if none.
+
+    departures may be any slice of the sorted arrays that holds whole stops;
+    codes are stop codes (-1 for unknown stops), targets timetable minutes.
+    """
+    valid = (codes >= 0) & ~np.isnan(targets)
+    result = np.full(len(codes), -1, dtype=np.int64)
+    if not valid.any():
+        return result
+
+    key = departures["key"]
+    offset, span = departures["offset"], departures["span"]
+    codes = codes[valid].astype(np.int64)
+    # Clipping keeps targets inside their stop's key range without changing which departure is nearest
+    target = np.clip(targets[valid], departures["lowest"] - TIME_TOLERANCE - 1,
+                     departures["highest"] + TIME_TOLERANCE + 1).astype(np.int64)
+    base = codes * span
+    lo = np.searchsorted(key, base + (target - TIME_TOLERANCE - offset), side="left")
+    hi = np.searchsorted(key, base + (target + TIME_TOLERANCE - offset), side="right")
+    matched = np.full(len(codes), -1, dtype=np.int64)
+
+    # Rule 1: lowest stop_sequence inside the window
+    in_window = hi > lo
+    if in_window.any():
+        sequence_rank = np.asarray(departures["sequence_rank"])
+        ranks = np.append(sequence_rank, np.iinfo(np.int64).max)
+        bounds = np.column_stack((lo[in_window], hi[in_window])).ravel()
+        best_rank = np.minimum.reduceat(ranks, bounds)[::2]
+        # Ranks are unique, so find the row that holds each winning rank
+        by_rank = np.argsort(sequence_rank, kind="stable")
+        matched[in_window] = by_rank[np.searchsorted(sequence_rank[by_rank], best_rank)]
+
+    # Rule 2: nearest departure at the stop; lo == hi is where the target would be inserted
+    nearest = ~in_window
+    if nearest.any():
+        at = lo[nearest]
+        stop_start = np.searchsorted(key, base[nearest], side="left")
+        stop_end = np.searchsorted(key, base[nearest] + span, side="left")
+        minute = target[nearest]
+
+        has_below = at > stop_start
+        below = np.where(has_below, at - 1, 0)
+        # First row (in original order) with that departure minute
+        below = np.where(has_below, np.searchsorted(key, key[below], side="left"), -1)
+        has_above = at < stop_end
+        above = np.where(has_above, at, -1)
+
+        minutes, position = departures["minutes"], departures["position"]
+        below_diff = np.where(has_below, minute - minutes[below], np.inf)
+        above_diff = np.where(has_above, minutes[above] - minute, np.inf)
+        pick_above = (above_diff < below_diff) | (
+            (above_diff == below_diff) & has_above & (position[above] < position[below])
+        )
+        matched[nearest] = np.where(pick_above, above, below)
+
+    result[np.flatnonzero(valid)] = matched
+    return result
+
+
+# === Sharded matching ===
+# Sorted arrays a shard worker reads from disk, memory-mapped
+SHARD_ARRAYS = ["key", "minutes", "position", "sequence_rank"]
+SHARD_META = ["offset", "span", "lowest", "highest"]
+
+
+def _match_shard(task):
+    array_dir, start, end, meta, codes, targets = task
+    departures = {
+        name: np.load(os.path.join(array_dir, f"{name}.npy"), mmap_mode="r")[start:end]
+        for name in SHARD_ARRAYS
+    }
+    departures.update(meta)
+    rows = match_keys(codes, targets, departures)
+    return np.where(rows >= 0, rows + start, -1)
+
+
+def match_rows_sharded(codes, targets, departures, workers, array_dir):
+    """match_keys split by stop shard across a process pool.
+
+    The sorted arrays are written once to array_dir as .npy files; each worker
+    memory-maps them and only touches the [start, end) slice of its shard.
+    """
+    for name in SHARD_ARRAYS:
+        np.save(os.path.join(array_dir, f"{name}.npy"), departures[name])
+    meta = {name: departures[name] for name in SHARD_META}
+
+    bounds = departures["shard_bounds"]
+    key_shard = np.searchsorted(departures["shard_codes"], codes, side="right") - 1
+
+    tasks, members = [], []
+    for shard in range(len(bounds) - 1):
+        start, end = int(bounds[shard]), int(bounds[shard + 1])
+        index = np.flatnonzero((key_shard == shard) & (codes >= 0))
+        if start == end or not len(index):
+            continue
+        tasks.append((array_dir, start, end, meta, codes[index], targets[index]))
+        members.append(index)
+
+    rows = np.full(len(codes), -1, dtype=np.int64)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for index, shard_rows in tqdm(zip(members, pool.map(_match_shard, tasks)), total=len(tasks), desc="Shards"):
+            rows[index] = shard_rows
+    return rows
+
+
+def match_routes(keys_df, departures, trip_to_route, route_to_name, workers=1):
+    targets = timetable_minutes(keys_df["TIMETABLE_TIME"])
+    codes = departures["stop_ids"].get_indexer(keys_df["TRANSIT_STOP"].astype(str))
+    if workers > 1 and len(departures["shard_bounds"]) > 2:
+        with tempfile.TemporaryDirectory(prefix="route_lookup_") as array_dir:
+            rows = match_rows_sharded(codes, targets, departures, workers, array_dir)
+    else:
+        rows = match_keys(codes, targets, departures)
+
+    trip_codes = departures["trip_code"][np.maximum(rows, 0)]
+    trip_ids = pd.Series(
+        np.where(rows >= 0, departures["trip_ids"][trip_codes], None),
+        index=keys_df.index,
+        dtype=object
+    )
+    matched_df = keys_df.copy()
+    matched_df["ROUTE"] = trip_ids.map(trip_to_route)
+    matched_df["matched_route_name"] = matched_df["ROUTE"].map(route_to_name)
+    return matched_df
+
+
+def _file_keys(path):
+    df = pd.read_csv(path, usecols=["TRANSIT_STOP", "TIMETABLE_TIME"], dtype=str)
+    return df.dropna().drop_duplicates()
+
+
+def collect_unique_keys(dataset_folder=DATASET_FOLDER, workers=1):
+    print(" Collecting unique (TRANSIT_STOP, TIMETABLE_TIME) pairs...")
+    files = [os.path.join(dataset_folder, f) for f in sorted(os.listdir(dataset_folder)) if f.endswith(".csv")]
+    frames = []
+    for path, keys, error in tqdm(map_files(_file_keys, files, workers), total=len(files), desc="Scanning"):
+        if error is not None:
+            raise RuntimeError(f"Failed to read {path}: {error}")
+        frames.append(keys)
+
+    if not frames:
+        return pd.DataFrame(columns=["TRANSIT_STOP", "TIMETABLE_TIME"])
+    keys_df = pd.concat(frames, ignore_index=True).drop_duplicates()
+    keys_df = keys_df.sort_values(["TRANSIT_STOP", "TIMETABLE_TIME"]).reset_index(drop=True)
+    print(f" Total unique keys: {len(keys_df):,}")
+    return keys_df
+
+
+def main(workers=1, shards=None):
+    shards = shards or (workers * 4 if workers > 1 else 1)
+    stop_times_df, trip_to_route, route_to_name = load_gtfs()
+    keys_df = collect_unique_keys(workers=workers)
+
+    # === Match all unique pairs ===
+    print(f" Matching routes ({workers} worker(s), {shards} shard(s))...")
+    start_time = time.time()
+    departures = build_stop_departures(stop_times_df, shards=shards)
+    matched_df = match_routes(keys_df, departures, trip_to_route, route_to_name, workers=workers)
+    print(f" Matched {matched_df['ROUTE'].notna().sum():,} of {len(matched_df):,} keys "
+          f"in {time.time() - start_time:.1f}s")
+
+    # === Save Lookup ===
+    matched_df.to_csv(LOOKUP_OUTPUT_PATH, index=False)
+    print(f"\n Lookup saved to: {LOOKUP_OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    # Usage: python -m app.models.generate_route_lookup [--workers N] [--shards S]
+    parser = argparse.ArgumentParser(description="Build lookup_route_mapping.csv from GTFS and the datasets")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for scanning and matching")
+    parser.add_argument("--shards", type=int, default=None, help="stop_id hash shards (default: 4 per worker)")
+    args = parser.parse_args()
+    main(workers=args.workers, shards=args.shards)
@@ -0,0 +1,166 @@
+import os
+import time
+import threading
+import joblib
+import numpy as np
+from app.models.feature_encoder import FeatureEncoder
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+model_dir = os.path.join(BASE_DIR, "models")
+
+model_path = os.path.join(model_dir, "best_model.pkl")
+feature_path = os.path.join(model_dir, "feature_columns.pkl")
+route_encoder_path = os.path.join(model_dir, "route_label_encoder.pkl")
+feature_encoder_path = os.path.join(model_dir, "feature_encoder.pkl")
+version_path = os.path.join(model_dir, "model_version.txt")
+
+UNKNOWN_ROUTE = "Unknown"
+
+
+class ModelBundle:
+    """One consistent set of trained artifacts, swapped in as a whole."""
+
+    def __init__(self, model, feature_columns, route_encoder, feature_encoder, version, signature):
+        self.model = model
+        self.feature_columns = feature_columns
+        self.route_encoder = route_encoder
+        self.feature_encoder = feature_encoder
+        self.version = version
+        self.signature = signature
+        self.loaded_at = time.time()
+
+        # Built once per model version so route lookups are O(1) dict hits
+        self.route_index = {route: code for code, route in enumerate(route_encoder.classes_)}
+        # Encoders from before 'Unknown' was reserved at training time keep the
+        # old behaviour of mapping unseen routes one past the last class.
+        self.unknown_route_code = self.route_index.get(UNKNOWN_ROUTE, len(route_encoder.classes_))
+
+    def encode_routes(self, routes):
+        """Map route ids to encoder codes, sending unseen routes to the 'Unknown' code."""
+        codes = np.empty(len(routes), dtype=np.int64)
+        unseen = []
+        for i, route in enumerate(routes):
+            code = self.route_index.get(route)
+            if code is None:
+                code = self.unknown_route_code
+                unseen.append(route)
+            codes[i] = code
+        return codes, unseen
+
+
+_bundle = None
+# Signature of artifacts that failed to load; the previous bundle keeps serving until they change again
+_failed_signature = None
+_lock = threading.Lock()
+_counter_lock = threading.Lock()
+_stats = {
+    "loads": 0,
+    "swaps": 0,
+    "failed_loads": 0,
+    "unseen_route_hits": 0,
+    "last_load_seconds": None,
+    "total_load_seconds": 0.0,
+}
+
+
+def _artifact_signature():
+    # train_models() writes model_version.txt after every other artifact, so
+    # keying on it means we never pick up a half-written set of pickles.
+    if os.path.exists(version_path):
+        stat = os.stat(version_path)
+        return ("version", stat.st_mtime_ns, stat.st_size)
+    if os.path.exists(model_path):
+        return ("model", os.stat(model_path).st_mtime_ns)
+    return None
+
+
+def _read_version():
+    if os.path.exists(version_path):
+        with open(version_path, "r") as f:
+            return f.read().strip()
+    return "Unknown"
+
+
+def _load_bundle(signature):
+    if not os.path.exists(model_path):
+        raise FileNotFoundError("No trained model found.")
+    if not os.path.exists(feature_path):
+        raise FileNotFoundError("Feature columns file not found.")
+    if not os.path.exists(route_encoder_path):
+        raise FileNotFoundError("Route encoder file not found.")
+
+    start_time = time.perf_counter()
+    feature_columns = joblib.load(feature_path)
+    # Models trained before the encoder was saved get one rebuilt from their column list
+    if os.path.exists(feature_encoder_path):
+        feature_encoder = joblib.load(feature_encoder_path)
+    else:
+        feature_encoder = FeatureEncoder(feature_columns)
+    bundle = ModelBundle(
+        model=joblib.load(model_path),
+        feature_columns=feature_columns,
+        route_encoder=joblib.load(route_encoder_path),
+        feature_encoder=feature_encoder,
+        version=_read_version(),
+        signature=signature,
+    )
+    elapsed = time.perf_counter() - start_time
+
+    _stats["loads"] += 1
+    _stats["last_load_seconds"] = elapsed
+    _stats["total_load_seconds"] += elapsed
+    print(f"[INFO] Loaded model artifacts ({bundle.version}) in {elapsed:.3f}s")
+    return bundle
+
+
+def get_model_bundle():
+    """Return the current model bundle, reloading it if the artifacts changed on disk."""
+    global _bundle, _failed_signature
+    signature = _artifact_signature()
+    bundle = _bundle
+    if bundle is not None and signature in (bundle.signature, _failed_signature):
+        return bundle
+
+    with _lock:
+        # Another thread may have already reloaded while we waited on the lock
+        if _bundle is not None and signature in (_bundle.signature, _failed_signature):
+            return _bundle
+        try:
+            new_bundle = _load_bundle(signature)
+        except Exception as e:
+            if _bundle is None:
+                raise
+            _stats["failed_loads"] += 1
+            _failed_signature = signature
+            print(f"[ERROR] Failed to load new model artifacts ({e}); keeping {_bundle.version}")
+            return _bundle
+        if _bundle is not None:
+            _stats["swaps"] += 1
+            print(f"[INFO] Hot-swapped model: {_bundle.version} -> {new_bundle.version}")
+        _bundle = new_bundle
+        return _bundle
+
+
+def refresh():
+    """Force a reload check, e.g. right after train_models() has written new artifacts."""
+    return get_model_bundle()
+
+
+def record_unseen_routes(count):
+    with _counter_lock:
+        _stats["unseen_route_hits"] += count
+
+
+def get_registry_stats():
+    bundle = _bundle
+    return {
+        "loaded": bundle is not None,
+        "version": bundle.version if bundle else None,
+        "loaded_at": bundle.loaded_at if bundle else None,
+        "loads": _stats["loads"],
+        "swaps": _stats["swaps"],
+        "failed_loads": _stats["failed_loads"],
+        "unseen_route_hits": _stats["unseen_route_hits"],
+        "last_load_seconds": _stats["last_load_seconds"],
+        "total_load_seconds": round(_stats["total_load_seconds"], 6),
+    }
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from app.models.generate_route_lookup import timetable_minutes
+from app.utils.file_manifest import file_signature, file_hash, load_manifest, save_manifest
+
+# Binary form of lookup_route_mapping.csv.
+#
+# Every (TRANSIT_STOP, TIMETABLE_TIME) key is packed into one int64,
+# stop_code << 16 | minute, where stop_code indexes the sorted stop table.
+# keys.npy holds the sorted packed keys and route_codes.npy the matching
+# index into the route table; both are memory-mapped, so joining a chunk is
+# two searchsorted calls regardless of how large the lookup is.
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+LOOKUP_PATH = os.path.join(BASE_DIR, "lookup_route_mapping.csv")
+INDEX_DIR = os.path.join(BASE_DIR, "lookup_index")
+META_NAME = "meta.json"
+MINUTE_BITS = 16
+INDEX_VERSION = 2
+
+
+def pack_keys(stop_codes, minutes):
+    """Packed int64 keys; -1 where the stop is unknown or the time did not parse."""
+    valid = (stop_codes >= 0) & ~np.isnan(minutes) & (minutes >= 0) & (minutes < (1 << MINUTE_BITS))
+    packed = (stop_codes.astype(np.int64) << MINUTE_BITS) | np.where(valid, minutes, 0).astype(np.int64)
+    return np.where(valid, packed, -1)
+
+
+def compile_lookup(lookup_path=LOOKUP_PATH, index_dir=INDEX_DIR):
+    """Compile the lookup CSV into index_dir; keys without a route are left out."""
+    start_time = time.time()
+    os.makedirs(index_dir, exist_ok=True)
+    lookup_df = pd.read_csv(lookup_path, dtype=str).dropna(subset=["TRANSIT_STOP", "TIMETABLE_TIME", "ROUTE"])
+
+    stops = np.sort(lookup_df["TRANSIT_STOP"].unique())
+    stop_codes = np.searchsorted(stops, lookup_df["TRANSIT_STOP"].to_numpy())
+    keys = pack_keys(stop_codes, timetable_minutes(lookup_df["TIMETABLE_TIME"]))
+
+    routes = lookup_df[["ROUTE", "matched_route_name"]].drop_duplicates("ROUTE").reset_index(drop=True)
+    route_codes = pd.Index(routes["ROUTE"]).get_indexer(lookup_df["ROUTE"]).astype(np.int32)
+
+    # "5:30" and "05:30" pack to the same key; the first one wins
+    keep = keys >= 0
+    keys, route_codes = keys[keep], route_codes[keep]
+    order = np.argsort(keys, kind="stable")
+    keys, route_codes = keys[order], route_codes[order]
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    keys, route_codes = keys[first], route_codes[first]
+
+    np.save(os.path.join(index_dir, "keys.npy"), keys)
+    np.save(os.path.join(index_dir, "route_codes.npy"), route_codes)
+    np.save(os.path.join(index_dir, "stops.npy"), stops.astype(str))
+    save_manifest(os.path.join(index_dir, META_NAME), {
+        "version": INDEX_VERSION,
+        "source": file_signature(lookup_path),
+        "lookup_hash": file_hash(lookup_path),
+        "keys": int(len(keys)),
+        "route_ids": routes["ROUTE"].tolist(),
+        "route_names": routes["matched_route_name"].where(routes["matched_route_name"].notna(), None).tolist()
+    })
+    print(f"[INFO] Compiled {len(keys):,} lookup keys, {len(stops):,} stops, {len(routes):,} routes "
+          f"into {index_dir} in {time.time() - start_time:.1f}s")
+
+
+class RouteLookupIndex:
+    def __init__(self, index_dir=INDEX_DIR):
+        meta = load_manifest(os.path.join(index_dir, META_NAME))
+        # Changes only when the lookup content (or the index format) changes
+        self.version = f"{meta['version']}:{meta['lookup_hash']}"
+        self.keys = np.load(os.path.join(index_dir, "keys.npy"), mmap_mode="r")
+        self.route_codes = np.load(os.path.join(index_dir, "route_codes.npy"), mmap_mode="r")
+        self.stops = pd.Index(np.load(os.path.join(index_dir, "stops.npy")))
+        self.route_ids = np.array(meta["route_ids"] + [None], dtype=object)
+        self.route_names = np.array(meta["route_names"] + [None], dtype=object)
+
+    def lookup(self, transit_stops, timetable_times):
+        """Route code for every (stop, time) pair; -1 where the lookup has no route."""
+        stop_codes = self.stops.get_indexer(pd.Series(transit_stops, dtype=object))
+        keys = pack_keys(stop_codes, timetable_minutes(pd.Series(timetable_times, dtype=object)))
+        if not len(self.keys):
+            return np.full(len(keys), -1, dtype=np.int32)
+        at = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = (keys >= 0) & (self.keys[at] == keys)
+        return np.where(found, self.route_codes[at], -1).astype(np.int32)
+
+    def route_columns(self, codes):
+        """(ROUTE, matched_route_name) object arrays for route codes; None for -1."""
+        return self.route_ids[codes], self.route_names[codes]
+
+
+def load_index(lookup_path=LOOKUP_PATH, index_dir=INDEX_DIR):
+    """Open the binary index, recompiling it first if the lookup CSV changed."""
+    meta = load_manifest(os.path.join(index_dir, META_NAME))
+    if meta.get("version") != INDEX_VERSION or meta.get("source") != file_signature(lookup_path):
+        compile_lookup(lookup_path, index_dir)
+    return RouteLookupIndex(index_dir)
+
+
+if __name__ == "__main__":
+    # Usage: python -m app.models.route_lookup_index [lookup.csv]
+    compile_lookup(sys.argv[1] if len(sys.argv) > 1 else LOOKUP_PATH)
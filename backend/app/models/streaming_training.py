@@ -0,0 +1,228 @@
+import os
+import glob
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+from app.utils.parquet_cache import iter_chunks
+from app.models.feature_encoder import FeatureEncoder, CATEGORICAL_COLUMNS
+
+# Memory-bounded training for the crowd model.
+#
+# The data is streamed twice in chunks and never concatenated: the first pass
+# counts the rows that survive cleaning and collects every category, the
+# second writes each row's category codes into one preallocated uint8/uint16
+# matrix (a few bytes per row). Splits are index arrays into that matrix, and
+# XGBoost reads the training rows through a DataIter in batches, so the only
+# full-size copies are the codes, the labels and XGBoost's own quantized
+# matrix (which can be spilled to disk with TRAINING_EXTERNAL_MEMORY=true).
+
+CHUNK_SIZE = int(os.getenv("TRAINING_CHUNK_SIZE", "500000"))
+BATCH_ROWS = int(os.getenv("TRAINING_BATCH_ROWS", "1000000"))
+EXTERNAL_MEMORY = os.getenv("TRAINING_EXTERNAL_MEMORY", "false").lower() == "true"
+
+CODE_COLUMNS = ["ROUTE"] + CATEGORICAL_COLUMNS
+LABEL_COLUMN = "CAPACITY_BUCKET_ENCODED"
+STREAM_COLUMNS = CODE_COLUMNS + [LABEL_COLUMN]
+
+# Same settings as the XGBClassifier of the in-memory path
+XGB_PARAMS = {"max_depth": 6, "tree_method": "hist", "eval_metric": "mlogloss", "max_bin": 256}
+XGB_ROUNDS = 50
+
+
+def training_sources(data_dir, feedback_file=None):
+    """(csv_path, parquet cache folder or None) for every training file."""
+    sources = [(path, "processed_with_route") for path in sorted(glob.glob(os.path.join(data_dir, "*.csv")))]
+    if feedback_file and os.path.exists(feedback_file):
+        sources.append((feedback_file, None))
+    return sources
+
+
+def _iter_source_chunks(source, chunksize):
+    csv_path, folder = source
+    if folder is None:
+        return pd.read_csv(csv_path, dtype=str, usecols=STREAM_COLUMNS, chunksize=chunksize, low_memory=False)
+    return iter_chunks(csv_path, STREAM_COLUMNS, chunksize, folder=folder)
+
+
+def clean_chunk(df):
+    """The rows and values load_all_data + prepare_features would keep: ({column: values}, labels)."""
+    routes = df["ROUTE"]
+    df = df[routes.notna() & (routes != "N/A") & (routes != "")]
+    labels = pd.to_numeric(df[LABEL_COLUMN].astype(object), errors="coerce")
+    keep = labels.notna().to_numpy()
+    values = {col: df[col].astype(object).fillna("Unknown").to_numpy()[keep] for col in CODE_COLUMNS}
+    return values, labels.to_numpy()[keep].astype(np.int64)
+
+
+def _code_dtype(vocab_sizes):
+    largest = max(vocab_sizes)
+    if largest <= np.iinfo(np.uint8).max + 1:
+        return np.uint8
+    if largest <= np.iinfo(np.uint16).max + 1:
+        return np.uint16
+    raise ValueError(f"{largest:,} categories in one column do not fit a uint16 code")
+
+
+class CodedDataset:
+    """Training rows as a (n_rows, len(CODE_COLUMNS)) matrix of category codes plus label indices."""
+
+    def __init__(self, codes, labels, classes, route_encoder, feature_encoder):
+        self.codes = codes
+        self.labels = labels
+        self.classes = classes
+        self.route_encoder = route_encoder
+        self.feature_encoder = feature_encoder
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.labels.nbytes
+
+
+def build_coded_dataset(sources, unknown_route, chunksize=CHUNK_SIZE):
+    """Stream sources twice into a CodedDataset; files that fail to read are skipped."""
+    start_time = time.time()
+    n_rows, seen, label_values, readable = 0, {col: set() for col in CODE_COLUMNS}, set(), []
+    for source in sources:
+        try:
+            for chunk in _iter_source_chunks(source, chunksize):
+                values, labels = clean_chunk(chunk)
+                n_rows += len(labels)
+                for col in CODE_COLUMNS:
+                    seen[col].update(pd.unique(values[col]))
+                label_values.update(np.unique(labels).tolist())
+        except Exception as e:
+            print(f"[ERROR] Failed to read {source[0]}: {e}")
+            continue
+        readable.append(source)
+    if not n_rows:
+        raise ValueError("No valid data files found to train on.")
+
+    # Same vocabularies as prepare_features: LabelEncoder order for routes
+    # (with 'Unknown' reserved), sorted strings for the other columns
+    route_encoder = LabelEncoder().fit(np.append(np.array(list(seen["ROUTE"]), dtype=object), unknown_route))
+    vocab = {"ROUTE": list(route_encoder.classes_)}
+    vocab.update({col: sorted(str(value) for value in seen[col]) for col in CATEGORICAL_COLUMNS})
+    classes = np.array(sorted(label_values), dtype=np.int64)
+
+    dtype = _code_dtype([len(vocab[col]) for col in CODE_COLUMNS])
+    codes = np.empty((n_rows, len(CODE_COLUMNS)), dtype=dtype)
+    labels = np.empty(n_rows, dtype=np.uint8 if len(classes) <= 256 else np.uint16)
+
+    offset = 0
+    for source in readable:
+        for chunk in _iter_source_chunks(source, chunksize):
+            values, chunk_labels = clean_chunk(chunk)
+            end = offset + len(chunk_labels)
+            if end > n_rows:
+                raise RuntimeError("Training data changed while it was being read")
+            for j, col in enumerate(CODE_COLUMNS):
+                column_codes = pd.Categorical(values[col].astype(str), categories=vocab[col]).codes
+                if (column_codes < 0).any():
+                    raise RuntimeError("Training data changed while it was being read")
+                codes[offset:end, j] = column_codes
+            labels[offset:end] = np.searchsorted(classes, chunk_labels)
+            offset = end
+    if offset != n_rows:
+        raise RuntimeError("Training data changed while it was being read")
+
+    dataset = CodedDataset(codes, labels, classes, route_encoder,
+                           FeatureEncoder.ordinal({col: vocab[col] for col in CATEGORICAL_COLUMNS}))
+    print(f"[INFO] Coded {n_rows:,} rows from {len(readable)} files into {dataset.nbytes / 1e6:.1f} MB "
+          f"({np.dtype(dtype).name} codes) in {time.time() - start_time:.1f}s")
+    return dataset
+
+
+def split_indices(labels, test_size=0.15, val_size=0.1765, random_state=42):
+    """Stratified (train, val, test) row indices, with the same proportions as the in-memory split."""
+    index = np.arange(len(labels), dtype=np.uint32 if len(labels) < 2 ** 32 else np.int64)
+    temp, test = train_test_split(index, test_size=test_size, stratify=labels, random_state=random_state)
+    train, val = train_test_split(temp, test_size=val_size, stratify=labels[temp], random_state=random_state)
+    return train, val, test
+
+
+class CodeBatches(xgb.DataIter):
+    """Feeds the rows of a CodedDataset at the given indices to XGBoost, batch_rows at a time."""
+
+    def __init__(self, dataset, indices, batch_rows=BATCH_ROWS, cache_prefix=None):
+        self.dataset = dataset
+        self.indices = indices
+        self.batch_rows = batch_rows
+        self._position = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data):
+        if self._position >= len(self.indices):
+            return False
+        # Sorted so each batch gathers from the code matrix front to back
+        batch = np.sort(self.indices[self._position:self._position + self.batch_rows])
+        self._position += self.batch_rows
+        input_data(
+            data=self.dataset.codes[batch].astype(np.float32),
+            label=self.dataset.labels[batch],
+            feature_types=["c"] * len(CODE_COLUMNS)
+        )
+        return True
+
+    def reset(self):
+        self._position = 0
+
+
+class CategoricalBooster:
+    """XGBoost Booster over ordinal category codes, with the predict() the model registry expects."""
+
+    def __init__(self, booster, classes):
+        self.booster = booster
+        self.classes = np.asarray(classes)
+
+    def predict(self, features):
+        data = np.asarray(features, dtype=np.float32)
+        matrix = xgb.DMatrix(data, feature_types=["c"] * data.shape[1], enable_categorical=True)
+        return self.classes[self.booster.predict(matrix).argmax(axis=1)]
+
+
+def train_booster(dataset, train_index, val_index, cache_dir=None, external_memory=EXTERNAL_MEMORY):
+    """Train on train_index; the validation rows are evaluated each round for the log.
+
+    With external_memory the quantized training pages are written under
+    cache_dir (removed afterwards) instead of being held in RAM.
+    """
+    params = {**XGB_PARAMS, "objective": "multi:softprob", "num_class": len(dataset.classes)}
+    with tempfile.TemporaryDirectory(dir=cache_dir) as page_dir:
+        if external_memory and not hasattr(xgb, "ExtMemQuantileDMatrix"):
+            # xgboost < 3.0 (the pinned 2.0.x): QuantileDMatrix refuses a cache_prefix,
+            # so the pages are spilled through a DMatrix over the same batches instead
+            train_matrix = xgb.DMatrix(CodeBatches(dataset, train_index, cache_prefix=os.path.join(page_dir, "train")),
+                                       enable_categorical=True)
+            val_matrix = xgb.DMatrix(CodeBatches(dataset, val_index, cache_prefix=os.path.join(page_dir, "val")),
+                                     enable_categorical=True)
+        else:
+            if external_memory:
+                train_matrix = xgb.ExtMemQuantileDMatrix(
+                    CodeBatches(dataset, train_index, cache_prefix=os.path.join(page_dir, "train")),
+                    enable_categorical=True, max_bin=params["max_bin"]
+                )
+            else:
+                train_matrix = xgb.QuantileDMatrix(CodeBatches(dataset, train_index), enable_categorical=True,
+                                                   max_bin=params["max_bin"])
+            val_matrix = xgb.QuantileDMatrix(CodeBatches(dataset, val_index), enable_categorical=True,
+                                             ref=train_matrix)
+        booster = xgb.train(params, train_matrix, num_boost_round=XGB_ROUNDS, evals=[(val_matrix, "val")],
+                            verbose_eval=10)
+        del train_matrix, val_matrix
+    return CategoricalBooster(booster, dataset.classes)
+
+
+def predict_indices(model, dataset, indices, batch_rows=BATCH_ROWS):
+    """Predicted labels for the dataset rows at indices, batch by batch."""
+    predictions = np.empty(len(indices), dtype=dataset.classes.dtype)
+    for start in range(0, len(indices), batch_rows):
+        batch = indices[start:start + batch_rows]
+        predictions[start:start + len(batch)] = model.predict(dataset.codes[batch])
+    return predictions
@@ -1,13 +1,16 @@
-import requests
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from datetime import datetime
+from pathlib import Path
 import os
+from app.utils import http_client
 
 router = APIRouter()
 
-@router.get("/alerts")
-def get_alerts():
+# Trip planner "additional information" notices. This used to share /alerts with
+# alerts_router and, being registered first, hid the GTFS alerts feed the app reads.
+@router.get("/alerts/info")
+async def get_alerts():
     # Load .env locally only (skip on Render)
     if not os.getenv("TFNSW_API_KEY"):
         from dotenv import load_dotenv
@@ -28,7 +31,7 @@ def get_alerts():
         "filterPublicationStatus": "current"
     }
 
-    res = requests.get(url, headers=headers, params=params)
+    res = await http_client.get(url, headers=headers, params=params)
     if res.status_code != 200:
         return JSONResponse(status_code=500, content={"error": "Failed to fetch alerts"})
 
@@ -1,8 +1,19 @@
-from fastapi import APIRouter
-from app.services.alerts_service import get_bus_alerts
+from typing import Optional
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import JSONResponse
+from app.services.alerts_service import get_alert_snapshot, alerts_failure
+from app.services.realtime_feed import encoded_response
 
 router = APIRouter()
 
 @router.get("/alerts")
-def read_alerts():
-    return get_bus_alerts()
+async def read_alerts(
+    route: Optional[str] = Query(None, description="Only alerts affecting this GTFS route_id"),
+    if_none_match: Optional[str] = Header(None)
+):
+    # Body and ETag are encoded once per feed change (and route), not per request
+    snapshot, age, error = await get_alert_snapshot()
+    if snapshot is None:
+        return JSONResponse(status_code=500, content=alerts_failure(error))
+    body, etag = snapshot.body(route)
+    return encoded_response(body, etag, age, if_none_match)
@@ -1,8 +1,33 @@
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
 from app.services import tfnsw_bus
+from app.services.realtime_feed import snapshot_response
 
 router = APIRouter()
 
+def _respond(content, age):
+    return snapshot_response(content, age, status_code=500 if "error" in content else 200)
+
 @router.get("/getBusPositions")
-def get_bus_positions():
-    return tfnsw_bus.get_bus_positions()
+async def get_bus_positions():
+    return _respond(*await tfnsw_bus.get_bus_positions())
+
+@router.get("/buses/nearby")
+async def get_nearby_buses(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: float = Query(500, gt=0, le=20000, description="Search radius in metres"),
+    limit: Optional[int] = Query(None, ge=1, description="Return at most this many, nearest first")
+):
+    return _respond(*await tfnsw_bus.get_nearby_buses(lat, lon, radius, limit))
+
+@router.get("/buses/bbox")
+async def get_buses_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180)
+):
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="min_lat/min_lon must not exceed max_lat/max_lon")
+    return _respond(*await tfnsw_bus.get_buses_in_bbox(min_lat, min_lon, max_lat, max_lon))
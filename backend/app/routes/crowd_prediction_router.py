@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 import os, json, requests
 from datetime import datetime
-from app.models.bus_occupancy_prediction_model import predict
+from app.models.bus_occupancy_prediction_model import predict_each
 from pathlib import Path
 
 router = APIRouter()
@@ -25,26 +25,31 @@ def get_predicted_crowd_levels():
         hour_band_end = hour_band_start.replace(minute=59)
         hour_band_str = f"{hour_band_start.strftime('%H')}:00 to {hour_band_end.strftime('%H')}:00"
 
-        results = []
-        for route in routes[:5]:  # Limit for performance
-            prediction_input = {
+        selected_routes = routes[:5]  # Limit for performance
+        prediction_inputs = [
+            {
                 "ROUTE": route,
                 "TIMETABLE_HOUR_BAND": hour_band_str,
                 "TRIP_POINT": "Mid Trip",
                 "TIMETABLE_TIME": timetable_time,
                 "ACTUAL_TIME": actual_time
             }
+            for route in selected_routes
+        ]
+
+        results = []
+        # Routes that fail to predict are skipped
+        predictions = predict_each(prediction_inputs)
 
-            try:
-                prediction = predict(prediction_input)
-                level = ["Low", "Medium", "Medium", "High"][min(prediction, 3)]
-                results.append({
-                    "route": f"Route {route}",
-                    "level": level,
-                    "time": current_time.strftime("As of %I:%M %p").lstrip("0")
-                })
-            except Exception as e:
+        for route, prediction in zip(selected_routes, predictions):
+            if prediction is None:
                 continue
+            level = ["Low", "Medium", "Medium", "High"][min(prediction, 3)]
+            results.append({
+                "route": f"Route {route}",
+                "level": level,
+                "time": current_time.strftime("As of %I:%M %p").lstrip("0")
+            })
 
         return {"predictions": results}
 
@@ -1,13 +1,32 @@
-from fastapi import APIRouter, HTTPException
-from app.services.data_cleaner import clean_and_save_all
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.services.data_cleaner import clean_and_save_all, start_cleaning_job, get_cleaning_job, CPU_COUNT
 
 router = APIRouter()
 
 @router.post("/clean-datasets")
-def clean_datasets():
+def clean_datasets(
+    background: bool = Query(False, description="Start the run as a background job and return its id"),
+    workers: Optional[int] = Query(None, ge=1, le=CPU_COUNT,
+                                   description="Worker processes, defaults to CLEANING_WORKERS")
+):
+    if background:
+        job = start_cleaning_job(max_workers=workers)
+        return {
+            "message": "Dataset cleaning started.",
+            "job_id": job["job_id"],
+            "status_url": f"/clean-datasets/jobs/{job['job_id']}"
+        }
     try:
-        clean_and_save_all()
-        return {"message": "Dataset cleaning completed successfully."}
+        summary = clean_and_save_all(max_workers=workers)
+        return {"message": "Dataset cleaning completed successfully.", "summary": summary}
     except Exception as e:
         print(f"Error during dataset cleaning: {e}")
         raise HTTPException(status_code=500, detail=f"Dataset cleaning failed: {str(e)}")
+
+@router.get("/clean-datasets/jobs/{job_id}")
+def clean_datasets_status(job_id: str):
+    job = get_cleaning_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No cleaning job {job_id}")
+    return job
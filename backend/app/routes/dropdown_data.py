@@ -1,9 +1,39 @@
 from fastapi import APIRouter, HTTPException
-import os, json
+import os, json, threading
 
 router = APIRouter()
 data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../dropdown_data"))
 
+# Parsed dropdown files keyed by name, each with the mtime it was read at so a
+# regenerated file is picked up without a restart
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def load_dropdown(file_name):
+    """Parsed contents of dropdown_data/<file_name>.json, re-read only when the file changes."""
+    file_path = os.path.join(data_dir, f"{file_name}.json")
+    mtime = os.path.getmtime(file_path)
+    cached = _cache.get(file_name)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with _cache_lock:
+        cached = _cache.get(file_name)
+        if cached is None or cached[0] != mtime:
+            with open(file_path, "r") as f:
+                cached = _cache[file_name] = (mtime, json.load(f))
+        return cached[1]
+
+
+def preload_dropdowns():
+    """Parse every dropdown file up front; returns how many were loaded."""
+    names = [name[:-5] for name in os.listdir(data_dir) if name.endswith(".json")]
+    for name in names:
+        load_dropdown(name)
+    return len(names)
+
+
 # Returns dropdown data from pre-generated JSON files located in the 'dropdown_data' folder.
 # The 'file_name' parameter should match the name of the file (without .json extension),
 # e.g., /dropdown/routes will load 'routes.json'.
@@ -14,7 +44,8 @@ def get_dropdown_data(file_name: str):
         file_path = os.path.join(data_dir, f"{file_name}.json")
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="Dropdown file not found")
-        with open(file_path, "r") as f:
-            return json.load(f)
+        return load_dropdown(file_name)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
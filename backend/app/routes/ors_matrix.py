@@ -1,14 +1,34 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import List
-from app.services.ors_matrix_service import get_matrix_durations_and_distances
+from typing import List, Optional, Tuple
+from app.services import ors_matrix_service
 
 router = APIRouter()
 
 class MatrixRequest(BaseModel):
-    coordinates: List[List[float]]  # [ [lon, lat], [lon, lat], ... ]
+    coordinates: List[Tuple[float, float]]  # [ [lon, lat], [lon, lat], ... ]
     profile: str = "driving-car"
+    # Indices into coordinates. Neither given: first location to all the others;
+    # only one given: the other side is every location.
+    sources: Optional[List[int]] = None
+    destinations: Optional[List[int]] = None
 
 @router.post("/ors/matrix")
-def matrix_lookup(data: MatrixRequest):
-    return get_matrix_durations_and_distances(data.coordinates, data.profile)
+async def matrix_lookup(data: MatrixRequest):
+    if len(data.coordinates) > ors_matrix_service.MAX_LOCATIONS:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {ors_matrix_service.MAX_LOCATIONS} coordinates per request")
+    for name, indices in (("sources", data.sources), ("destinations", data.destinations)):
+        if indices is not None and (not indices or any(i < 0 or i >= len(data.coordinates) for i in indices)):
+            raise HTTPException(status_code=400, detail=f"{name} must be a non-empty list of coordinate indices")
+
+    sources, destinations = ors_matrix_service.resolve_indices(len(data.coordinates), data.sources, data.destinations)
+    tiles = ors_matrix_service.tile_count(len(sources), len(destinations))
+    if tiles > ors_matrix_service.MAX_TILES:
+        raise HTTPException(status_code=400, detail=(
+            f"{len(sources)} x {len(destinations)} needs {tiles} upstream calls; "
+            f"at most {ors_matrix_service.MAX_TILES} are allowed per request"
+        ))
+
+    coordinates = [list(c) for c in data.coordinates]
+    return await ors_matrix_service.get_matrix_durations_and_distances(coordinates, data.profile, sources, destinations)
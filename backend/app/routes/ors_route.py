@@ -1,13 +1,19 @@
 from fastapi import APIRouter, Query
 from app.services.ors_route_service import get_route_duration_and_distance
+from app.utils.geo_cache import ors_cache
 
 router = APIRouter()
 
 @router.get("/ors/route")
-def route_duration(
+async def route_duration(
     start_lon: float = Query(...),
     start_lat: float = Query(...),
     end_lon: float = Query(...),
     end_lat: float = Query(...)
 ):
-    return get_route_duration_and_distance([start_lon, start_lat], [end_lon, end_lat])
+    return await get_route_duration_and_distance([start_lon, start_lat], [end_lon, end_lat])
+
+@router.get("/ors/cache-stats")
+def ors_cache_stats():
+    # Hit rates and upstream time saved for the route, matrix and isochrone geo-cache
+    return ors_cache.metrics()
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from typing import List, Optional
 import traceback
 import sys
-from app.models.bus_occupancy_prediction_model import train_models, predict, append_feedback, model_dir
+from app.models.bus_occupancy_prediction_model import train_models, predict, predict_batch, append_feedback, model_dir
+from app.models.model_registry import get_registry_stats
 import os
 from pathlib import Path
 
@@ -24,10 +26,17 @@ class PredictionInput(BaseModel):
     TIMETABLE_TIME: str
     ACTUAL_TIME: str
 
+# Upper bound on rows per /predict-crowd/batch call, so one request cannot tie up a worker
+MAX_BATCH_ROWS = int(os.getenv("PREDICT_MAX_BATCH_ROWS", "1000"))
+
+class BatchPredictionInput(BaseModel):
+    rows: List[PredictionInput]
+
 @router.post("/train-model")
-def trigger_training():
+def trigger_training(out_of_core: Optional[bool] = None):
+    # out_of_core=true streams the data into a compact code matrix instead of loading it as frames
     try:
-        train_models()
+        train_models(out_of_core)
         return {"message": "Model trained and best model saved successfully."}
     except Exception as e:
         traceback.print_exc(file=sys.stdout)
@@ -42,6 +51,17 @@ def get_prediction(data: PredictionInput):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/predict-crowd/batch")
+def get_batch_prediction(data: BatchPredictionInput):
+    if len(data.rows) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ROWS} rows per batch")
+    try:
+        results = predict_batch([row.model_dump() for row in data.rows])
+        return {"predicted_capacity_bucket_encoded": results}
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/submit-feedback")
 def save_feedback(data: FeedbackInput):
     try:
@@ -84,5 +104,8 @@ def get_model_metrics():
         with open(metrics_path, "r") as f:
             return {"metrics": f.read()}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))        
+        raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/model-registry/stats")
+def get_model_registry_stats():
+    return get_registry_stats()
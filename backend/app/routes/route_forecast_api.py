@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Query
 import traceback
-from app.models.bus_occupancy_prediction_model import predict
+from app.models.bus_occupancy_prediction_model import predict_each
 
 router = APIRouter()
 
@@ -12,29 +12,24 @@ def get_daily_hourly_forecast(
 ):
     try:
         hours = [f"{str(h).zfill(2)}:00" for h in range(24)]  # '00:00' to '23:00'
-        graph_data = []
-
-        for hour in hours:
-            hour_band = get_hour_band(hour)
-            payload = {
+        payloads = [
+            {
                 "ROUTE": route,
-                "TIMETABLE_HOUR_BAND": hour_band,
+                "TIMETABLE_HOUR_BAND": get_hour_band(hour),
                 "TRIP_POINT": trip_point,
                 "TIMETABLE_TIME": hour,
                 "ACTUAL_TIME": hour
             }
+            for hour in hours
+        ]
+
+        # One batched model call for all 24 hours; hours that fail to predict get -1
+        predictions = predict_each(payloads, default=-1)
 
-            try:
-                prediction = predict(payload)
-                graph_data.append({
-                    "hour": hour,
-                    "crowd_level": prediction
-                })
-            except Exception:
-                graph_data.append({
-                    "hour": hour,
-                    "crowd_level": -1
-                })
+        graph_data = [
+            {"hour": hour, "crowd_level": prediction}
+            for hour, prediction in zip(hours, predictions)
+        ]
 
         return {
             "route": route,
@@ -1,11 +1,47 @@
-import requests
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 from datetime import datetime
+from pathlib import Path
 import os
+import re
+from app.utils import http_client
+from app.utils.response_cache import ResponseCache
 
 router = APIRouter()
 
+# Load .env locally only (skip on Render)
+if not os.getenv("TFNSW_API_KEY"):
+    from dotenv import load_dotenv
+    env_path = Path(__file__).resolve().parents[2] / '.env'
+    load_dotenv(dotenv_path=env_path)
+
+# Identical (origin, destination, date, minute) queries share one upstream call
+# while it is in flight and reuse its answer for TRIP_CACHE_TTL seconds
+trip_cache = ResponseCache(
+    "trip planner",
+    ttl=float(os.getenv("TRIP_CACHE_TTL", "60")),
+    max_bytes=int(os.getenv("TRIP_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+)
+
+
+class TripPlannerError(Exception):
+    pass
+
+
+def normalize_date(value):
+    """YYYYMMDD for 'YYYYMMDD' or 'YYYY-MM-DD'; anything else is passed through stripped."""
+    value = str(value).strip()
+    digits = value.replace("-", "")
+    return digits if re.fullmatch(r"\d{8}", digits) else value
+
+
+def normalize_time(value):
+    """HHMM for 'HHMM', 'HH:MM' or 'HH:MM:SS' (seconds dropped); anything else is passed through stripped."""
+    value = str(value).strip()
+    match = re.fullmatch(r"(\d{1,2}):?(\d{2})(?::\d{2})?", value)
+    return f"{int(match.group(1)):02d}{match.group(2)}" if match else value
+
+
 @router.post("/trip")
 async def get_trip(request: Request):
     body = await request.json()
@@ -18,13 +54,19 @@ async def get_trip(request: Request):
     if not origin or not destination:
         return JSONResponse(status_code=400, content={"error": "Origin and destination are required"})
 
-    # Load .env locally only (skip on Render)
-    if not os.getenv("TFNSW_API_KEY"):
-        from dotenv import load_dotenv
-        env_path = Path(__file__).resolve().parents[2] / '.env'
-        load_dotenv(dotenv_path=env_path)
+    key = (str(origin).strip(), str(destination).strip(), normalize_date(date), normalize_time(time))
+    try:
+        return await trip_cache.get_or_fetch(key, lambda: fetch_journeys(*key))
+    except TripPlannerError:
+        return JSONResponse(status_code=500, content={"error": "Failed to fetch journey"})
+
 
-    # Load API key from environment
+@router.get("/trip/cache-stats")
+def get_trip_cache_stats():
+    return trip_cache.metrics()
+
+
+async def fetch_journeys(origin, destination, date, time):
     TFNSW_API_KEY = os.getenv("TFNSW_API_KEY")
 
     url = "https://api.transport.nsw.gov.au/v1/tp/trip"
@@ -42,9 +84,9 @@ async def get_trip(request: Request):
         "TfNSWTR": "true"
     }
 
-    response = requests.get(url, headers=headers, params=params)
+    response = await http_client.get(url, headers=headers, params=params)
     if response.status_code != 200:
-        return JSONResponse(status_code=500, content={"error": "Failed to fetch journey"})
+        raise TripPlannerError(f"Trip planner returned {response.status_code}")
 
     trips = response.json().get("journeys", [])
     result = []
@@ -1,8 +1,24 @@
-from fastapi import APIRouter
-from app.services.trip_updates_service import get_trip_updates
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.services import trip_updates_service
+from app.services.realtime_feed import snapshot_response
 
 router = APIRouter()
 
+def _respond(content, age):
+    failed = isinstance(content, dict) and "message" in content and "details" in content
+    return snapshot_response(content, age, status_code=500 if failed else 200)
+
 @router.get("/trip-updates")
-def read_trip_updates():
-    return get_trip_updates()
+async def read_trip_updates(
+    since: Optional[int] = Query(None, description="Only trips changed after this version (from a previous response)"),
+    route: Optional[str] = Query(None, description="Only trips of this GTFS route_id")
+):
+    return _respond(*await trip_updates_service.get_trip_updates(since, route))
+
+@router.get("/trip-updates/{trip_id}")
+async def read_trip_update(trip_id: str):
+    content, age = await trip_updates_service.get_trip_update(trip_id)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Trip not in the current feed")
+    return _respond(content, age)
@@ -1,8 +1,8 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-import glob
 import os
+from app.utils.parquet_cache import iter_frames, concat_frames
 
 # Setup directories
 base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../"))
@@ -10,31 +10,25 @@ data_dir = os.path.join(base_dir, "processed_with_route")
 output_dir = os.path.join(base_dir, "insight_outputs")
 os.makedirs(output_dir, exist_ok=True)
 
-# Load all processed_with_route CSVs
-all_files = sorted(glob.glob(os.path.join(data_dir, "*.csv")))
-df_list = []
-
-for file in all_files:
-    try:
-        df = pd.read_csv(file, dtype=str, usecols=[
-            "CALENDAR_DATE", "ROUTE", "DIRECTION", "TRIP_POINT", "TIMETABLE_HOUR_BAND",
-            "TIMETABLE_TIME", "ACTUAL_TIME", "SUBURB", "LATITUDE", "LONGITUDE",
-            "CAPACITY_BUCKET_ENCODED"
-        ])
-        df_list.append(df)
-    except Exception as e:
-        print(f"Error reading {file}: {e}")
+# Load all processed_with_route data (Parquet cache when available)
+df_list = [
+    df for _, df in iter_frames("processed_with_route", [
+        "CALENDAR_DATE", "ROUTE", "DIRECTION", "TRIP_POINT", "TIMETABLE_HOUR_BAND",
+        "TIMETABLE_TIME", "ACTUAL_TIME", "SUBURB", "LATITUDE", "LONGITUDE",
+        "CAPACITY_BUCKET_ENCODED"
+    ])
+]
 
 if not df_list:
     raise ValueError("No CSV files found in processed_with_route folder.")
 
-df = pd.concat(df_list, ignore_index=True)
+df = concat_frames(df_list)
 df["CAPACITY_BUCKET_ENCODED"] = pd.to_numeric(df["CAPACITY_BUCKET_ENCODED"], errors="coerce")
 
 # ---------------------------------------
 # 1. Average Crowd Level by Route
 # ---------------------------------------
-route_crowd = df.groupby("ROUTE")["CAPACITY_BUCKET_ENCODED"].mean().sort_values(ascending=False).head(20)
+route_crowd = df.groupby("ROUTE", observed=True)["CAPACITY_BUCKET_ENCODED"].mean().sort_values(ascending=False).head(20)
 plt.figure(figsize=(12, 6))
 route_crowd.plot(kind="bar", color="skyblue")
 plt.title("Top 20 Routes by Average Crowd Level")
@@ -47,7 +41,7 @@ plt.close()
 # ---------------------------------------
 # 2. Trip Point Influence on Crowd
 # ---------------------------------------
-trip_point_dist = df.groupby("TRIP_POINT")["CAPACITY_BUCKET_ENCODED"].value_counts().unstack().fillna(0)
+trip_point_dist = df.groupby("TRIP_POINT", observed=True)["CAPACITY_BUCKET_ENCODED"].value_counts().unstack().fillna(0)
 trip_point_dist.plot(kind="bar", stacked=True, figsize=(12, 6))
 plt.title("Crowd Level Distribution by Trip Point")
 plt.ylabel("Number of Entries")
@@ -103,7 +97,7 @@ plt.close()
 # 6. Suburb-Level Crowd Insight
 # ---------------------------------------
 suburb_top = df["SUBURB"].value_counts().head(20).index.tolist()
-suburb_crowd = df[df["SUBURB"].isin(suburb_top)].groupby("SUBURB")["CAPACITY_BUCKET_ENCODED"].mean()
+suburb_crowd = df[df["SUBURB"].isin(suburb_top)].groupby("SUBURB", observed=True)["CAPACITY_BUCKET_ENCODED"].mean()
 suburb_crowd.sort_values(ascending=False).plot(kind="bar", figsize=(12, 6), color="orchid")
 plt.title("Top 20 Suburbs by Average Crowd Level")
 plt.ylabel("Average Crowd Level")
@@ -133,7 +127,7 @@ plt.close()
 # 8. Rush Hour Analysis by Time Band
 # ---------------------------------------
 rush_df = df.dropna(subset=["TIMETABLE_HOUR_BAND", "CAPACITY_BUCKET_ENCODED"])
-grouped = rush_df.groupby(["TIMETABLE_HOUR_BAND", "CAPACITY_BUCKET_ENCODED"]).size().unstack().fillna(0)
+grouped = rush_df.groupby(["TIMETABLE_HOUR_BAND", "CAPACITY_BUCKET_ENCODED"], observed=True).size().unstack().fillna(0)
 
 def extract_hour(s):
     try:
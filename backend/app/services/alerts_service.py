@@ -1,7 +1,9 @@
 import os
-import requests
+import json
+import hashlib
 from pathlib import Path
 from google.transit import gtfs_realtime_pb2
+from app.services.realtime_feed import FeedPoller
 
 # Load .env locally only (skip on Render)
 if not os.getenv("TFNSW_API_KEY"):
@@ -11,44 +13,114 @@ if not os.getenv("TFNSW_API_KEY"):
 
 TFNSW_API_KEY = os.getenv("TFNSW_API_KEY")
 
+ALERTS_URL = os.getenv("TFNSW_ALERTS_URL", "https://api.transport.nsw.gov.au/v2/gtfs/alerts/buses")
+ALERTS_INTERVAL = float(os.getenv("ALERTS_INTERVAL", "60"))
 
-def get_bus_alerts():
-    url = "https://api.transport.nsw.gov.au/v2/gtfs/alerts/buses"
-    headers = {
-        "Authorization": f"apikey {TFNSW_API_KEY}",
-        "Accept": "application/x-protobuf"
+
+def _translation(text):
+    if text and text.translation:
+        return text.translation[0].text.strip()
+    return ""
+
+
+def _parse_alert(alert):
+    return {
+        "title": _translation(alert.header_text),
+        "message": _translation(alert.description_text),
+        "routes": [e.route_id for e in alert.informed_entity if e.route_id]
     }
 
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        return {
-            "status": response.status_code,
-            "message": "Failed to fetch alerts",
-            "details": response.text
-        }
 
-    feed = gtfs_realtime_pb2.FeedMessage()
-    feed.ParseFromString(response.content)
+def _encode(content):
+    # Same compact encoding FastAPI's JSONResponse uses
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _digest(*parts):
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class AlertSnapshot:
+    """One version of the alerts feed: the alerts, a route_id -> alerts index and encoded bodies."""
+
+    def __init__(self, alerts, content_hash, feed_timestamp):
+        self.alerts = alerts
+        self.content_hash = content_hash
+        self.feed_timestamp = feed_timestamp
+        self.by_route = {}
+        for alert in alerts:
+            for route_id in dict.fromkeys(alert["routes"]):
+                self.by_route.setdefault(route_id, []).append(alert)
+
+        # route (None for all alerts) -> (body, etag); the full body is encoded
+        # up front, per-route bodies the first time a route is asked for
+        self._bodies = {}
+        self.body(None)
+
+    def body(self, route=None):
+        """(encoded JSON body, ETag) of {"alerts": [...]}, optionally only those affecting route."""
+        cached = self._bodies.get(route)
+        if cached is None:
+            alerts = self.alerts if route is None else self.by_route.get(route, [])
+            etag = self.content_hash if route is None else _digest(self.content_hash.encode(), route.encode())
+            cached = self._bodies[route] = (_encode({"alerts": alerts}), f'"{etag}"')
+        return cached
+
+
+class AlertStore:
+    """Parses the alerts feed, reusing the previous snapshot when nothing in it changed.
+
+    Alerts are keyed by a hash of their serialized protobuf, so an alert that is
+    still in the feed keeps its parsed dict, and a feed whose alerts all hash
+    the same as last time returns the previous snapshot with its encoded bodies
+    and ETags untouched.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self._parsed = {}
+
+    def apply(self, content):
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(content)
+
+        hashes, parsed = [], {}
+        for entity in feed.entity:
+            if not entity.HasField("alert"):
+                continue
+            alert_hash = _digest(entity.alert.SerializeToString(deterministic=True))
+            hashes.append(alert_hash)
+            if alert_hash not in parsed:
+                parsed[alert_hash] = self._parsed.get(alert_hash) or _parse_alert(entity.alert)
+
+        content_hash = _digest(*(alert_hash.encode() for alert_hash in hashes))
+        if self.snapshot is None or self.snapshot.content_hash != content_hash:
+            self.snapshot = AlertSnapshot([parsed[alert_hash] for alert_hash in hashes], content_hash,
+                                          feed.header.timestamp)
+        self._parsed = parsed
+        return self.snapshot
+
 
-    alerts = []
-    for entity in feed.entity:
-        if entity.HasField("alert"):
-            alert = entity.alert
+alert_store = AlertStore()
 
-            title = ""
-            if alert.header_text and alert.header_text.translation:
-                title = alert.header_text.translation[0].text.strip()
+bus_alerts = FeedPoller(
+    "service alerts",
+    ALERTS_URL,
+    alert_store.apply,
+    ALERTS_INTERVAL,
+    headers=lambda: {"Authorization": f"apikey {TFNSW_API_KEY}", "Accept": "application/x-protobuf"}
+)
 
-            message = ""
-            if alert.description_text and alert.description_text.translation:
-                message = alert.description_text.translation[0].text.strip()
 
-            routes = [e.route_id for e in alert.informed_entity if e.route_id]
+async def get_alert_snapshot():
+    """(AlertSnapshot, age in seconds, error) from the background alerts poller."""
+    if not TFNSW_API_KEY:
+        return None, None, "API key not found"
+    return await bus_alerts.get_snapshot()
 
-            alerts.append({
-                "title": title,
-                "message": message,
-                "routes": routes
-            })
 
-    return {"alerts": alerts}
+def alerts_failure(error):
+    return {"status": 500, "message": "Failed to fetch alerts", "details": error or "TfNSW fetch failed"}
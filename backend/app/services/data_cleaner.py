@@ -1,14 +1,43 @@
 import os
-import pandas as pd
 import glob
+import time
+import uuid
+import threading
+import numpy as np
+import pandas as pd
+from functools import partial
+from app.utils.streaming_aggregator import map_files
+
+CAPACITY_BUCKET_CODES = {
+    "MANY_SEATS_AVAILABLE": 0,
+    "FEW_SEATS_AVAILABLE": 1,
+    "STANDING_ROOM_ONLY": 2,
+    "CRUSH_CAPACITY": 3
+}
+
+CLEAN_COLUMNS = [
+    "CALENDAR_DATE", "ROUTE", "DIRECTION", "TRIP_POINT", "TIMETABLE_HOUR_BAND",
+    "TIMETABLE_TIME", "ACTUAL_TIME", "SUBURB", "LATITUDE", "LONGITUDE", "CAPACITY_BUCKET"
+]
+
+base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
+raw_folder = os.path.join(base_dir, "datasets")
+output_folder = os.path.join(base_dir, "processed")
+
+CHUNK_SIZE = int(os.getenv("CLEANING_CHUNK_SIZE", "200000"))
+CPU_COUNT = os.cpu_count() or 1
+MAX_WORKERS = int(os.getenv("CLEANING_WORKERS", str(CPU_COUNT)))
+# Finished jobs kept for the status endpoint; older ones are dropped as new jobs start
+MAX_FINISHED_JOBS = int(os.getenv("CLEANING_MAX_FINISHED_JOBS", "20"))
+
+# Background cleaning runs started from the API, keyed by job id
+_jobs = {}
+_jobs_lock = threading.Lock()
+
 
 def encode_capacity_bucket(value):
-    return {
-        "MANY_SEATS_AVAILABLE": 0,
-        "FEW_SEATS_AVAILABLE": 1,
-        "STANDING_ROOM_ONLY": 2,
-        "CRUSH_CAPACITY": 3
-    }.get(value, -1)
+    return CAPACITY_BUCKET_CODES.get(value, -1)
+
 
 def clean_chunk(chunk):
     chunk["TRIP_POINT"] = chunk.get("TRIP_POINT", "Unknown").fillna("Unknown").replace("N/A", "Unknown")
@@ -16,51 +45,185 @@ def clean_chunk(chunk):
     chunk["SUBURB"] = chunk.get("SUBURB", "Unknown").fillna("Unknown").replace("N/A", "Unknown")
 
     # Encode capacity bucket
-    chunk["CAPACITY_BUCKET_ENCODED"] = chunk["CAPACITY_BUCKET"].apply(encode_capacity_bucket)
+    chunk["CAPACITY_BUCKET_ENCODED"] = chunk["CAPACITY_BUCKET"].map(CAPACITY_BUCKET_CODES).fillna(-1).astype(int)
 
     # Drop incomplete rows
     chunk.dropna(subset=["ROUTE", "CAPACITY_BUCKET", "TIMETABLE_HOUR_BAND"], inplace=True)
-    chunk.drop_duplicates(inplace=True)
 
     return chunk
 
-def clean_and_save_all():
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
-    raw_folder = os.path.join(base_dir, "datasets")
-    output_folder = os.path.join(base_dir, "processed")
-    os.makedirs(output_folder, exist_ok=True)
 
-    files = sorted(glob.glob(os.path.join(raw_folder, "*.csv")))
-    total_files = len(files)
+class RowHashes:
+    """Sorted uint64 array of the row hashes written so far.
+
+    Each chunk is looked up with one searchsorted over its sorted hashes and
+    the new ones are merged in with one np.insert, so de-duplication never
+    loops over rows in Python.
+    """
+
+    def __init__(self):
+        self.values = np.empty(0, dtype=np.uint64)
 
-    print(f"Found {total_files} CSV files to process in: {raw_folder}")
+    def __len__(self):
+        return len(self.values)
 
-    for idx, file in enumerate(files, 1):
-        print(f"[{idx}/{total_files}] Processing {os.path.basename(file)}...")
+    def add_new(self, hashes):
+        """Add hashes (distinct within the call); returns a mask of the ones not seen before."""
+        order = np.argsort(hashes)
+        ordered = hashes[order]
+        # Sorted keys keep the binary searches close together in memory
+        positions = np.searchsorted(self.values, ordered)
+        found = np.zeros(len(ordered), dtype=bool)
+        inside = positions < len(self.values)
+        found[inside] = self.values[positions[inside]] == ordered[inside]
+        self.values = np.insert(self.values, positions[~found], ordered[~found])
 
-        try:
-            output_file = os.path.join(output_folder, os.path.basename(file))
-            if os.path.exists(output_file):
-                os.remove(output_file)
+        is_new = np.empty(len(hashes), dtype=bool)
+        is_new[order] = ~found
+        return is_new
 
+
+def _drop_seen(chunk, seen):
+    # Keep rows whose 64-bit row hash has not been written yet, in this chunk or an earlier one
+    hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+    keep = ~pd.Series(hashes).duplicated().to_numpy()
+    keep[keep] = seen.add_new(hashes[keep])
+    return chunk[keep]
+
+
+def clean_file(file, output_folder, chunksize=None):
+    """Clean one raw CSV into output_folder, de-duplicating rows across the whole file."""
+    start_time = time.time()
+    output_file = os.path.join(output_folder, os.path.basename(file))
+    tmp_file = output_file + ".tmp"
+    seen = RowHashes()
+    rows_in, rows_out = 0, 0
+
+    try:
+        with open(tmp_file, "w", newline="") as out:
             chunk_iter = pd.read_csv(
                 file,
                 dtype=str,
-                chunksize=10000,
-                usecols=lambda col: col in [
-                    "CALENDAR_DATE", "ROUTE", "DIRECTION", "TRIP_POINT", "TIMETABLE_HOUR_BAND",
-                    "TIMETABLE_TIME", "ACTUAL_TIME", "SUBURB", "LATITUDE", "LONGITUDE", "CAPACITY_BUCKET"
-                ]
+                chunksize=chunksize or CHUNK_SIZE,
+                usecols=lambda col: col in CLEAN_COLUMNS
             )
+            for chunk_num, chunk in enumerate(chunk_iter):
+                rows_in += len(chunk)
+                cleaned = _drop_seen(clean_chunk(chunk), seen)
+                cleaned.to_csv(out, index=False, header=chunk_num == 0)
+                rows_out += len(cleaned)
+        # Readers never see a half-written file
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    return {
+        "file": os.path.basename(file),
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "seconds": round(time.time() - start_time, 2)
+    }
+
+
+def clean_and_save_all(max_workers=None, progress=None):
+    """Clean every CSV in datasets/ into processed/, one file per worker process.
+
+    progress, if given, is called with the running summary after each file.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+
+    files = sorted(glob.glob(os.path.join(raw_folder, "*.csv")))
+    total_files = len(files)
+    # Never more worker processes than CPUs, whatever the caller or CLEANING_WORKERS asks for
+    max_workers = max(1, min(MAX_WORKERS if max_workers is None else max_workers, CPU_COUNT))
+
+    print(f"Found {total_files} CSV files to process in: {raw_folder} ({max_workers} worker(s))")
+
+    start_time = time.time()
+    summary = {
+        "total_files": total_files,
+        "files_done": 0,
+        "files_failed": 0,
+        "rows_in": 0,
+        "rows_out": 0,
+        "rows_per_second": 0.0,
+        "failed": []
+    }
+
+    worker = partial(clean_file, output_folder=output_folder)
+    for file, stats, error in map_files(worker, files, max_workers):
+        if error is not None:
+            summary["files_failed"] += 1
+            summary["failed"].append(os.path.basename(file))
+            print(f" - Failed to process {file}: {error}")
+        else:
+            summary["files_done"] += 1
+            summary["rows_in"] += stats["rows_in"]
+            summary["rows_out"] += stats["rows_out"]
+            file_rate = stats["rows_in"] / max(stats["seconds"], 1e-9)
+            print(f"[{summary['files_done'] + summary['files_failed']}/{total_files}] {stats['file']}: "
+                  f"{stats['rows_in']:,} -> {stats['rows_out']:,} rows in {stats['seconds']}s "
+                  f"({file_rate:,.0f} rows/s)")
+
+        elapsed = time.time() - start_time
+        summary["rows_per_second"] = round(summary["rows_in"] / max(elapsed, 1e-9), 1)
+        if progress is not None:
+            progress(dict(summary))
+
+    summary["seconds"] = round(time.time() - start_time, 2)
+    print(f"Cleaning complete: {summary['rows_in']:,} rows in {summary['seconds']}s "
+          f"({summary['rows_per_second']:,.0f} rows/s)")
+    return summary
+
+
+def _run_job(job_id, max_workers):
+    def update(progress):
+        with _jobs_lock:
+            _jobs[job_id]["progress"] = progress
+
+    try:
+        summary = clean_and_save_all(max_workers=max_workers, progress=update)
+        with _jobs_lock:
+            _jobs[job_id].update(status="completed", progress=summary, finished_at=time.time())
+    except Exception as e:
+        print(f"[ERROR] Cleaning job {job_id} failed: {e}")
+        with _jobs_lock:
+            _jobs[job_id].update(status="failed", error=str(e), finished_at=time.time())
+
+
+def _evict_finished_jobs():
+    # Caller holds _jobs_lock
+    finished = sorted(
+        (job["finished_at"], job_id) for job_id, job in _jobs.items() if job["finished_at"] is not None
+    )
+    for _, job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS + 1)]:
+        del _jobs[job_id]
+
 
-            for chunk_num, chunk in enumerate(chunk_iter, 1):
-                cleaned = clean_chunk(chunk)
-                cleaned.to_csv(output_file, mode='a', index=False, header=not os.path.exists(output_file))
-                print(f" - Chunk {chunk_num} cleaned and written.")
+def start_cleaning_job(max_workers=None):
+    """Start clean_and_save_all in a background thread; only one run at a time."""
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job["status"] == "running":
+                return dict(job)
+        _evict_finished_jobs()
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "status": "running",
+            "started_at": time.time(),
+            "finished_at": None,
+            "progress": None,
+            "error": None
+        }
+        job = dict(_jobs[job_id])
 
-            print(" - Done")
+    threading.Thread(target=_run_job, args=(job_id, max_workers), daemon=True).start()
+    return job
 
-        except Exception as e:
-            print(f" - Failed to process {file}: {e}")
 
-    print("Cleaning complete.")
+def get_cleaning_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job is not None else None
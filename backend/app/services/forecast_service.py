@@ -1,93 +1,121 @@
 import os
-import glob
 import pandas as pd
 import json
+import threading
 from pathlib import Path
+from app.utils.file_manifest import scan_csv_files, load_manifest, save_manifest
+from app.utils.streaming_aggregator import aggregate_file, refresh_partials
 
 # Paths
 base_dir = Path(__file__).resolve().parents[3]
 data_dir = base_dir / "processed_with_route"
 cache_file = base_dir / "insight_outputs" / "forecast_weekly.json"
+partials_file = base_dir / "insight_outputs" / "forecast_weekly_partials.json"
 os.makedirs(cache_file.parent, exist_ok=True)
 
-def get_weekly_forecast():
-    # Load from cache if available
-    if cache_file.exists():
-        print(f"[CACHE] Returning saved forecast from {cache_file}")
-        with open(cache_file, "r") as f:
-            return json.load(f)
+# (source manifest, result) of the last forecast served from this process
+_cached = None
+_refresh_lock = threading.Lock()
 
-    print(f"[INFO] Looking for CSVs in: {data_dir}")
-    all_files = sorted(glob.glob(str(data_dir / "*.csv")))
-    print(f"[INFO] Found {len(all_files)} files")
-
-    total_rows = 0
-    df_list = []
-
-    for file in all_files:
-        print(f"[INFO] Reading file: {file}")
-        try:
-            df = pd.read_csv(file, usecols=["CALENDAR_DATE", "TIMETABLE_HOUR_BAND", "CAPACITY_BUCKET_ENCODED"])
-            row_count = len(df)
-            total_rows += row_count
-            print(f"[INFO] Loaded {row_count} rows from {Path(file).name}")
-            df_list.append(df)
-        except Exception as e:
-            print(f"[ERROR] Failed to read {file}: {e}")
-
-    if not df_list:
-        print("[WARN] No data loaded from any CSV")
-        return {"weekly_forecast": {}, "time_band_forecast": {}}
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+FORECAST_COLUMNS = ["CALENDAR_DATE", "TIMETABLE_HOUR_BAND", "CAPACITY_BUCKET_ENCODED"]
 
-    df = pd.concat(df_list, ignore_index=True)
-    print(f"[INFO] Total rows combined from all files: {total_rows}")
-    print(df.head(3))
 
+def _chunk_partial(df):
     df['CALENDAR_DATE'] = pd.to_datetime(df['CALENDAR_DATE'], format='%d/%b/%y', errors='coerce')
     df['CAPACITY_BUCKET_ENCODED'] = pd.to_numeric(df['CAPACITY_BUCKET_ENCODED'], errors='coerce')
-    before_drop = len(df)
     df = df.dropna(subset=["CALENDAR_DATE", "CAPACITY_BUCKET_ENCODED", "TIMETABLE_HOUR_BAND"])
-    print(f"[INFO] Dropped {before_drop - len(df)} rows with missing/invalid data")
+    df = df.assign(weekday=df['CALENDAR_DATE'].dt.day_name())
+    bands = (
+        df.groupby(['weekday', 'TIMETABLE_HOUR_BAND'], observed=True)['CAPACITY_BUCKET_ENCODED']
+        .agg(['sum', 'count'])
+    )
+    return {"bands": bands}
 
-    if df.empty:
-        print("[WARN] All rows dropped after cleaning — no valid data")
-        return {"weekly_forecast": {}, "time_band_forecast": {}}
 
-    df['weekday'] = df['CALENDAR_DATE'].dt.day_name()
+def _aggregate_file(file):
+    """Sum and count of CAPACITY_BUCKET_ENCODED per weekday x hour band for one file."""
+    partial = aggregate_file(file, FORECAST_COLUMNS, _chunk_partial, folder="processed_with_route")
+    result = {}
+    if "bands" in partial:
+        for (day, band), row in partial["bands"].iterrows():
+            result.setdefault(day, {})[str(band)] = [float(row['sum']), int(row['count'])]
+    return result
 
-    # Weekly forecast
-    weekday_avg = (
-        df.groupby('weekday')['CAPACITY_BUCKET_ENCODED']
-        .mean()
-        .reindex(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
-        .round(2)
-        .fillna(0)
-        .to_dict()
-    )
 
-    # Hourly bands forecast grouped by weekday and time
-    time_band = (
-        df.groupby(['weekday', 'TIMETABLE_HOUR_BAND'])['CAPACITY_BUCKET_ENCODED']
-        .mean()
-        .round(2)
-        .reset_index()
-    )
+def _merge_partials(partials):
+    totals = {}
+    for partial in partials.values():
+        for day, bands in partial.items():
+            for band, (total, count) in bands.items():
+                entry = totals.setdefault(day, {}).setdefault(band, [0.0, 0])
+                entry[0] += total
+                entry[1] += count
 
-    # Convert to nested dict: { weekday: { time_band: avg } }
+    # Weekly forecast
+    weekday_avg = {}
+    for day in WEEKDAYS:
+        bands = totals.get(day, {})
+        total = sum(entry[0] for entry in bands.values())
+        count = sum(entry[1] for entry in bands.values())
+        weekday_avg[day] = round(total / count, 2) if count else 0
+
+    # Hourly bands forecast as nested dict: { weekday: { time_band: avg } }
     time_band_forecast = {}
-    for _, row in time_band.iterrows():
-        day = row['weekday']
-        time_band = row['TIMETABLE_HOUR_BAND']
-        value = row['CAPACITY_BUCKET_ENCODED']
-        time_band_forecast.setdefault(day, {})[time_band] = value
+    for day in sorted(totals):
+        for band in sorted(totals[day]):
+            total, count = totals[day][band]
+            time_band_forecast.setdefault(day, {})[band] = round(total / count, 2)
 
-    result = {
+    return {
         "weekly_forecast": weekday_avg,
         "time_band_forecast": time_band_forecast
     }
 
+
+def get_weekly_forecast():
+    current = scan_csv_files(data_dir)
+    cached = _cached
+    if cached is not None and cached[0] == current:
+        return cached[1]
+
+    # One refresh at a time: concurrent first requests wait for it instead of each rescanning
+    with _refresh_lock:
+        if _cached is not None and _cached[0] == current:
+            return _cached[1]
+        return _compute_weekly_forecast(current)
+
+
+def _compute_weekly_forecast(current):
+    global _cached
+    # No source data on this host: keep serving the last computed forecast
+    if not current and cache_file.exists():
+        print(f"[CACHE] No CSVs in {data_dir}, returning saved forecast from {cache_file}")
+        with open(cache_file, "r") as f:
+            return json.load(f)
+
+    # Load from cache if the source files are unchanged since it was built
+    if cache_file.exists() and load_manifest(partials_file).get("manifest") == current:
+        print(f"[CACHE] Returning saved forecast from {cache_file}")
+        with open(cache_file, "r") as f:
+            result = json.load(f)
+        _cached = (current, result)
+        return result
+
+    print(f"[INFO] Looking for data in: {data_dir}")
+    print(f"[INFO] Found {len(current)} files")
+    partials, _ = refresh_partials(partials_file, data_dir, _aggregate_file)
+
+    if not any(partials.values()):
+        print("[WARN] No valid data loaded from any CSV")
+        return {"weekly_forecast": {}, "time_band_forecast": {}}
+
+    result = _merge_partials(partials)
+
     print(f"[INFO] Final result: {json.dumps(result, indent=2)[:300]}...")  # partial print
-    with open(cache_file, "w") as f:
-        json.dump(result, f)
+    save_manifest(cache_file, result)
 
+    _cached = (current, result)
     return result
@@ -1,59 +1,105 @@
-import pandas as pd
-import glob
-import os
+import threading
 from collections import Counter
-
-# Load and process historical data
-def load_historical_crowd_data():
-    base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../datasets"))
-    files = glob.glob(os.path.join(base_path, "*.csv"))
-
-    print(f"Found {len(files)} CSV file(s) in {base_path}")
-
-    all_data = []
-
-    for file in files:
-        try:
-            print(f"Reading file: {os.path.basename(file)}")
-            chunks = pd.read_csv(file, usecols=['ROUTE', 'CAPACITY_BUCKET'], chunksize=100000, low_memory=False)
-
-            for chunk in chunks:
-                chunk = chunk.dropna(subset=['ROUTE', 'CAPACITY_BUCKET'])
-                all_data.append(chunk)
-
-        except Exception as e:
-            print(f"Error reading {file}: {e}")
-
-    if all_data:
-        return pd.concat(all_data, ignore_index=True)
-    else:
-        return pd.DataFrame(columns=['ROUTE', 'CAPACITY_BUCKET'])
+from pathlib import Path
+from app.utils.file_manifest import file_signature, load_manifest
+from app.utils.streaming_aggregator import aggregate_file, refresh_partials
+
+base_dir = Path(__file__).resolve().parents[3]
+data_dir = base_dir / "datasets"
+index_file = base_dir / "insight_outputs" / "historical_crowd_index.json"
+CHUNK_SIZE = 100000
+
+# Pre-aggregated route -> {capacity bucket: count}, kept in memory and on disk.
+# _index_signature is the index file's signature the in-memory copy matches.
+_index = None
+_index_signature = None
+_refresh_lock = threading.Lock()
+
+
+def _count_chunk(chunk):
+    chunk = chunk.dropna(subset=['ROUTE', 'CAPACITY_BUCKET'])
+    return {"counts": chunk.groupby(['ROUTE', 'CAPACITY_BUCKET'], observed=True).size().to_frame("count")}
+
+
+def _count_file(csv_path):
+    partial = aggregate_file(csv_path, ['ROUTE', 'CAPACITY_BUCKET'], _count_chunk, folder="datasets",
+                             chunksize=CHUNK_SIZE)
+    counts = {}
+    if "counts" in partial:
+        for (route, bucket), count in partial["counts"]["count"].items():
+            counts.setdefault(str(route), {})[str(bucket)] = int(count)
+    return counts
+
+
+def _merge_partials(partials):
+    totals = {}
+    for partial in partials.values():
+        for route, buckets in partial.items():
+            totals.setdefault(route, Counter()).update(buckets)
+
+    index = {}
+    for route, counter in totals.items():
+        # Same ordering value_counts() gave: most frequent bucket first
+        index[route] = {
+            "total_records": sum(counter.values()),
+            "crowd_levels": dict(counter.most_common())
+        }
+    return {"routes": index, "route_ids": sorted(index)}
+
+
+def _stored_signature():
+    try:
+        return file_signature(index_file)
+    except OSError:
+        return None
+
+
+def refresh_historical_index():
+    """Re-count only the dataset files that are new or changed since the last build."""
+    global _index, _index_signature
+    with _refresh_lock:
+        partials, changed = refresh_partials(index_file, data_dir, _count_file)
+        if changed or _index is None:
+            _index = _merge_partials(partials)
+        _index_signature = _stored_signature()
+        return _index
+
+
+def get_historical_index():
+    global _index, _index_signature
+    # One stat per request: a refresh saved by another process (a worker's
+    # startup refresh) changes the index file and is reloaded from it
+    signature = _stored_signature()
+    if _index is not None and signature == _index_signature:
+        return _index
+    # Serve the last persisted index straight away; building from scratch only
+    # happens when nothing has been indexed yet.
+    stored = load_manifest(index_file)
+    if stored.get("partials"):
+        _index = _merge_partials(stored["partials"])
+        _index_signature = signature
+        return _index
+    return refresh_historical_index()
 
 
 # API logic: return average crowd level for a given route
 def get_average_crowd(route_id: str):
-    df = load_historical_crowd_data()
+    index = get_historical_index()
 
-    if df.empty:
+    if not index["routes"]:
         return {"error": "No data available"}
 
-    # Filter by ROUTE
-    route_df = df[df['ROUTE'].astype(str) == str(route_id)]
-
-    if route_df.empty:
+    route_stats = index["routes"].get(str(route_id))
+    if route_stats is None:
         return {"error": f"No data found for route {route_id}"}
 
-    # Count crowd levels
-    bucket_counts = route_df['CAPACITY_BUCKET'].value_counts().to_dict()
-
     return {
         "route": route_id,
-        "total_records": len(route_df),
-        "crowd_levels": bucket_counts
+        "total_records": route_stats["total_records"],
+        "crowd_levels": route_stats["crowd_levels"]
     }
 
 
 # Helper to list available routes
 def get_available_bus_ids():
-    df = load_historical_crowd_data()
-    return df['ROUTE'].dropna().astype(str).unique().tolist()
+    return get_historical_index()["route_ids"]
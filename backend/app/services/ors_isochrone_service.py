@@ -1,6 +1,7 @@
 import os
-import requests
 from pathlib import Path
+from app.utils import http_client
+from app.utils.geo_cache import ors_cache, quantize
 
 # Load .env locally only (skip on Render)
 if not os.getenv("ORS_API_KEY"):
@@ -10,9 +11,15 @@ if not os.getenv("ORS_API_KEY"):
 
 # Load API key from environment
 ORS_API_KEY = os.getenv("ORS_API_KEY")
+ORS_BASE_URL = os.getenv("ORS_BASE_URL", "https://api.openrouteservice.org")
 
-def get_isochrone(lon: float, lat: float, range_seconds: int = 600, profile: str = "foot-walking"):
-    url = f"https://api.openrouteservice.org/v2/isochrones/{profile}"
+async def get_isochrone(lon: float, lat: float, range_seconds: int = 600, profile: str = "foot-walking"):
+    key = [profile, quantize(lon, lat), range_seconds]
+    return await ors_cache.get_or_fetch("isochrone", key, lambda: _fetch_isochrone(lon, lat, range_seconds, profile))
+
+async def _fetch_isochrone(lon, lat, range_seconds, profile):
+    """(payload, cacheable); only 200 responses are cacheable."""
+    url = f"{ORS_BASE_URL}/v2/isochrones/{profile}"
     headers = {
         "Authorization": ORS_API_KEY,
         "Content-Type": "application/json"
@@ -22,14 +29,14 @@ def get_isochrone(lon: float, lat: float, range_seconds: int = 600, profile: str
         "range": [range_seconds]
     }
 
-    response = requests.post(url, json=body, headers=headers)
+    response = await http_client.post(url, json=body, headers=headers)
 
     try:
-        return response.json()
+        return response.json(), response.status_code == 200
     except Exception as e:
         return {
             "status": response.status_code,
             "message": "Invalid JSON",
             "details": str(e),
             "raw": response.text
-        }
+        }, False
@@ -1,6 +1,10 @@
 import os
-import requests
+import time
+import asyncio
+import numpy as np
 from pathlib import Path
+from app.utils import http_client
+from app.utils.geo_cache import ors_cache, quantize
 
 # Load .env locally only (skip on Render)
 if not os.getenv("ORS_API_KEY"):
@@ -10,28 +14,164 @@ if not os.getenv("ORS_API_KEY"):
 
 # Load API key from environment
 ORS_API_KEY = os.getenv("ORS_API_KEY")
+ORS_BASE_URL = os.getenv("ORS_BASE_URL", "https://api.openrouteservice.org")
 
-def get_matrix_durations_and_distances(coords: list, profile: str = "driving-car"):
-    url = f"https://api.openrouteservice.org/v2/matrix/{profile}"
+# An M x N request is split into tiles of at most TILE_SIZE sources by
+# TILE_SIZE destinations (25 x 25 keeps each call within the public API's
+# 50 locations / 3500 routes). Tiles go through the geo-cache one by one, so a
+# tile seen before is answered locally, and the rest run CONCURRENCY at a
+# time, started no faster than RATE_PER_MINUTE. Requests over MAX_LOCATIONS
+# coordinates or MAX_TILES tiles are refused rather than held open for minutes.
+TILE_SIZE = int(os.getenv("ORS_MATRIX_TILE_SIZE", "25"))
+CONCURRENCY = int(os.getenv("ORS_MATRIX_CONCURRENCY", "4"))
+RATE_PER_MINUTE = float(os.getenv("ORS_MATRIX_RATE_PER_MINUTE", "40"))
+MAX_LOCATIONS = int(os.getenv("ORS_MATRIX_MAX_LOCATIONS", "200"))
+MAX_TILES = int(os.getenv("ORS_MATRIX_MAX_TILES", "16"))
+
+
+class RateLimiter:
+    """Spaces calls at least 60 / per_minute seconds apart across the whole process."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = 0.0
+
+    async def wait(self):
+        # Reserving the slot before sleeping keeps concurrent callers in order without a lock
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+rate_limiter = RateLimiter(RATE_PER_MINUTE)
+
+
+def _tiles(count, size):
+    return [list(range(start, min(start + size, count))) for start in range(0, count, size)]
+
+
+def tile_count(n_sources, n_destinations):
+    """Number of TILE_SIZE x TILE_SIZE upstream calls an n_sources x n_destinations matrix needs."""
+    return -(-n_sources // TILE_SIZE) * -(-n_destinations // TILE_SIZE)
+
+
+def resolve_indices(count, sources=None, destinations=None):
+    """(sources, destinations) index lists for count locations, filling in the defaults.
+
+    With neither given, the first location is the only source and the rest
+    are destinations, as this endpoint has always done; if only one is given
+    the other defaults to every location.
+    """
+    if sources is None and destinations is None:
+        return [0], list(range(1, count))
+    sources = list(range(count)) if sources is None else list(sources)
+    destinations = list(range(count)) if destinations is None else list(destinations)
+    return sources, destinations
+
+
+async def _fetch_tile(source_coords, destination_coords, profile, semaphore):
+    """(payload, cacheable) for one tile; only complete 200 responses are cacheable."""
+    url = f"{ORS_BASE_URL}/v2/matrix/{profile}"
     headers = {
         "Authorization": ORS_API_KEY,
         "Content-Type": "application/json"
     }
 
     body = {
-        "locations": coords,
-        "sources": [0],  # first is origin
-        "destinations": list(range(1, len(coords)))
+        "locations": source_coords + destination_coords,
+        "sources": list(range(len(source_coords))),
+        "destinations": list(range(len(source_coords), len(source_coords) + len(destination_coords))),
+        "metrics": ["duration", "distance"]
     }
 
-    response = requests.post(url, json=body, headers=headers)
+    async with semaphore:
+        await rate_limiter.wait()
+        response = await http_client.post(url, json=body, headers=headers)
 
     try:
-        return response.json()
+        data = response.json()
     except Exception as e:
         return {
             "status": response.status_code,
             "message": "Invalid JSON response",
             "details": str(e),
             "raw": response.text
-        }
+        }, False
+
+    if response.status_code != 200 or "durations" not in data:
+        return {
+            "status": response.status_code,
+            "message": "ORS matrix request failed",
+            "details": data
+        }, False
+    return {"durations": data["durations"], "distances": data.get("distances")}, True
+
+
+def _as_array(rows, shape):
+    # ORS reports unreachable pairs as null
+    if rows is None:
+        return np.full(shape, np.nan)
+    return np.array([[np.nan if value is None else value for value in row] for row in rows], dtype=np.float64)
+
+
+async def plan_matrix(coords, sources, destinations, profile="driving-car"):
+    """Dense durations/distances between coords[sources] and coords[destinations], fetched tile by tile.
+
+    Returns {"durations": ndarray, "distances": ndarray, "tiles": {...}} with
+    NaN for unreachable pairs, or the error payload of the first failed tile.
+    """
+    durations = np.full((len(sources), len(destinations)), np.nan)
+    distances = np.full((len(sources), len(destinations)), np.nan)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    upstream = 0
+
+    async def run_tile(source_rows, destination_cols):
+        source_coords = [coords[sources[i]] for i in source_rows]
+        destination_coords = [coords[destinations[j]] for j in destination_cols]
+        key = [profile, [quantize(*c) for c in source_coords], [quantize(*c) for c in destination_coords]]
+
+        async def fetch():
+            nonlocal upstream
+            upstream += 1
+            return await _fetch_tile(source_coords, destination_coords, profile, semaphore)
+
+        return source_rows, destination_cols, await ors_cache.get_or_fetch("matrix", key, fetch)
+
+    tiles = [(rows, cols) for rows in _tiles(len(sources), TILE_SIZE) for cols in _tiles(len(destinations), TILE_SIZE)]
+    results = await asyncio.gather(*(run_tile(rows, cols) for rows, cols in tiles))
+
+    for rows, cols, payload in results:
+        if "durations" not in payload:
+            return payload
+        block = np.ix_(rows, cols)
+        durations[block] = _as_array(payload["durations"], (len(rows), len(cols)))
+        distances[block] = _as_array(payload["distances"], (len(rows), len(cols)))
+
+    return {
+        "durations": durations,
+        "distances": distances,
+        "tiles": {"total": len(tiles), "upstream": upstream, "cached": len(tiles) - upstream}
+    }
+
+
+def _to_json(matrix):
+    return np.where(np.isnan(matrix), None, matrix).tolist()
+
+
+async def get_matrix_durations_and_distances(coords: list, profile: str = "driving-car", sources=None,
+                                             destinations=None):
+    """Matrix between sources and destinations (indices into coords, defaults as in resolve_indices)."""
+    sources, destinations = resolve_indices(len(coords), sources, destinations)
+
+    result = await plan_matrix(coords, sources, destinations, profile)
+    if "tiles" not in result:
+        return result
+    return {
+        "durations": _to_json(result["durations"]),
+        "distances": _to_json(result["distances"]),
+        "sources": sources,
+        "destinations": destinations,
+        "tiles": result["tiles"]
+    }
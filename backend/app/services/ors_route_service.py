@@ -1,6 +1,7 @@
 import os
-import requests
 from pathlib import Path
+from app.utils import http_client
+from app.utils.geo_cache import ors_cache, quantize
 
 # Load .env locally only (skip on Render)
 if not os.getenv("ORS_API_KEY"):
@@ -16,9 +17,19 @@ if not os.getenv("ORS_API_KEY"):
 
 # Load API key from environment
 ORS_API_KEY = os.getenv("ORS_API_KEY")
+ORS_BASE_URL = os.getenv("ORS_BASE_URL", "https://api.openrouteservice.org")
+PROFILE = "driving-car"
 
-def get_route_duration_and_distance(start_coords: list, end_coords: list):
-    url = "https://api.openrouteservice.org/v2/directions/driving-car"
+async def get_route_duration_and_distance(start_coords: list, end_coords: list):
+    # Answers for start/end points within ~10 m of an earlier request come from the geo-cache
+    key = [PROFILE, quantize(*start_coords), quantize(*end_coords)]
+    return await ors_cache.get_or_fetch(
+        "route", key, lambda: _fetch_route_duration_and_distance(start_coords, end_coords)
+    )
+
+async def _fetch_route_duration_and_distance(start_coords, end_coords):
+    """(payload, cacheable); only successful summaries are cacheable."""
+    url = f"{ORS_BASE_URL}/v2/directions/{PROFILE}"
     headers = {
         "Authorization": ORS_API_KEY,
         "Content-Type": "application/json"
@@ -27,7 +38,7 @@ def get_route_duration_and_distance(start_coords: list, end_coords: list):
         "coordinates": [start_coords, end_coords]
     }
 
-    response = requests.post(url, json=body, headers=headers)
+    response = await http_client.post(url, json=body, headers=headers)
 
     try:
         data = response.json()
@@ -37,25 +48,25 @@ def get_route_duration_and_distance(start_coords: list, end_coords: list):
             "message": "Invalid JSON response",
             "details": str(e),
             "raw": response.text
-        }
+        }, False
 
     if response.status_code != 200:
         return {
             "status": response.status_code,
             "message": "ORS request failed",
             "details": data
-        }
+        }, False
 
     if "routes" not in data or not data["routes"]:
         return {
             "status": response.status_code,
             "message": "No routes returned in ORS response",
             "details": data
-        }
+        }, False
 
     summary = data["routes"][0]["summary"]
 
     return {
         "distance_meters": summary["distance"],
         "duration_minutes": summary["duration"] / 60
-    }
+    }, True
@@ -0,0 +1,132 @@
+import time
+import asyncio
+from fastapi.responses import JSONResponse, Response
+from app.utils import http_client
+
+# Background pollers for the TfNSW GTFS-realtime feeds.
+#
+# Each FeedPoller fetches one feed on a fixed interval and keeps the latest
+# parsed snapshot in memory, so request handlers never call upstream
+# themselves: upstream load is one request per interval however many clients
+# are connected. Fetches are conditional (ETag / Last-Modified), so an
+# unchanged feed costs a 304 and no re-parse. Pollers run as asyncio tasks on
+# the app's event loop and share the pooled client in app.utils.http_client.
+
+
+class FeedPoller:
+    """Keep parse(response.content) of url fresh, refetching every interval seconds."""
+
+    def __init__(self, name, url, parse, interval, headers=None):
+        self.name = name
+        self.url = url
+        self.parse = parse
+        self.interval = interval
+        self.headers = headers or {}
+
+        self._task = None
+        self._fetch_lock = None
+        self._etag = None
+        self._last_modified = None
+        self.snapshot = None
+        self.fetched_at = None  # last time upstream confirmed the snapshot (200 or 304)
+        self.last_error = None
+        self.stats = {"fetches": 0, "not_modified": 0, "errors": 0}
+
+    async def poll_once(self):
+        """Fetch the feed once; returns True if the snapshot changed."""
+        headers = dict(self.headers() if callable(self.headers) else self.headers)
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+
+        try:
+            response = await http_client.get(self.url, headers=headers)
+            self.stats["fetches"] += 1
+            if response.status_code == 304:
+                self.stats["not_modified"] += 1
+                self.fetched_at = time.time()
+                self.last_error = None
+                return False
+            if response.status_code != 200:
+                raise RuntimeError(f"{self.name} fetch failed with status {response.status_code}")
+
+            # Parsing a large protobuf is CPU work; keep it off the event loop
+            snapshot = await asyncio.to_thread(self.parse, response.content)
+            self.snapshot = snapshot
+            self.fetched_at = time.time()
+            self.last_error = None
+            self._etag = response.headers.get("ETag")
+            self._last_modified = response.headers.get("Last-Modified")
+            return True
+        except Exception as e:
+            self.stats["errors"] += 1
+            self.last_error = str(e) or repr(e)
+            print(f"[ERROR] {self.name} poll failed: {self.last_error}")
+            return False
+
+    async def _run(self):
+        while True:
+            started = time.time()
+            await self.poll_once()
+            await asyncio.sleep(max(self.interval - (time.time() - started), 0))
+
+    def start(self):
+        """Start polling on the running event loop (call from an async startup hook)."""
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        print(f"[INFO] Polling {self.name} every {self.interval}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def get_snapshot(self):
+        """(snapshot, age in seconds, last error).
+
+        Without a running poller (e.g. startup hooks not run) the first call
+        fetches so the endpoint still answers.
+        """
+        if self.snapshot is None and not self.running:
+            if self._fetch_lock is None:
+                self._fetch_lock = asyncio.Lock()
+            async with self._fetch_lock:
+                # Concurrent first requests share one fetch
+                if self.snapshot is None:
+                    await self.poll_once()
+        age = None if self.fetched_at is None else max(time.time() - self.fetched_at, 0)
+        return self.snapshot, age, self.last_error
+
+
+def snapshot_response(content, age, status_code=200):
+    """JSONResponse for a snapshot-backed endpoint; Age is how stale the snapshot is, in seconds."""
+    headers = {"Age": str(int(age))} if age is not None else None
+    return JSONResponse(status_code=status_code, content=content, headers=headers)
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value covers etag (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def encoded_response(body, etag, age, if_none_match=None):
+    """Response for a pre-encoded JSON body; 304 with no body when the client already has etag."""
+    headers = {"ETag": etag}
+    if age is not None:
+        headers["Age"] = str(int(age))
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
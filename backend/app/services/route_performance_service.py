@@ -1,81 +1,193 @@
 import os
-import glob
+import numpy as np
 import pandas as pd
 import json
+import threading
 from pathlib import Path
+from app.utils.file_manifest import scan_csv_files, load_manifest, save_manifest
+from app.utils.streaming_aggregator import aggregate_file, refresh_partials
 
 base_dir = Path(__file__).resolve().parents[3]
 data_dir = base_dir / "datasets"
 cache_file = base_dir / "insight_outputs" / "route_performance.json"
+partials_file = base_dir / "insight_outputs" / "route_performance_partials.json"
 os.makedirs(cache_file.parent, exist_ok=True)
 
-def get_route_performance():
-    if cache_file.exists():
-        print(f"[CACHE] Returning saved route performance from {cache_file}")
-        with open(cache_file, "r") as f:
-            return json.load(f)
+# (source manifest, result) of the last route performance served from this process
+_cached = None
+_refresh_lock = threading.Lock()
 
-    print(f"[INFO] Looking for CSVs in: {data_dir}")
-    all_files = sorted(glob.glob(str(data_dir / "*.csv")))
-    print(f"[INFO] Found {len(all_files)} files")
-
-    df_list = []
-    for file in all_files:
-        print(f"[INFO] Reading file: {file}")
-        try:
-            df = pd.read_csv(file, usecols=["ROUTE", "TIMETABLE_TIME", "ACTUAL_TIME", "CAPACITY_BUCKET", "TRANSIT_STOP_DESCRIPTION"])
-            df_list.append(df)
-            print(f"[INFO] Loaded {len(df)} rows from {Path(file).name}")
-        except Exception as e:
-            print(f"[ERROR] Failed to read {file}: {e}")
-
-    if not df_list:
-        print("[WARN] No data loaded from any CSV")
-        return {"route_performance": {}}
+capacity_map = {
+    "MANY_SEATS_AVAILABLE": 0,
+    "FEW_SEATS_AVAILABLE": 1,
+    "STANDING_ROOM_ONLY": 2,
+    "CRUSH_CAPACITY": 3
+}
+
+MINUTES_PER_DAY = 24 * 60
+
+# Bump when the per-file partial format or its computation changes
+PARTIALS_VERSION = 3
+
+
+# Time parsing
+def times_to_minutes(values):
+    """Minutes since midnight for "H:MM"/"HH:MM" strings; anything else becomes NaN."""
+    text = pd.Series(values, copy=False).astype(object).fillna("").astype(str).str.strip()
+    valid = text.str.len().isin([4, 5]).to_numpy()
+
+    # Left-pad to HH:MM and view each fixed-width string as 5 code points
+    padded = text.str.zfill(5).to_numpy(dtype="U5")
+    chars = padded.view(np.uint32).reshape(-1, 5).astype(np.int64) - ord("0")
+    digits = chars[:, [0, 1, 3, 4]]
+    valid &= (chars[:, 2] == ord(":") - ord("0")) & ((digits >= 0) & (digits <= 9)).all(axis=1)
 
-    df = pd.concat(df_list, ignore_index=True)
-
-    # Encode capacity
-    capacity_map = {
-        "MANY_SEATS_AVAILABLE": 0,
-        "FEW_SEATS_AVAILABLE": 1,
-        "STANDING_ROOM_ONLY": 2,
-        "CRUSH_CAPACITY": 3
-    }
-    df["CAPACITY_BUCKET_ENCODED"] = df["CAPACITY_BUCKET"].map(capacity_map)
-
-    # Time parsing
-    def to_minutes(t):
-        try:
-            h, m = map(int, str(t).split(":"))
-            return h * 60 + m
-        except:
-            return None
-
-    df["timetable_min"] = df["TIMETABLE_TIME"].map(to_minutes)
-    df["actual_min"] = df["ACTUAL_TIME"].map(to_minutes)
-    df["delay_min"] = df["actual_min"] - df["timetable_min"]
-
-    df["ROUTE"] = pd.to_numeric(df["ROUTE"], errors="coerce")
+    minutes = (digits[:, 0] * 10 + digits[:, 1]) * 60 + digits[:, 2] * 10 + digits[:, 3]
+    return np.where(valid, minutes, np.nan)
+
+
+def delay_minutes(timetable, actual):
+    """Actual minus timetabled minutes, wrapped so trips crossing midnight stay within +/-12h."""
+    delay = times_to_minutes(actual) - times_to_minutes(timetable)
+    delay = np.where(delay < -MINUTES_PER_DAY / 2, delay + MINUTES_PER_DAY, delay)
+    return np.where(delay > MINUTES_PER_DAY / 2, delay - MINUTES_PER_DAY, delay)
+
+
+def _category_values(series, convert):
+    # Convert only the distinct values of a (categorical) column, then broadcast by code
+    categorical = series.astype("category")
+    values = convert(categorical.cat.categories.to_series()).to_numpy(dtype=float)
+    return np.append(values, np.nan)[categorical.cat.codes.to_numpy()]
+
+
+PERFORMANCE_COLUMNS = ["ROUTE", "TIMETABLE_TIME", "ACTUAL_TIME", "CAPACITY_BUCKET", "TRANSIT_STOP_DESCRIPTION"]
+
+
+def _chunk_partial(df):
+    df = pd.DataFrame({
+        "ROUTE": _category_values(df["ROUTE"], lambda v: pd.to_numeric(v.astype(object), errors="coerce")),
+        "CAPACITY_BUCKET_ENCODED": _category_values(df["CAPACITY_BUCKET"], lambda v: v.astype(object).map(capacity_map)),
+        "delay_min": delay_minutes(df["TIMETABLE_TIME"], df["ACTUAL_TIME"]),
+        "TRANSIT_STOP_DESCRIPTION": df["TRANSIT_STOP_DESCRIPTION"].to_numpy(),
+        "row": df.index.to_numpy()
+    })
     df = df.dropna(subset=["ROUTE", "delay_min", "CAPACITY_BUCKET_ENCODED", "TRANSIT_STOP_DESCRIPTION"])
 
     # Round route IDs and group
     df["ROUTE"] = df["ROUTE"].astype(int)
+    routes = df.groupby("ROUTE").agg(
+        delay_sum=("delay_min", "sum"),
+        crowd_sum=("CAPACITY_BUCKET_ENCODED", "sum"),
+        count=("delay_min", "size")
+    )
+    # first_row keeps value_counts().idxmax()'s tie-break: the stop seen first wins
+    stops = df.groupby(["ROUTE", "TRANSIT_STOP_DESCRIPTION"]).agg(count=("row", "size"), first_row=("row", "min"))
+    return {"routes": routes, "stops": stops}
+
 
+def _aggregate_file(file):
+    """Per-route delay/crowding sums, row count and [count, first row] of every stop for one file."""
+    partial = aggregate_file(file, PERFORMANCE_COLUMNS, _chunk_partial, folder="datasets")
     result = {}
-    for route_id, group in df.groupby("ROUTE"):
-        avg_delay = group["delay_min"].mean()
-        avg_crowd = group["CAPACITY_BUCKET_ENCODED"].mean()
-        most_common_stop = group["TRANSIT_STOP_DESCRIPTION"].value_counts().idxmax()
+    if "routes" not in partial:
+        return result
+    for route_id, delay_sum, crowd_sum, count in partial["routes"].itertuples(name=None):
         result[str(route_id)] = {
-            "average_delay_minutes": round(avg_delay, 2),
-            "average_crowding_score": round(avg_crowd, 2),
-            "total_trips": len(group),
-            "most_common_stop": most_common_stop
+            "delay_sum": float(delay_sum),
+            "crowd_sum": float(crowd_sum),
+            "count": int(count),
+            "stops": {}
         }
+    for (route_id, stop), count, first_row in partial["stops"][["count", "first_row"]].itertuples(name=None):
+        result[str(route_id)]["stops"][str(stop)] = [int(count), int(first_row)]
+    return result
+
+
+def _merge_partials(partials):
+    routes = pd.DataFrame(
+        [(int(route_id), stats["delay_sum"], stats["crowd_sum"], stats["count"])
+         for partial in partials.values() for route_id, stats in partial.items()],
+        columns=["route", "delay_sum", "crowd_sum", "count"]
+    )
+    # Files in the order the full scan concatenated them
+    stops = pd.DataFrame(
+        [(int(route_id), stop, count, file_rank, first_row)
+         for file_rank, name in enumerate(sorted(partials)) for route_id, stats in partials[name].items()
+         for stop, (count, first_row) in stats["stops"].items()],
+        columns=["route", "stop", "count", "file_rank", "first_row"]
+    )
+
+    # One grouped pass for the sums, one stable sort for the modal stop of every
+    # route; ties go to the stop that occurs first, as value_counts().idxmax() did
+    totals = routes.groupby("route").sum()
+    stop_counts = (
+        stops.sort_values(["file_rank", "first_row"])
+        .groupby(["route", "stop"], as_index=False, sort=False)["count"].sum()
+    )
+    modal_stop = (
+        stop_counts.sort_values("count", ascending=False, kind="stable")
+        .drop_duplicates("route")
+        .set_index("route")["stop"]
+    )
+    totals["average_delay_minutes"] = (totals["delay_sum"] / totals["count"]).round(2)
+    totals["average_crowding_score"] = (totals["crowd_sum"] / totals["count"]).round(2)
+    totals["most_common_stop"] = modal_stop
+
+    result = {}
+    for route_id, delay, crowding, count, stop in totals[
+        ["average_delay_minutes", "average_crowding_score", "count", "most_common_stop"]
+    ].itertuples(name=None):
+        result[str(route_id)] = {
+            "average_delay_minutes": float(delay),
+            "average_crowding_score": float(crowding),
+            "total_trips": int(count),
+            "most_common_stop": stop
+        }
+    return result
+
+
+def get_route_performance():
+    current = scan_csv_files(data_dir)
+    cached = _cached
+    if cached is not None and cached[0] == current:
+        return cached[1]
+
+    # One refresh at a time: concurrent first requests wait for it instead of each rescanning
+    with _refresh_lock:
+        if _cached is not None and _cached[0] == current:
+            return _cached[1]
+        return _compute_route_performance(current)
+
+
+def _compute_route_performance(current):
+    global _cached
+    # No source data on this host: keep serving the last computed result
+    if not current and cache_file.exists():
+        print(f"[CACHE] No CSVs in {data_dir}, returning saved route performance from {cache_file}")
+        with open(cache_file, "r") as f:
+            return json.load(f)
+
+    # Load from cache if the source files are unchanged since it was built
+    stored = load_manifest(partials_file)
+    if cache_file.exists() and stored.get("version") == PARTIALS_VERSION and stored.get("manifest") == current:
+        print(f"[CACHE] Returning saved route performance from {cache_file}")
+        with open(cache_file, "r") as f:
+            result = json.load(f)
+        _cached = (current, result)
+        return result
+
+    print(f"[INFO] Looking for data in: {data_dir}")
+    print(f"[INFO] Found {len(current)} files")
+    partials, _ = refresh_partials(partials_file, data_dir, _aggregate_file, version=PARTIALS_VERSION)
+
+    if not partials:
+        print("[WARN] No data loaded from any CSV")
+        return {"route_performance": {}}
+
+    result = _merge_partials(partials)
 
-    with open(cache_file, "w") as f:
-        json.dump({"route_performance": result}, f, indent=2)
+    save_manifest(cache_file, {"route_performance": result}, indent=2)
 
     print(f"[INFO] Final result: {json.dumps(result, indent=2)[:300]}...")
+    _cached = (current, {"route_performance": result})
     return {"route_performance": result}
@@ -1,9 +1,10 @@
 import os
-import requests
 from google.transit import gtfs_realtime_pb2
 from pathlib import Path
 from datetime import datetime
 from app.utils.gtfs_static_loader import load_trip_route_map
+from app.services.realtime_feed import FeedPoller
+from app.utils.spatial_index import GridIndex
 
 # Lazy loading function for trip_route_map
 def get_trip_route_map():
@@ -17,42 +18,109 @@ if not os.getenv("TFNSW_API_KEY"):
 
 TFNSW_API_KEY = os.getenv("TFNSW_API_KEY")
 
-def get_bus_positions():
-    if not TFNSW_API_KEY:
-        return {"error": "API key not found"}, 500
+VEHICLE_POSITIONS_URL = os.getenv(
+    "TFNSW_VEHICLE_POSITIONS_URL", "https://api.transport.nsw.gov.au/v1/gtfs/vehiclepos/buses"
+)
+VEHICLE_POSITIONS_INTERVAL = float(os.getenv("VEHICLE_POSITIONS_INTERVAL", "15"))
 
-    url = 'https://api.transport.nsw.gov.au/v1/gtfs/vehiclepos/buses'
-    headers = {'Authorization': f'apikey {TFNSW_API_KEY}'}
 
+def _bus_positions(feed):
+    buses = []
     try:
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            return {"error": "TfNSW fetch failed", "status": response.status_code}, response.status_code
+        trip_route_map = get_trip_route_map()
+    except Exception as e:
+        print(f"[WARN] Trip route map unavailable: {e}")
+        trip_route_map = {}
 
-        feed = gtfs_realtime_pb2.FeedMessage()
-        feed.ParseFromString(response.content)
+    for entity in feed.entity:
+        if entity.HasField("vehicle"):
+            v = entity.vehicle
+            trip_id = v.trip.trip_id
+            route_info = trip_route_map.get(trip_id, {})
 
-        buses = []
-        trip_route_map = get_trip_route_map()
+            buses.append({
+                "trip_id": trip_id,
+                "label": v.vehicle.label or v.vehicle.id,
+                "lat": v.position.latitude,
+                "lon": v.position.longitude,
+                "bearing": getattr(v.position, "bearing", None),
+                "last_updated": datetime.utcfromtimestamp(v.timestamp).isoformat() + "Z"
+                if v.HasField("timestamp") else "N/A",
+                "route_short": route_info.get("route_short_name", "–"),
+                "route_long": route_info.get("route_long_name", "")
+            })
+    return buses
 
-        for entity in feed.entity:
-            if entity.HasField("vehicle"):
-                v = entity.vehicle
-                trip_id = v.trip.trip_id
-                route_info = trip_route_map.get(trip_id, {})
-
-                buses.append({
-                    "trip_id": trip_id,
-                    "label": v.vehicle.label or v.vehicle.id,
-                    "lat": v.position.latitude,
-                    "lon": v.position.longitude,
-                    "bearing": getattr(v.position, "bearing", None),
-                    "last_updated": datetime.utcfromtimestamp(v.timestamp).isoformat() + "Z"
-                    if v.HasField("timestamp") else "N/A",
-                    "route_short": route_info.get("route_short_name", "–"),
-                    "route_long": route_info.get("route_long_name", "")
-                })
-
-        return {"buses": buses}
-    except Exception as e:
-        return {"error": str(e)}, 500
+
+def _live_buses(feed):
+    buses = []
+    for entity in feed.entity:
+        if entity.HasField("vehicle"):
+            buses.append({
+                "vehicle_id": entity.vehicle.vehicle.id,
+                "label": entity.vehicle.vehicle.label,
+                "route_id": entity.vehicle.trip.route_id,
+                "latitude": entity.vehicle.position.latitude,
+                "longitude": entity.vehicle.position.longitude,
+                "speed": entity.vehicle.position.speed,
+                "timestamp": entity.vehicle.timestamp
+            })
+    return buses
+
+
+def parse_vehicle_positions(content):
+    """Parse the vehiclepos feed once into the payloads of both bus endpoints."""
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(content)
+    buses = _bus_positions(feed)
+    return {
+        "buses": buses,
+        "live_buses": _live_buses(feed),
+        "feed_timestamp": feed.header.timestamp,
+        # Rebuilt with every new snapshot; indices point into "buses"
+        "spatial_index": GridIndex([b["lat"] for b in buses], [b["lon"] for b in buses])
+    }
+
+
+vehicle_positions = FeedPoller(
+    "vehicle positions",
+    VEHICLE_POSITIONS_URL,
+    parse_vehicle_positions,
+    VEHICLE_POSITIONS_INTERVAL,
+    headers=lambda: {"Authorization": f"apikey {TFNSW_API_KEY}"}
+)
+
+
+async def get_vehicle_snapshot():
+    """(snapshot, age in seconds, error) from the background vehicle positions poller."""
+    if not TFNSW_API_KEY:
+        return None, None, "API key not found"
+    return await vehicle_positions.get_snapshot()
+
+
+async def get_nearby_buses(lat, lon, radius_m, limit=None):
+    snapshot, age, error = await get_vehicle_snapshot()
+    if snapshot is None:
+        return {"error": error or "TfNSW fetch failed"}, None
+    indices, distances = snapshot["spatial_index"].nearby(lat, lon, radius_m, limit)
+    buses = [
+        {**snapshot["buses"][i], "distance_m": round(float(d), 1)}
+        for i, d in zip(indices.tolist(), distances.tolist())
+    ]
+    return {"buses": buses, "count": len(buses)}, age
+
+
+async def get_buses_in_bbox(min_lat, min_lon, max_lat, max_lon):
+    snapshot, age, error = await get_vehicle_snapshot()
+    if snapshot is None:
+        return {"error": error or "TfNSW fetch failed"}, None
+    indices = snapshot["spatial_index"].within_bbox(min_lat, min_lon, max_lat, max_lon)
+    buses = [snapshot["buses"][i] for i in indices.tolist()]
+    return {"buses": buses, "count": len(buses)}, age
+
+
+async def get_bus_positions():
+    snapshot, age, error = await get_vehicle_snapshot()
+    if snapshot is None:
+        return {"error": error or "TfNSW fetch failed"}, None
+    return {"buses": snapshot["buses"]}, age
@@ -1,7 +1,8 @@
 import os
-import requests
+import time
 from pathlib import Path
 from google.transit import gtfs_realtime_pb2
+from app.services.realtime_feed import FeedPoller
 
 # Load .env locally only (skip on Render)
 if not os.getenv("TFNSW_API_KEY"):
@@ -12,46 +13,176 @@ if not os.getenv("TFNSW_API_KEY"):
 # Load API key from environment
 TFNSW_API_KEY = os.getenv("TFNSW_API_KEY")
 
-def get_trip_updates():
-    url = "https://api.transport.nsw.gov.au/v1/gtfs/realtime/buses"
-    headers = {
-        "Authorization": f"apikey {TFNSW_API_KEY}",
-        "Accept": "application/x-protobuf"
+TRIP_UPDATES_URL = os.getenv("TFNSW_TRIP_UPDATES_URL", "https://api.transport.nsw.gov.au/v1/gtfs/realtime/buses")
+TRIP_UPDATES_INTERVAL = float(os.getenv("TRIP_UPDATES_INTERVAL", "30"))
+# How many versions of change history are kept for ?since= deltas (~1 hour at the default interval)
+TRIP_UPDATES_HISTORY = int(os.getenv("TRIP_UPDATES_HISTORY", "120"))
+
+
+def _stop_delays(trip_update):
+    stops = []
+    for stop in trip_update.stop_time_update:
+        stops.append({
+            "stop_sequence": stop.stop_sequence if stop.HasField("stop_sequence") else None,
+            "stop_id": stop.stop_id,
+            "arrival_delay": stop.arrival.delay if stop.HasField("arrival") and stop.arrival.HasField("delay") else None,
+            "departure_delay": stop.departure.delay
+            if stop.HasField("departure") and stop.departure.HasField("delay") else None
+        })
+    return stops
+
+
+def _trip_entry(trip_update, version):
+    trip = trip_update.trip
+    stops = _stop_delays(trip_update)
+    return {
+        "trip_id": trip.trip_id,
+        "route_id": trip.route_id,
+        "start_time": trip.start_time,
+        "start_date": trip.start_date,
+        # First stop's arrival delay, as the endpoint has always reported it
+        "delay_seconds": stops[0]["arrival_delay"] if stops else None,
+        "stops": stops,
+        "version": version
     }
 
-    response = requests.get(url, headers=headers)
 
-    if response.status_code != 200:
+class TripUpdateStore:
+    """Trip updates kept across polls, with a version bumped for every poll that changed something.
+
+    Each poll compares every trip's serialized update with the previous one and
+    only rebuilds the entries that differ, so a mostly unchanged feed costs the
+    protobuf parse and a bytes comparison per trip. The last
+    TRIP_UPDATES_HISTORY versions record which trips changed or disappeared,
+    which is what ?since= deltas are answered from.
+
+    Versions start at the store's creation time in milliseconds, so a version
+    handed out before a restart is always older than the new store's history
+    and gets a full resync instead of a wrong delta.
+    """
+
+    def __init__(self, history=TRIP_UPDATES_HISTORY):
+        self.history_size = history
+        self.version = int(time.time() * 1000)
+        self._raw = {}
+        self._trips = {}
+        self._history = []
+
+    def apply(self, content):
+        """Merge one feed into the store; returns the immutable snapshot for readers."""
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(content)
+
+        raw, trips, changed = {}, {}, []
+        for entity in feed.entity:
+            if not entity.HasField("trip_update") or not entity.trip_update.trip.trip_id:
+                continue
+            trip_id = entity.trip_update.trip.trip_id
+            data = entity.trip_update.SerializeToString(deterministic=True)
+            raw[trip_id] = data
+            if self._raw.get(trip_id) == data:
+                trips[trip_id] = self._trips[trip_id]
+            else:
+                trips[trip_id] = (entity.trip_update, None)
+                changed.append(trip_id)
+
+        removed = {trip_id: entry["route_id"] for trip_id, entry in self._trips.items() if trip_id not in raw}
+        if changed or removed:
+            self.version += 1
+            self._history = (self._history + [(self.version, tuple(changed), removed)])[-self.history_size:]
+
+        for trip_id in changed:
+            trips[trip_id] = _trip_entry(trips[trip_id][0], self.version)
+        self._raw, self._trips = raw, trips
+
+        by_route = {}
+        for trip_id, entry in trips.items():
+            by_route.setdefault(entry["route_id"], []).append(trip_id)
+
         return {
-            "status": response.status_code,
-            "message": "Failed to fetch trip updates",
-            "details": response.text
+            "version": self.version,
+            "min_version": self._history[0][0] - 1 if self._history else self.version,
+            "feed_timestamp": feed.header.timestamp,
+            "trips": trips,
+            "by_route": by_route,
+            "history": tuple(self._history)
         }
 
-    feed = gtfs_realtime_pb2.FeedMessage()
-    feed.ParseFromString(response.content)
 
-    trip_updates = []
-    for entity in feed.entity:
-        if entity.HasField("trip_update"):
-            trip = entity.trip_update.trip
+def _summary(entry):
+    return {key: entry[key] for key in ("trip_id", "route_id", "start_time", "start_date", "delay_seconds")}
+
+
+def trip_updates_delta(snapshot, since=None, route=None):
+    """Trips changed after version since (all trips if since is None or too old), optionally for one route."""
+    trips = snapshot["trips"]
+    version = snapshot["version"]
+    full = since is None or not snapshot["min_version"] <= since <= version
 
-            if not trip.trip_id:
+    if full:
+        trip_ids = snapshot["by_route"].get(route, []) if route is not None else list(trips)
+        changed, removed = [trips[trip_id] for trip_id in trip_ids], []
+    else:
+        changed_ids, removed = {}, {}
+        for entry_version, entry_changed, entry_removed in snapshot["history"]:
+            if entry_version <= since:
                 continue
+            changed_ids.update(dict.fromkeys(entry_changed))
+            removed.update(entry_removed)
+        changed = [trips[trip_id] for trip_id in changed_ids if trip_id in trips]
+        # A trip that disappeared and came back since the client's version is just a change
+        removed = [
+            trip_id for trip_id, route_id in removed.items()
+            if trip_id not in trips and (route is None or route_id == route)
+        ]
+        if route is not None:
+            changed = [entry for entry in changed if entry["route_id"] == route]
+
+    return {
+        "version": version,
+        "since": since,
+        "full": full,
+        "feed_timestamp": snapshot["feed_timestamp"],
+        "trips": changed,
+        "removed": removed
+    }
+
+
+trip_update_store = TripUpdateStore()
+
+trip_updates = FeedPoller(
+    "trip updates",
+    TRIP_UPDATES_URL,
+    trip_update_store.apply,
+    TRIP_UPDATES_INTERVAL,
+    headers=lambda: {"Authorization": f"apikey {TFNSW_API_KEY}", "Accept": "application/x-protobuf"}
+)
+
+
+async def get_trip_update_snapshot():
+    """(snapshot, age in seconds, error) from the background trip updates poller."""
+    if not TFNSW_API_KEY:
+        return None, None, "API key not found"
+    return await trip_updates.get_snapshot()
+
+
+def _failure(error):
+    return {"status": 500, "message": "Failed to fetch trip updates", "details": error or "TfNSW fetch failed"}
 
-            update = {
-                "trip_id": trip.trip_id,
-                "route_id": trip.route_id,
-                "start_time": trip.start_time,
-                "start_date": trip.start_date,
-                "delay_seconds": None
-            }
 
-            if entity.trip_update.stop_time_update:
-                arrival = entity.trip_update.stop_time_update[0].arrival
-                if arrival and arrival.HasField("delay"):
-                    update["delay_seconds"] = arrival.delay
+async def get_trip_updates(since=None, route=None):
+    """(content, age). Without since/route: the summary list the endpoint has always returned."""
+    snapshot, age, error = await get_trip_update_snapshot()
+    if snapshot is None:
+        return _failure(error), None
+    if since is None and route is None:
+        return [_summary(entry) for entry in snapshot["trips"].values()], age
+    return trip_updates_delta(snapshot, since, route), age
 
-            trip_updates.append(update)
 
-    return trip_updates
+async def get_trip_update(trip_id):
+    """(content, age) for one trip with every stop's delay; content is None if the trip is not in the feed."""
+    snapshot, age, error = await get_trip_update_snapshot()
+    if snapshot is None:
+        return _failure(error), None
+    return snapshot["trips"].get(trip_id), age
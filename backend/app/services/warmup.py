@@ -0,0 +1,85 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.models import model_registry
+from app.routes.dropdown_data import preload_dropdowns
+from app.utils.gtfs_static_loader import load_trip_route_map
+
+# Startup warm-up of the data the request handlers otherwise load lazily.
+#
+# Every component is loaded on its own thread so the slowest one sets the
+# warm-up time, not their sum. The loaders are the same single-flight
+# functions the handlers call, so a request arriving mid-warm-up waits on the
+# build already in progress rather than starting a second one.
+#
+# A component that fails is retried WARMUP_RETRIES times, WARMUP_RETRY_DELAY
+# seconds apart. If it still fails the service reports itself ready but
+# degraded: the handlers load lazily and fail or recover per request, which
+# beats holding all traffic back forever (e.g. when GTFS data is missing).
+
+WARMUP_RETRIES = int(os.getenv("WARMUP_RETRIES", "2"))
+WARMUP_RETRY_DELAY = float(os.getenv("WARMUP_RETRY_DELAY", "5"))
+
+COMPONENTS = {
+    "gtfs_trip_route_map": load_trip_route_map,
+    "model_registry": model_registry.get_model_bundle,
+    "dropdown_data": preload_dropdowns
+}
+
+_status = {name: {"status": "pending"} for name in COMPONENTS}
+_status_lock = threading.Lock()
+
+
+def _set_status(name, **fields):
+    with _status_lock:
+        _status[name] = fields
+
+
+def _load_component(name):
+    for attempt in range(1, WARMUP_RETRIES + 2):
+        _set_status(name, status="loading", attempt=attempt, started_at=time.time())
+        start_time = time.perf_counter()
+        try:
+            COMPONENTS[name]()
+        except Exception as e:
+            seconds = round(time.perf_counter() - start_time, 3)
+            retrying = attempt <= WARMUP_RETRIES
+            _set_status(name, status="retrying" if retrying else "failed", attempt=attempt, seconds=seconds,
+                        error=str(e) or repr(e))
+            print(f"[ERROR] Warm-up of {name} failed after {seconds}s (attempt {attempt}): {e}")
+            if retrying:
+                time.sleep(WARMUP_RETRY_DELAY)
+            continue
+        seconds = round(time.perf_counter() - start_time, 3)
+        _set_status(name, status="ready", attempt=attempt, seconds=seconds, loaded_at=time.time())
+        print(f"[INFO] Warm-up of {name} finished in {seconds}s")
+        return
+
+
+def run_warmup():
+    """Load every component in parallel; blocks until all have finished or failed."""
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(COMPONENTS), thread_name_prefix="warmup") as pool:
+        list(pool.map(_load_component, COMPONENTS))
+    print(f"[INFO] Warm-up finished in {time.perf_counter() - start_time:.2f}s")
+
+
+def start_warmup():
+    """Run the warm-up on a background thread so startup is not blocked."""
+    threading.Thread(target=run_warmup, daemon=True).start()
+
+
+def get_readiness():
+    """(ready, state, per-component status).
+
+    state is "warming_up" while any component is still loading or due a
+    retry, then "ready" if all loaded or "degraded" if some gave up; the
+    service counts as ready in both of the latter.
+    """
+    with _status_lock:
+        components = {name: dict(status) for name, status in _status.items()}
+    statuses = [status["status"] for status in components.values()]
+    if any(status not in ("ready", "failed") for status in statuses):
+        return False, "warming_up", components
+    return True, "degraded" if "failed" in statuses else "ready", components
@@ -0,0 +1,52 @@
+import os
+import json
+import glob
+import hashlib
+import tempfile
+
+
+def file_signature(path):
+    """Cheap change detector for a source file: size plus modification time."""
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def file_hash(path, block_size=1 << 20):
+    """Content hash of a file, for when size plus mtime is not proof enough."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_csv_files(folder):
+    """Return {file_name: signature} for every CSV in folder, in sorted order."""
+    files = sorted(glob.glob(os.path.join(str(folder), "*.csv")))
+    return {os.path.basename(path): file_signature(path) for path in files}
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[WARN] Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+
+def save_manifest(path, manifest, indent=None):
+    # Write to a uniquely named temp file and rename, so readers never see a
+    # half-written file and concurrent writers never share a temp path
+    directory = os.path.dirname(str(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(str(path))}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=indent)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
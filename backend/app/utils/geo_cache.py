@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from pathlib import Path
+from app.utils.response_cache import ResponseCache
+
+# Persistent cache for OpenRouteService answers.
+#
+# Keys are built from coordinates rounded to COORD_DECIMALS (4 decimals is
+# ~11 m of latitude), so requests a few metres apart share one answer. Entries
+# live in SQLite for ttl seconds, survive restarts, and the recently used ones
+# are also kept in an in-memory ResponseCache so repeat hits skip the disk.
+# Concurrent misses for the same key share one upstream call.
+
+CACHE_PATH = Path(os.getenv("ORS_CACHE_PATH", Path(__file__).resolve().parents[2] / "data" / "ors_cache.sqlite3"))
+CACHE_TTL = float(os.getenv("ORS_CACHE_TTL", str(7 * 24 * 3600)))
+HOT_MAX_BYTES = int(os.getenv("ORS_CACHE_HOT_BYTES", str(16 * 1024 * 1024)))
+# The memory copy is dropped sooner than the disk entry, so it never outlives it by much
+HOT_TTL = float(os.getenv("ORS_CACHE_HOT_TTL", "3600"))
+COORD_DECIMALS = 4
+
+
+def quantize(lon, lat):
+    """(lon, lat) rounded to the cache grid."""
+    return round(float(lon), COORD_DECIMALS), round(float(lat), COORD_DECIMALS)
+
+
+class _Uncached(Exception):
+    # Carries an upstream error payload through the coalescing layer without caching it
+    def __init__(self, value):
+        self.value = value
+
+
+class GeoCache:
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, hot_max_bytes=HOT_MAX_BYTES, hot_ttl=HOT_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.hot = ResponseCache("ors hot tier", ttl=min(hot_ttl, ttl), max_bytes=hot_max_bytes)
+        self._db = None
+        self._db_lock = threading.Lock()
+        self.stats = {}
+
+    def _kind_stats(self, kind):
+        stats = self.stats.get(kind)
+        if stats is None:
+            stats = self.stats[kind] = {
+                "memory_hits": 0, "disk_hits": 0, "misses": 0, "uncached": 0,
+                "upstream_seconds": 0.0, "saved_seconds": 0.0
+            }
+        return stats
+
+    def _connect(self):
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS ors_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            db.execute("DELETE FROM ors_cache WHERE expires_at <= ?", (time.time(),))
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _read(self, key):
+        with self._db_lock:
+            row = self._connect().execute(
+                "SELECT value FROM ors_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, key, value):
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO ors_cache VALUES (?, ?, ?, ?)",
+                       (key, json.dumps(value, separators=(",", ":")), now, now + self.ttl))
+            db.commit()
+
+    def _record_hit(self, stats, tier):
+        stats[tier] += 1
+        # Credit each hit with the average upstream latency seen for this kind of request
+        if stats["misses"]:
+            stats["saved_seconds"] += stats["upstream_seconds"] / stats["misses"]
+
+    async def get_or_fetch(self, kind, key_parts, fetch):
+        """Cached answer for (kind, key_parts), or the value of await fetch().
+
+        fetch returns (value, cacheable); values it marks as not cacheable
+        (upstream errors) are returned to every waiting caller but not stored.
+        """
+        key = json.dumps([kind, *key_parts], separators=(",", ":"))
+        stats = self._kind_stats(kind)
+        missing = object()
+        value = self.hot.get(key, missing)
+        if value is not missing:
+            self._record_hit(stats, "memory_hits")
+            return value
+
+        async def load():
+            value = await asyncio.to_thread(self._read, key)
+            if value is not None:
+                self._record_hit(stats, "disk_hits")
+                return value
+
+            start_time = time.perf_counter()
+            value, cacheable = await fetch()
+            if not cacheable:
+                stats["uncached"] += 1
+                raise _Uncached(value)
+            stats["misses"] += 1
+            stats["upstream_seconds"] += time.perf_counter() - start_time
+            await asyncio.to_thread(self._write, key, value)
+            return value
+
+        try:
+            return await self.hot.get_or_fetch(key, load)
+        except _Uncached as e:
+            return e.value
+
+    def metrics(self):
+        kinds = {}
+        for kind, stats in self.stats.items():
+            hits = stats["memory_hits"] + stats["disk_hits"]
+            lookups = hits + stats["misses"] + stats["uncached"]
+            kinds[kind] = {
+                **stats,
+                "upstream_seconds": round(stats["upstream_seconds"], 3),
+                "saved_seconds": round(stats["saved_seconds"], 3),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0
+            }
+        return {"path": str(self.path), "ttl_seconds": self.ttl, "hot_tier": self.hot.metrics(), "kinds": kinds}
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+ors_cache = GeoCache()
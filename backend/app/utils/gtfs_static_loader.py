@@ -1,6 +1,9 @@
 import os
+import time
 import zipfile
+import threading
 import requests
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import shutil
@@ -45,22 +48,142 @@ if os.getenv("RENDER") == "true":
     download_and_extract_gtfs()
 
 _trip_route_map_cache = None
+# Concurrent first callers wait on one build instead of each merging the CSVs
+_trip_route_map_lock = threading.Lock()
+
+
+class TripRouteMap:
+    """Read-only trip_id -> route info mapping backed by flat NumPy arrays.
+
+    trip_ids is a sorted fixed-width bytes array and route_index the aligned
+    int32 route code, so a lookup is one binary search; route names are
+    stored once per route, not once per trip.
+    """
+
+    def __init__(self, trip_ids, route_index, route_short_names, route_long_names):
+        self.trip_ids = trip_ids
+        self.route_index = route_index
+        self.route_short_names = route_short_names
+        self.route_long_names = route_long_names
+        # One shared dict per route, in the shape the old per-trip dicts had
+        self._route_info = [
+            {"route_short_name": short, "route_long_name": long}
+            for short, long in zip(route_short_names.tolist(), route_long_names.tolist())
+        ]
+
+    @classmethod
+    def from_frames(cls, trips_df, routes_df):
+        routes_df = routes_df.drop_duplicates("route_id").reset_index(drop=True)
+        trips_df = trips_df[trips_df["route_id"].isin(routes_df["route_id"])]
+        trips_df = trips_df.drop_duplicates("trip_id", keep="last")
+
+        trip_ids = trips_df["trip_id"].str.encode("utf-8").to_numpy().astype(bytes)
+        order = np.argsort(trip_ids, kind="stable")
+        route_index = pd.Index(routes_df["route_id"]).get_indexer(trips_df["route_id"]).astype(np.int32)
+        return cls(
+            trip_ids[order],
+            route_index[order],
+            routes_df["route_short_name"].fillna("").to_numpy().astype(str),
+            routes_df["route_long_name"].fillna("").to_numpy().astype(str)
+        )
+
+    def _position(self, trip_id):
+        key = str(trip_id).encode()
+        i = int(np.searchsorted(self.trip_ids, key))
+        if i < len(self.trip_ids) and self.trip_ids[i] == key:
+            return i
+        return -1
+
+    def get(self, trip_id, default=None):
+        i = self._position(trip_id)
+        return self._route_info[self.route_index[i]] if i >= 0 else default
+
+    def __getitem__(self, trip_id):
+        i = self._position(trip_id)
+        if i < 0:
+            raise KeyError(trip_id)
+        return self._route_info[self.route_index[i]]
+
+    def __contains__(self, trip_id):
+        return self._position(trip_id) >= 0
+
+    def __len__(self):
+        return len(self.trip_ids)
+
+    @property
+    def nbytes(self):
+        return (self.trip_ids.nbytes + self.route_index.nbytes
+                + self.route_short_names.nbytes + self.route_long_names.nbytes)
+
+    def save(self, path, source=None):
+        tmp_path = Path(f"{path}.tmp.npz")
+        np.savez(
+            tmp_path,
+            trip_ids=self.trip_ids,
+            route_index=self.route_index,
+            route_short_names=self.route_short_names,
+            route_long_names=self.route_long_names,
+            source=np.array(source or [], dtype=np.float64)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["trip_ids"], data["route_index"], data["route_short_names"], data["route_long_names"]), \
+                data["source"].tolist()
+
+
+def _source_signature(*paths):
+    # size and mtime of the GTFS text files the map was built from
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature += [float(stat.st_size), stat.st_mtime]
+    return signature
+
 
 def load_trip_route_map():
     global _trip_route_map_cache
     if _trip_route_map_cache is not None:
         return _trip_route_map_cache
 
+    with _trip_route_map_lock:
+        if _trip_route_map_cache is None:
+            _trip_route_map_cache = _build_trip_route_map()
+        return _trip_route_map_cache
+
+
+def _build_trip_route_map():
     gtfs_path = Path(__file__).resolve().parents[2] / 'gtfs_data'
     routes_path = gtfs_path / 'routes.txt'
     trips_path = gtfs_path / 'trips.txt'
+    cache_path = gtfs_path / 'trip_route_map.npz'
 
     if not routes_path.exists() or not trips_path.exists():
         raise FileNotFoundError("routes.txt or trips.txt not found. Make sure GTFS data is extracted.")
 
-    routes_df = pd.read_csv(routes_path, dtype=str)
-    trips_df = pd.read_csv(trips_path, dtype=str)
+    start_time = time.perf_counter()
+    source = _source_signature(trips_path, routes_path)
+    trip_route_map = None
+    if cache_path.exists():
+        try:
+            trip_route_map, cached_source = TripRouteMap.load(cache_path)
+            if cached_source != source:
+                trip_route_map = None
+        except Exception as e:
+            print(f"[WARN] Ignoring unreadable {cache_path.name}: {e}")
+            trip_route_map = None
+    origin = "cache"
+
+    if trip_route_map is None:
+        routes_df = pd.read_csv(routes_path, dtype=str, usecols=["route_id", "route_short_name", "route_long_name"])
+        trips_df = pd.read_csv(trips_path, dtype=str, usecols=["trip_id", "route_id"])
+        trip_route_map = TripRouteMap.from_frames(trips_df, routes_df)
+        trip_route_map.save(cache_path, source)
+        origin = "GTFS text files"
 
-    joined = trips_df.merge(routes_df, on="route_id")[["trip_id", "route_short_name", "route_long_name"]]
-    _trip_route_map_cache = joined.set_index("trip_id").to_dict(orient="index")
-    return _trip_route_map_cache
+    print(f"[INFO] Trip route map: {len(trip_route_map):,} trips, {len(trip_route_map.route_short_names):,} routes, "
+          f"{trip_route_map.nbytes / 1e6:.1f} MB, loaded from {origin} in "
+          f"{(time.perf_counter() - start_time) * 1000:.0f} ms")
+    return trip_route_map
@@ -0,0 +1,107 @@
+import os
+import random
+import asyncio
+import weakref
+import httpx
+
+# Shared async HTTP client for every outbound call (TfNSW, ORS).
+#
+# One keep-alive connection pool per event loop, a semaphore per upstream
+# host so a burst of proxied requests cannot open hundreds of connections to
+# one API, explicit timeouts, and retries with exponential backoff for
+# connection errors and 429/5xx responses.
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "20"))
+RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+BACKOFF_SECONDS = float(os.getenv("HTTP_BACKOFF_SECONDS", "0.5"))
+MAX_BACKOFF_SECONDS = 8.0
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# Clients and semaphores belong to the loop that created them
+_loop_state = weakref.WeakKeyDictionary()
+
+
+def _state():
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None or state["client"].is_closed:
+        state = {
+            "client": httpx.AsyncClient(
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+                follow_redirects=True
+            ),
+            "hosts": {}
+        }
+        _loop_state[loop] = state
+    return state
+
+
+def get_client():
+    """The shared AsyncClient of the running event loop."""
+    return _state()["client"]
+
+
+def _host_semaphore(state, url):
+    host = httpx.URL(url).host
+    semaphore = state["hosts"].get(host)
+    if semaphore is None:
+        semaphore = state["hosts"][host] = asyncio.Semaphore(PER_HOST_LIMIT)
+    return semaphore
+
+
+def _backoff(attempt, response=None):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_BACKOFF_SECONDS)
+    delay = min(BACKOFF_SECONDS * (2 ** attempt), MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def request(method, url, retries=None, **kwargs):
+    """Send one request through the shared client, retrying transient failures.
+
+    Returns the last httpx.Response; raises the last httpx.TransportError if
+    every attempt failed to get a response at all.
+    """
+    state = _state()
+    retries = RETRIES if retries is None else retries
+    semaphore = _host_semaphore(state, url)
+
+    for attempt in range(retries + 1):
+        try:
+            async with semaphore:
+                response = await state["client"].request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if attempt == retries:
+                raise
+            print(f"[WARN] {method} {url} failed ({e!r}), retry {attempt + 1}/{retries}")
+            await asyncio.sleep(_backoff(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < retries:
+            print(f"[WARN] {method} {url} returned {response.status_code}, retry {attempt + 1}/{retries}")
+            await asyncio.sleep(_backoff(attempt, response))
+            continue
+        return response
+
+
+async def get(url, **kwargs):
+    return await request("GET", url, **kwargs)
+
+
+async def post(url, **kwargs):
+    return await request("POST", url, **kwargs)
+
+
+async def close_client():
+    """Close the running loop's client (app shutdown)."""
+    loop = asyncio.get_running_loop()
+    state = _loop_state.pop(loop, None)
+    if state is not None:
+        await state["client"].aclose()
@@ -0,0 +1,173 @@
+import os
+import sys
+import glob
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from pandas.api.types import union_categoricals
+from app.utils.file_manifest import file_signature, load_manifest, save_manifest
+
+# Columnar copy of the CSV folders (datasets/, processed_with_route/), one
+# Parquet part per source CSV, with the low-cardinality text columns stored
+# dictionary-encoded so they load straight into pandas categoricals.
+
+base_dir = Path(__file__).resolve().parents[3]
+cache_root = base_dir / "parquet_cache"
+
+CATEGORICAL_COLUMNS = ["ROUTE", "TRIP_POINT", "TIMETABLE_HOUR_BAND", "CAPACITY_BUCKET", "SUBURB"]
+CHUNK_SIZE = 500_000
+MANIFEST_NAME = "_manifest.json"
+
+
+def _cache_dir(folder):
+    return cache_root / folder
+
+
+def _parquet_path(folder, csv_path):
+    return _cache_dir(folder) / f"{Path(csv_path).stem}.parquet"
+
+
+def _schema_for(columns):
+    return pa.schema([
+        (col, pa.dictionary(pa.int32(), pa.string()) if col in CATEGORICAL_COLUMNS else pa.string())
+        for col in columns
+    ])
+
+
+def _convert_file(csv_path, parquet_path):
+    tmp_path = parquet_path.with_suffix(".parquet.tmp")
+    writer = None
+    rows = 0
+    try:
+        for chunk in pd.read_csv(csv_path, dtype=str, chunksize=CHUNK_SIZE, low_memory=False):
+            if writer is None:
+                schema = _schema_for(chunk.columns)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError(f"{csv_path} has no rows to convert")
+    os.replace(tmp_path, parquet_path)
+    return rows
+
+
+def convert_folder(folder):
+    """Convert every CSV in base_dir/folder to Parquet, skipping files that have not changed."""
+    source_dir = base_dir / folder
+    target_dir = _cache_dir(folder)
+    os.makedirs(target_dir, exist_ok=True)
+    manifest_path = target_dir / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+
+    csv_files = sorted(glob.glob(str(source_dir / "*.csv")))
+    print(f"[INFO] Converting {len(csv_files)} CSV file(s) from {source_dir}")
+
+    converted, skipped = 0, 0
+    for csv_path in csv_files:
+        name = os.path.basename(csv_path)
+        signature = file_signature(csv_path)
+        parquet_path = _parquet_path(folder, csv_path)
+        if manifest.get(name) == signature and parquet_path.exists():
+            skipped += 1
+            continue
+        try:
+            start_time = time.time()
+            rows = _convert_file(csv_path, parquet_path)
+            manifest[name] = signature
+            save_manifest(manifest_path, manifest)
+            converted += 1
+            print(f"[INFO] {name}: {rows:,} rows -> {parquet_path.name} in {time.time() - start_time:.1f}s")
+        except Exception as e:
+            print(f"[ERROR] Failed to convert {csv_path}: {e}")
+
+    # Forget parts whose source CSV has been removed
+    current = {os.path.basename(path) for path in csv_files}
+    for name in [n for n in manifest if n not in current]:
+        stale_path = target_dir / f"{Path(name).stem}.parquet"
+        if stale_path.exists():
+            os.remove(stale_path)
+        del manifest[name]
+    save_manifest(manifest_path, manifest)
+
+    print(f"[INFO] Parquet cache for {folder}: {converted} converted, {skipped} unchanged")
+    return {"converted": converted, "skipped": skipped}
+
+
+def _as_categoricals(df):
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def read_columns(csv_path, columns, manifest=None, folder=None):
+    """Read only `columns` of one source CSV, from its Parquet part when it is up to date."""
+    folder = folder or Path(csv_path).parent.name
+    if manifest is None:
+        manifest = load_manifest(_cache_dir(folder) / MANIFEST_NAME)
+    parquet_path = _parquet_path(folder, csv_path)
+    name = os.path.basename(csv_path)
+    if manifest.get(name) == file_signature(csv_path) and parquet_path.exists():
+        return pq.read_table(parquet_path, columns=list(columns)).to_pandas()
+    # No up-to-date Parquet part: read the CSV in chunks, with the plain string
+    # columns callers got before the cache existed
+    frames = list(pd.read_csv(csv_path, dtype=str, usecols=list(columns), chunksize=CHUNK_SIZE, low_memory=False))
+    if not frames:
+        return pd.DataFrame(columns=list(columns), dtype=str)
+    return pd.concat(frames, ignore_index=True)
+
+
+def iter_chunks(csv_path, columns, chunksize, folder=None):
+    """Stream one source file in DataFrame chunks of at most `chunksize` rows."""
+    folder = folder or Path(csv_path).parent.name
+    manifest = load_manifest(_cache_dir(folder) / MANIFEST_NAME)
+    parquet_path = _parquet_path(folder, csv_path)
+    name = os.path.basename(csv_path)
+    if manifest.get(name) == file_signature(csv_path) and parquet_path.exists():
+        parquet_file = pq.ParquetFile(parquet_path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=list(columns)):
+            yield pa.Table.from_batches([batch]).to_pandas()
+        return
+    yield from pd.read_csv(csv_path, dtype=str, usecols=list(columns), chunksize=chunksize, low_memory=False)
+
+
+def iter_frames(folder, columns):
+    """Yield (csv_path, DataFrame) for every CSV in base_dir/folder, reading only `columns`."""
+    source_dir = base_dir / folder
+    manifest = load_manifest(_cache_dir(folder) / MANIFEST_NAME)
+    for csv_path in sorted(glob.glob(str(source_dir / "*.csv"))):
+        try:
+            df = read_columns(csv_path, columns, manifest=manifest, folder=folder)
+        except Exception as e:
+            print(f"[ERROR] Failed to read {csv_path}: {e}")
+            continue
+        yield csv_path, df
+
+
+def concat_frames(frames):
+    """pd.concat that keeps categorical columns categorical across differing dictionaries."""
+    frames = [_as_categoricals(df) for df in frames]
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    categorical = {}
+    for col in CATEGORICAL_COLUMNS:
+        if all(col in df.columns for df in frames):
+            categorical[col] = union_categoricals([df[col] for df in frames])
+    combined = pd.concat(
+        [df.drop(columns=list(categorical)) for df in frames],
+        ignore_index=True
+    )
+    for col, values in categorical.items():
+        combined[col] = values
+    return combined[list(frames[0].columns)]
+
+
+if __name__ == "__main__":
+    # Usage: python -m app.utils.parquet_cache [folder ...]
+    for folder in sys.argv[1:] or ["processed_with_route", "datasets"]:
+        convert_folder(folder)
@@ -0,0 +1,116 @@
+import sys
+import json
+import time
+import asyncio
+from collections import OrderedDict
+
+# In-memory TTL + LRU cache for upstream API responses.
+#
+# Entries expire ttl seconds after they were stored and the whole cache is
+# held under a byte budget (sizes estimated from the JSON encoding), evicting
+# the least recently used entries first. get_or_fetch() coalesces concurrent
+# misses for the same key into one upstream call.
+
+
+def estimate_size(value):
+    """Rough in-memory footprint of a JSON-like value, in bytes."""
+    try:
+        return len(json.dumps(value, separators=(",", ":"), default=str)) * 2
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+
+class ResponseCache:
+    def __init__(self, name, ttl, max_bytes, max_entries=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value, size), least recently used first
+        self._inflight = {}
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "expired": 0, "evictions": 0, "errors": 0}
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if entry[0] <= time.monotonic():
+            self._remove(key)
+            self.stats["expired"] += 1
+            return default
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value, ttl=None):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes or (self.max_entries and len(self._entries) > self.max_entries):
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def _remove(self, key):
+        self.bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get_or_fetch(self, key, fetch):
+        """Cached value for key, or the result of await fetch(), stored on success.
+
+        Callers arriving while a fetch for the same key is in flight wait for
+        that fetch instead of starting their own; if it raises, they all see
+        the exception and nothing is cached. A caller that is cancelled stops
+        waiting, but the fetch keeps running for the others.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            self.stats["hits"] += 1
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        self.stats["misses"] += 1
+        task = self._inflight[key] = asyncio.ensure_future(self._fetch_and_store(key, fetch))
+        # Retrieved here so a failure nobody waited on is not reported as unhandled
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, key, fetch):
+        # Runs as its own task, so cancelling the caller that started it does
+        # not cancel the fetch the coalesced callers are waiting on
+        try:
+            value = await fetch()
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        else:
+            self.put(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def metrics(self):
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            "name": self.name,
+            **self.stats,
+            "hit_rate": round((self.stats["hits"] + self.stats["coalesced"]) / lookups, 4) if lookups else 0,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl
+        }
@@ -0,0 +1,87 @@
+import math
+import numpy as np
+
+# Uniform lat/lon grid over a set of points, for nearby and bounding-box queries.
+#
+# Points are bucketed into cells of cell_deg degrees and sorted by cell id, so
+# the points of one grid row between two columns are a contiguous slice found
+# with two searchsorted calls. A query touches only the cells its box overlaps
+# and then filters those candidates exactly.
+
+EARTH_RADIUS_M = 6_371_000
+METERS_PER_DEGREE = 111_320
+
+
+def haversine_m(lat, lon, lats, lons):
+    """Great-circle distance in metres from (lat, lon) to each of lats/lons."""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GridIndex:
+    def __init__(self, lats, lons, cell_deg=0.01):
+        self.cell_deg = cell_deg
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        self.size = len(lats)
+        if not self.size:
+            self.order = np.empty(0, dtype=np.int64)
+            self.cells = np.empty(0, dtype=np.int64)
+            self.lats = self.lons = np.empty(0)
+            return
+
+        rows = np.floor(lats / cell_deg).astype(np.int64)
+        cols = np.floor(lons / cell_deg).astype(np.int64)
+        self.row0, self.col0 = int(rows.min()), int(cols.min())
+        self.n_rows = int(rows.max()) - self.row0 + 1
+        self.n_cols = int(cols.max()) - self.col0 + 1
+
+        cells = (rows - self.row0) * self.n_cols + (cols - self.col0)
+        self.order = np.argsort(cells, kind="stable")
+        self.cells = cells[self.order]
+        self.lats = lats[self.order]
+        self.lons = lons[self.order]
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon):
+        # Sorted-array slices of every cell overlapping the box
+        if not self.size:
+            return np.empty(0, dtype=np.int64)
+        row_lo = max(math.floor(min_lat / self.cell_deg) - self.row0, 0)
+        row_hi = min(math.floor(max_lat / self.cell_deg) - self.row0, self.n_rows - 1)
+        col_lo = max(math.floor(min_lon / self.cell_deg) - self.col0, 0)
+        col_hi = min(math.floor(max_lon / self.cell_deg) - self.col0, self.n_cols - 1)
+        if row_lo > row_hi or col_lo > col_hi:
+            return np.empty(0, dtype=np.int64)
+
+        rows = np.arange(row_lo, row_hi + 1, dtype=np.int64) * self.n_cols
+        starts = np.searchsorted(self.cells, rows + col_lo, side="left")
+        ends = np.searchsorted(self.cells, rows + col_hi, side="right")
+        lengths = ends - starts
+        if not lengths.sum():
+            return np.empty(0, dtype=np.int64)
+        # Concatenate the slices without a Python loop
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(lengths.sum())
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Original indices of the points inside the box."""
+        candidates = self._candidates(min_lat, min_lon, max_lat, max_lon)
+        lats, lons = self.lats[candidates], self.lons[candidates]
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        return self.order[candidates[inside]]
+
+    def nearby(self, lat, lon, radius_m, limit=None):
+        """(original indices, distances in metres) within radius_m, nearest first."""
+        dlat = radius_m / METERS_PER_DEGREE
+        dlon = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        candidates = self._candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+
+        distances = haversine_m(lat, lon, self.lats[candidates], self.lons[candidates])
+        inside = distances <= radius_m
+        candidates, distances = candidates[inside], distances[inside]
+        nearest = np.argsort(distances, kind="stable")
+        if limit is not None:
+            nearest = nearest[:limit]
+        return self.order[candidates[nearest]], distances[nearest]
@@ -0,0 +1,134 @@
+import os
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from app.utils.parquet_cache import iter_chunks
+from app.utils.file_manifest import scan_csv_files, load_manifest, save_manifest
+
+# Shared single-pass aggregation for the analytics services.
+#
+# A file is streamed chunk by chunk; chunk_partial(chunk) turns each chunk
+# into a partial, i.e. a dict of small DataFrames whose columns are additive
+# (sums, counts) and whose index holds the group keys. Partials are merged as
+# soon as they are produced, so only one chunk per worker is ever in memory.
+# Chunks are indexed by row position in the file, and a "first_row" column is
+# merged by taking the earlier row instead of adding.
+
+CHUNK_SIZE = int(os.getenv("AGGREGATION_CHUNK_SIZE", "200000"))
+MAX_WORKERS = int(os.getenv("AGGREGATION_WORKERS", "1"))
+
+
+def _plain_index(frame):
+    # Categorical group keys from different chunks carry different dictionaries;
+    # plain object keys let partials align on values when they are added.
+    if isinstance(frame.index, pd.MultiIndex):
+        frame.index = pd.MultiIndex.from_arrays(
+            [frame.index.get_level_values(i).astype(object) for i in range(frame.index.nlevels)],
+            names=frame.index.names
+        )
+    else:
+        frame.index = frame.index.astype(object)
+    return frame
+
+
+def merge_partials(left, right):
+    """Add two partials key by key, treating missing groups as zero."""
+    if left is None:
+        return right
+    merged = dict(left)
+    for key, frame in right.items():
+        if key not in merged:
+            merged[key] = frame
+            continue
+        total = merged[key].add(frame, fill_value=0)
+        if "first_row" in total.columns:
+            total["first_row"] = pd.concat([merged[key]["first_row"], frame["first_row"]], axis=1).min(axis=1)
+        merged[key] = total
+    return merged
+
+
+def aggregate_file(csv_path, columns, chunk_partial, folder=None, chunksize=None):
+    """Stream one file and fold every chunk into a single partial."""
+    start_time = time.time()
+    partial = None
+    rows, chunks = 0, 0
+    for chunk in iter_chunks(csv_path, columns, chunksize or CHUNK_SIZE, folder=folder):
+        chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+        rows += len(chunk)
+        chunks += 1
+        chunk_result = {key: _plain_index(frame) for key, frame in chunk_partial(chunk).items()}
+        partial = merge_partials(partial, chunk_result)
+    print(f"[INFO] Streamed {rows:,} rows from {os.path.basename(csv_path)} "
+          f"in {chunks} chunk(s), {time.time() - start_time:.1f}s")
+    return partial or {}
+
+
+def map_files(fn, paths, max_workers=None):
+    """Yield (path, result, error) for fn(path), optionally across a process pool."""
+    max_workers = MAX_WORKERS if max_workers is None else max_workers
+    if max_workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            try:
+                yield path, fn(path), None
+            except Exception as e:
+                yield path, None, e
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fn, path): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+
+def refresh_partials(state_path, folder, compute_partial, max_workers=None, version=None):
+    """Keep per-file partial aggregates in sync with the CSVs in folder.
+
+    Only files whose signature changed since the last run are passed to
+    compute_partial(path), spread over max_workers processes; partials for
+    deleted files are dropped. Files that fail are recorded with their
+    signature, drop any earlier partial, and are skipped until they change. Bumping version discards every
+    stored partial. Returns (partials, changed), where changed says whether
+    anything was updated.
+    """
+    stored = load_manifest(state_path)
+    if stored.get("version") != version:
+        stored = {}
+    manifest = stored.get("manifest", {})
+    partials = stored.get("partials", {})
+    failed = stored.get("failed", {})
+    current = scan_csv_files(folder)
+    changed = False
+
+    pending = [
+        os.path.join(str(folder), name) for name, signature in current.items()
+        if (manifest.get(name) != signature or name not in partials) and failed.get(name) != signature
+    ]
+    for path, partial, error in map_files(compute_partial, pending, max_workers):
+        name = os.path.basename(path)
+        changed = True
+        if error is not None:
+            print(f"[ERROR] Failed to aggregate {name}, skipping it until it changes: {error}")
+            failed[name] = current[name]
+            # Its previous contents are gone from disk, so they leave the totals too
+            partials.pop(name, None)
+            manifest.pop(name, None)
+            continue
+        partials[name] = partial
+        manifest[name] = current[name]
+        failed.pop(name, None)
+        print(f"[INFO] Aggregated {name}")
+
+    for name in [n for n in {**manifest, **failed} if n not in current]:
+        manifest.pop(name, None)
+        partials.pop(name, None)
+        failed.pop(name, None)
+        changed = True
+
+    if changed:
+        save_manifest(state_path, {
+            "version": version, "manifest": manifest, "partials": partials, "failed": failed
+        })
+    return partials, changed
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The backend is imported as the `app` package, the same way uvicorn runs it
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from google.transit import gtfs_realtime_pb2
+
+from app.routes import alerts_router
+from app.services import alerts_service
+from app.services.alerts_service import AlertStore
+from app.services.realtime_feed import FeedPoller, etag_matches
+
+
+def make_feed(alerts, timestamp=1700000000):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.timestamp = timestamp
+    for alert_id, title, routes in alerts:
+        entity = feed.entity.add()
+        entity.id = alert_id
+        entity.alert.header_text.translation.add().text = title
+        entity.alert.description_text.translation.add().text = f"{title} details "
+        for route_id in routes:
+            entity.alert.informed_entity.add().route_id = route_id
+    return feed.SerializeToString()
+
+
+ALERTS = [("a1", "Detour on 100", ["r100"]), ("a2", "Stop closed", ["r100", "r200"]), ("a3", "Network notice", [])]
+
+
+def test_route_index_and_unchanged_feed_reuse():
+    store = AlertStore()
+    first = store.apply(make_feed(ALERTS))
+    assert [alert["title"] for alert in first.by_route["r100"]] == ["Detour on 100", "Stop closed"]
+    assert first.alerts[1] == {"title": "Stop closed", "message": "Stop closed details", "routes": ["r100", "r200"]}
+
+    # A new header timestamp alone is not a content change
+    assert store.apply(make_feed(ALERTS, timestamp=1700000060)) is first
+
+    second = store.apply(make_feed(ALERTS[1:]))
+    assert second is not first and second.content_hash != first.content_hash
+    assert second.alerts[0] is first.alerts[1]
+    assert second.body("r200")[1] != first.body("r200")[1]
+
+
+def test_etag_matching():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"') and not etag_matches(None, '"abc"')
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = AlertStore()
+    poller = FeedPoller("test alerts", "http://127.0.0.1:9/unused", store.apply, interval=60)
+    poller.snapshot = store.apply(make_feed(ALERTS))
+    poller.fetched_at = time.time()
+    monkeypatch.setattr(alerts_service, "TFNSW_API_KEY", "test-key")
+    monkeypatch.setattr(alerts_service, "bus_alerts", poller)
+
+    app = FastAPI()
+    app.include_router(alerts_router.router)
+    with TestClient(app) as client:
+        client.store, client.poller = store, poller
+        yield client
+
+
+def test_alerts_endpoint_serves_etag_and_304(client):
+    response = client.get("/alerts")
+    assert response.status_code == 200 and "Age" in response.headers
+    assert [alert["title"] for alert in response.json()["alerts"]] == ["Detour on 100", "Stop closed", "Network notice"]
+
+    etag = response.headers["ETag"]
+    cached = client.get("/alerts", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+
+    routed = client.get("/alerts", params={"route": "r200"})
+    assert [alert["title"] for alert in routed.json()["alerts"]] == ["Stop closed"]
+    assert routed.headers["ETag"] != etag
+    assert client.get("/alerts", params={"route": "nope"}).json() == {"alerts": []}
+
+    client.poller.snapshot = client.store.apply(make_feed(ALERTS[:1]))
+    changed = client.get("/alerts", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and len(changed.json()["alerts"]) == 1
+
+
+def test_alerts_endpoint_without_snapshot(monkeypatch):
+    monkeypatch.setattr(alerts_service, "TFNSW_API_KEY", None)
+    app = FastAPI()
+    app.include_router(alerts_router.router)
+    response = TestClient(app).get("/alerts")
+    assert response.status_code == 500 and response.json()["message"] == "Failed to fetch alerts"
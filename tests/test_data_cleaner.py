@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import data_cleaner as cleaner_routes
+from app.services import data_cleaner
+
+
+def write_raw(path, rows=3000):
+    rng = np.random.default_rng(0)
+    # Few distinct values, so the file is full of duplicates spread across chunks
+    pd.DataFrame({
+        "CALENDAR_DATE": rng.choice(["01/Mar/24", "02/Mar/24"], rows),
+        "ROUTE": rng.choice(["100", "200", None], rows),
+        "DIRECTION": rng.choice(["Inbound", "N/A", None], rows),
+        "TRIP_POINT": rng.choice(["Mid Trip", "Trip Origin"], rows),
+        "TIMETABLE_HOUR_BAND": rng.choice(["07:00 to 08:00", "08:00 to 09:00"], rows),
+        "CAPACITY_BUCKET": rng.choice(["MANY_SEATS_AVAILABLE", "CRUSH_CAPACITY", "UNKNOWN"], rows),
+        "SUBURB": rng.choice(["Sydney", "N/A"], rows),
+        "IGNORED": np.arange(rows),
+    }).to_csv(path, index=False)
+
+
+def test_chunked_cleaning_drops_duplicates_across_the_whole_file(tmp_path):
+    raw, out = tmp_path / "raw.csv", tmp_path / "out"
+    out.mkdir()
+    write_raw(raw)
+
+    stats = data_cleaner.clean_file(str(raw), str(out), chunksize=257)
+    expected = data_cleaner.clean_chunk(
+        pd.read_csv(raw, dtype=str, usecols=lambda col: col in data_cleaner.CLEAN_COLUMNS)
+    ).drop_duplicates()
+    cleaned = pd.read_csv(out / "raw.csv", dtype=str)
+
+    assert stats["rows_in"] == 3000 and stats["rows_out"] == len(expected) == len(cleaned)
+    pd.testing.assert_frame_equal(cleaned, expected.astype(str).reset_index(drop=True))
+    assert not list(out.glob("*.tmp"))
+
+
+def test_row_hashes_report_and_remember_new_hashes():
+    seen = data_cleaner.RowHashes()
+    assert list(seen.add_new(np.array([9, 3, 7], dtype=np.uint64))) == [True, True, True]
+    assert list(seen.add_new(np.array([12, 7, 1, 9], dtype=np.uint64))) == [True, False, True, False]
+    assert list(seen.values) == [1, 3, 7, 9, 12]
+
+
+def test_workers_are_capped_at_the_cpu_count(tmp_path, monkeypatch):
+    used = []
+    monkeypatch.setattr(data_cleaner, "CPU_COUNT", 2)
+    monkeypatch.setattr(data_cleaner, "map_files", lambda fn, paths, workers: used.append(workers) or iter(()))
+    monkeypatch.setattr(data_cleaner, "raw_folder", str(tmp_path / "datasets"))
+    monkeypatch.setattr(data_cleaner, "output_folder", str(tmp_path / "processed"))
+
+    data_cleaner.clean_and_save_all(max_workers=5000)
+    assert used == [2]
+
+    app = FastAPI()
+    app.include_router(cleaner_routes.router)
+    response = TestClient(app).post("/clean-datasets", params={"workers": data_cleaner.CPU_COUNT + 10 ** 6})
+    assert response.status_code == 422
+
+
+def test_finished_jobs_are_evicted(monkeypatch):
+    monkeypatch.setattr(data_cleaner, "MAX_FINISHED_JOBS", 3)
+    monkeypatch.setattr(data_cleaner, "_jobs", {
+        f"old{i}": {"job_id": f"old{i}", "status": "completed", "finished_at": float(i)} for i in range(5)
+    })
+    monkeypatch.setattr(data_cleaner, "_run_job", lambda job_id, workers: None)
+
+    job = data_cleaner.start_cleaning_job()
+    assert sorted(data_cleaner._jobs) == sorted(["old3", "old4", job["job_id"]])
@@ -0,0 +1,53 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from app.models.feature_encoder import FeatureEncoder, ROUTE_FEATURE
+
+
+def training_frame():
+    return pd.DataFrame({
+        "ROUTE": ["100", "200", "100", "333", "200"],
+        "TRIP_POINT": ["Mid Trip", "Trip Origin", "Unknown", "Mid Trip", "Trip Destination"],
+        "TIMETABLE_HOUR_BAND": ["07:00 to 08:00", "08:00 to 09:00", "07:00 to 08:00", "Unknown", "21:00 to 22:00"],
+    })
+
+
+def get_dummies_features(df, route_codes):
+    # What prepare_features built before the encoder existed
+    X = pd.get_dummies(df[["TRIP_POINT", "TIMETABLE_HOUR_BAND"]])
+    X.insert(0, ROUTE_FEATURE, route_codes)
+    return X
+
+
+def test_training_frame_matches_get_dummies_in_one_byte_columns():
+    df = training_frame()
+    route_codes = np.array([0, 1, 0, 2, 1])
+    encoder = FeatureEncoder.fit(df)
+    X = encoder.encode_frame(df, route_codes)
+    expected = get_dummies_features(df, route_codes)
+
+    assert list(X.columns) == list(expected.columns) == encoder.feature_columns
+    assert (X.drop(columns=ROUTE_FEATURE).dtypes == np.uint8).all()
+    np.testing.assert_array_equal(X.to_numpy(), expected.to_numpy().astype(np.int64))
+
+
+def test_schema_round_trips_through_pickle_and_matches_inference_encoding():
+    df = training_frame()
+    route_codes = np.array([0, 1, 0, 2, 1])
+    encoder = pickle.loads(pickle.dumps(FeatureEncoder.fit(df)))
+    rebuilt = FeatureEncoder(encoder.feature_columns)
+
+    rows = df.to_dict("records")
+    rows[2]["TRIP_POINT"] = None  # filled as 'Unknown', like fillna at training time
+    for candidate in (encoder, rebuilt):
+        np.testing.assert_array_equal(candidate.encode_rows(rows, route_codes),
+                                      candidate.encode_frame(df, route_codes).to_numpy(np.float32))
+
+
+def test_unseen_categories_encode_as_all_zero_dummies():
+    encoder = FeatureEncoder.fit(training_frame())
+    matrix = encoder.encode_rows([{"TRIP_POINT": "Nowhere", "TIMETABLE_HOUR_BAND": "03:00 to 04:00"}], [7])
+    assert matrix.dtype == np.float32
+    assert matrix[0, 0] == 7 and not matrix[0, 1:].any()
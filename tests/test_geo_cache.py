@@ -0,0 +1,225 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from app.services import ors_isochrone_service, ors_matrix_service, ors_route_service
+from app.utils import geo_cache, http_client
+from app.utils.geo_cache import GeoCache
+
+
+class StubORS:
+    """Local stand-in for the ORS directions, isochrone and matrix endpoints, with fixed latency."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.requests = []
+        self.fail = False
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append((self.path, body))
+                time.sleep(stub.delay)
+                if stub.fail:
+                    status, payload = 503, {"error": "unavailable"}
+                elif "/directions/" in self.path:
+                    status, payload = 200, {"routes": [{"summary": {"distance": 1200.0, "duration": 300.0}}]}
+                elif "/isochrones/" in self.path:
+                    status, payload = 200, {"type": "FeatureCollection", "features": [], "range": body["range"]}
+                else:
+                    # Locations encode their index in the longitude: 151 + i / 1000
+                    index = [round((lon - 151) * 1000) for lon, _ in body["locations"]]
+                    durations = [[float(index[s] * 1000 + index[d]) if index[d] >= 0 else None
+                                  for d in body["destinations"]] for s in body["sources"]]
+                    distances = [[None if value is None else value * 10 for value in row] for row in durations]
+                    status, payload = 200, {"durations": durations, "distances": distances}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def ors(tmp_path, monkeypatch):
+    stub = StubORS()
+    cache = GeoCache(tmp_path / "ors_cache.sqlite3", ttl=3600)
+    for service in (ors_route_service, ors_isochrone_service, ors_matrix_service):
+        monkeypatch.setattr(service, "ORS_BASE_URL", stub.url)
+        monkeypatch.setattr(service, "ors_cache", cache)
+        monkeypatch.setattr(service, "ORS_API_KEY", "test-key")
+    monkeypatch.setattr(http_client, "RETRIES", 0)
+    monkeypatch.setattr(ors_matrix_service, "rate_limiter", ors_matrix_service.RateLimiter(per_minute=0))
+    stub.cache = cache
+    yield stub
+    cache.close()
+    stub.close()
+
+
+def test_nearby_coordinates_hit_the_cache(ors):
+    async def scenario():
+        results = [await ors_route_service.get_route_duration_and_distance([151.2093, -33.8688], [151.2153, -33.8568])]
+        start_time = time.perf_counter()
+        for i in range(9):
+            # Up to ~3 m away from the first request
+            jitter = (i % 3 - 1) * 0.00002
+            results.append(await ors_route_service.get_route_duration_and_distance(
+                [151.2093 + jitter, -33.8688], [151.2153, -33.8568 - jitter]
+            ))
+        return results, time.perf_counter() - start_time
+
+    results, cached_seconds = asyncio.run(scenario())
+    assert results[0] == {"distance_meters": 1200.0, "duration_minutes": 5.0}
+    assert all(result == results[0] for result in results)
+    assert len(ors.requests) == 1
+    assert cached_seconds < ors.delay * 9 / 2
+
+    stats = ors.cache.metrics()["kinds"]["route"]
+    assert stats["misses"] == 1 and stats["memory_hits"] == 9 and stats["hit_rate"] == 0.9
+    assert stats["saved_seconds"] >= ors.delay * 9 * 0.9
+
+
+def test_profile_range_and_location_are_part_of_the_key(ors):
+    async def scenario():
+        await ors_isochrone_service.get_isochrone(151.2093, -33.8688, 600, "foot-walking")
+        await ors_isochrone_service.get_isochrone(151.2093, -33.8688, 600, "foot-walking")
+        await ors_isochrone_service.get_isochrone(151.2093, -33.8688, 900, "foot-walking")
+        await ors_isochrone_service.get_isochrone(151.2093, -33.8688, 600, "cycling-regular")
+        await ors_isochrone_service.get_isochrone(151.2193, -33.8688, 600, "foot-walking")
+        coords = [[151.0, -33.8688], [151.001, -33.8568], [151.002, -33.9]]
+        await ors_matrix_service.get_matrix_durations_and_distances(coords)
+        return await ors_matrix_service.get_matrix_durations_and_distances(coords)
+
+    matrix = asyncio.run(scenario())
+    assert matrix["durations"] == [[1.0, 2.0]] and matrix["distances"] == [[10.0, 20.0]]
+    assert matrix["tiles"] == {"total": 1, "upstream": 0, "cached": 1}
+    assert len(ors.requests) == 5
+    assert ors.cache.metrics()["kinds"]["isochrone"]["memory_hits"] == 1
+
+
+def test_disk_tier_survives_restart_and_expires(ors, tmp_path, monkeypatch):
+    asyncio.run(ors_route_service.get_route_duration_and_distance([151.2, -33.8], [151.3, -33.9]))
+    ors.cache.close()
+
+    restarted = GeoCache(tmp_path / "ors_cache.sqlite3", ttl=3600)
+    monkeypatch.setattr(ors_route_service, "ors_cache", restarted)
+    result = asyncio.run(ors_route_service.get_route_duration_and_distance([151.2, -33.8], [151.3, -33.9]))
+    assert result["distance_meters"] == 1200.0
+    assert len(ors.requests) == 1 and restarted.metrics()["kinds"]["route"]["disk_hits"] == 1
+    restarted.close()
+
+    real_time = time.time
+    monkeypatch.setattr(geo_cache.time, "time", lambda: real_time() + 7200)
+    expired = GeoCache(tmp_path / "ors_cache.sqlite3", ttl=3600)
+    monkeypatch.setattr(ors_route_service, "ors_cache", expired)
+    asyncio.run(ors_route_service.get_route_duration_and_distance([151.2, -33.8], [151.3, -33.9]))
+    assert len(ors.requests) == 2
+    expired.close()
+
+
+def test_upstream_errors_are_not_cached(ors):
+    ors.fail = True
+
+    async def scenario():
+        return await asyncio.gather(*(ors_route_service.get_route_duration_and_distance([151.2, -33.8], [151.3, -33.9])
+                                      for _ in range(3)))
+
+    results = asyncio.run(scenario())
+    assert all(result["message"] == "ORS request failed" for result in results)
+    assert len(ors.requests) == 1  # concurrent callers still share the failed call
+
+    ors.fail = False
+    assert asyncio.run(ors_route_service.get_route_duration_and_distance([151.2, -33.8], [151.3, -33.9]))[
+        "distance_meters"] == 1200.0
+    assert len(ors.requests) == 2
+
+
+def test_matrix_planner_tiles_and_stitches(ors, monkeypatch):
+    monkeypatch.setattr(ors_matrix_service, "TILE_SIZE", 4)
+    monkeypatch.setattr(ors_matrix_service, "CONCURRENCY", 3)
+    coords = [[151 + i / 1000, -33.8] for i in range(12)]
+    coords.append([140.0, -33.8])  # unreachable in the stub
+    sources, destinations = [0, 2, 4, 6, 8, 10], list(range(1, 13))
+
+    async def scenario():
+        started = time.perf_counter()
+        first = await ors_matrix_service.get_matrix_durations_and_distances(coords, "driving-car", sources, destinations)
+        elapsed = time.perf_counter() - started
+        again = await ors_matrix_service.plan_matrix(coords, sources, destinations)
+        return first, elapsed, again
+
+    first, elapsed, again = asyncio.run(scenario())
+    expected = [[float(s * 1000 + d) for d in destinations[:-1]] + [None] for s in sources]
+    assert first["durations"] == expected
+    assert first["sources"] == sources and first["destinations"] == destinations
+    # 6 x 12 in 4 x 4 tiles
+    assert first["tiles"] == {"total": 6, "upstream": 6, "cached": 0}
+    assert len(ors.requests) == 6
+    assert all(len(body["sources"]) <= 4 and len(body["destinations"]) <= 4 for _, body in ors.requests)
+    assert elapsed < ors.delay * 6 * 0.9  # tiles ran concurrently
+
+    assert again["tiles"]["cached"] == 6 and len(ors.requests) == 6
+    assert again["durations"].shape == (6, 12) and np.isnan(again["durations"][:, -1]).all()
+
+
+def test_matrix_rate_limit_spaces_upstream_calls(ors, monkeypatch):
+    monkeypatch.setattr(ors_matrix_service, "TILE_SIZE", 1)
+    monkeypatch.setattr(ors_matrix_service, "rate_limiter", ors_matrix_service.RateLimiter(per_minute=600))
+    coords = [[151 + i / 1000, -33.8] for i in range(4)]
+
+    started = time.perf_counter()
+    result = asyncio.run(ors_matrix_service.plan_matrix(coords, [0], [1, 2, 3]))
+    assert result["tiles"]["upstream"] == 3
+    assert time.perf_counter() - started >= 0.2  # three calls at most one per 0.1 s
+
+
+def test_matrix_failure_returns_error_payload(ors):
+    ors.fail = True
+    coords = [[151 + i / 1000, -33.8] for i in range(3)]
+    result = asyncio.run(ors_matrix_service.get_matrix_durations_and_distances(coords))
+    assert result["status"] == 503 and result["message"] == "ORS matrix request failed"
+
+
+def test_matrix_endpoint_rejects_oversized_and_malformed_requests(ors, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.routes import ors_matrix
+
+    monkeypatch.setattr(ors_matrix_service, "TILE_SIZE", 2)
+    monkeypatch.setattr(ors_matrix_service, "MAX_TILES", 4)
+    monkeypatch.setattr(ors_matrix_service, "MAX_LOCATIONS", 8)
+    app = FastAPI()
+    app.include_router(ors_matrix.router)
+    client = TestClient(app)
+    coords = [[151 + i / 1000, -33.8] for i in range(8)]
+
+    # 4 sources x 4 destinations is 2 x 2 tiles
+    response = client.post("/ors/matrix", json={"coordinates": coords, "sources": [0, 1, 2, 3],
+                                                "destinations": [4, 5, 6, 7]})
+    assert response.status_code == 200 and response.json()["tiles"]["total"] == 4
+
+    # Every location to every other is 4 x 4 tiles
+    response = client.post("/ors/matrix", json={"coordinates": coords, "sources": list(range(8))})
+    assert response.status_code == 400 and "16 upstream calls" in response.json()["detail"]
+    assert client.post("/ors/matrix", json={"coordinates": coords + [[151.0, -33.9]]}).status_code == 400
+    assert client.post("/ors/matrix", json={"coordinates": [[151.0, -33.8], [151.0]]}).status_code == 422
+    assert client.post("/ors/matrix", json={"coordinates": [[151.0, -33.8, 0.0], [151.0, -33.9]]}).status_code == 422
+    assert len(ors.requests) == 4
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import historical_crowd_service as historical
+from app.utils import parquet_cache
+from app.utils.streaming_aggregator import refresh_partials
+
+
+def write_dataset(path, seed, rows=500):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "ROUTE": rng.choice(["100", "200", "0333", None], rows),
+        "CAPACITY_BUCKET": rng.choice(["MANY_SEATS_AVAILABLE", "STANDING_ROOM_ONLY", None], rows),
+        "SUBURB": "Sydney",
+    }).to_csv(path, index=False)
+
+
+def scan_counts(folder, route):
+    # What get_average_crowd computed by scanning every file on each request
+    df = pd.concat([pd.read_csv(path, usecols=["ROUTE", "CAPACITY_BUCKET"], dtype=str)
+                    for path in sorted(folder.glob("*.csv"))])
+    df = df.dropna(subset=["ROUTE", "CAPACITY_BUCKET"])
+    return df[df["ROUTE"] == route]["CAPACITY_BUCKET"].value_counts().to_dict()
+
+
+@pytest.fixture
+def datasets(tmp_path, monkeypatch):
+    folder = tmp_path / "datasets"
+    folder.mkdir()
+    monkeypatch.setattr(parquet_cache, "cache_root", tmp_path / "parquet_cache")
+    monkeypatch.setattr(historical, "data_dir", folder)
+    monkeypatch.setattr(historical, "index_file", tmp_path / "insight_outputs" / "historical_crowd_index.json")
+    monkeypatch.setattr(historical, "CHUNK_SIZE", 64)
+    monkeypatch.setattr(historical, "_index", None)
+    return folder
+
+
+def test_index_matches_a_full_scan(datasets):
+    write_dataset(datasets / "a.csv", 0)
+    write_dataset(datasets / "b.csv", 1)
+
+    for route in ["100", "0333"]:
+        result = historical.get_average_crowd(route)
+        assert result["crowd_levels"] == scan_counts(datasets, route)
+        assert result["total_records"] == sum(result["crowd_levels"].values())
+    assert historical.get_available_bus_ids() == ["0333", "100", "200"]
+    assert "error" in historical.get_average_crowd("999")
+
+
+def test_refresh_only_counts_new_files(datasets, monkeypatch):
+    write_dataset(datasets / "a.csv", 0)
+    historical.get_historical_index()
+
+    counted = []
+    count_file = historical._count_file
+    monkeypatch.setattr(historical, "_count_file", lambda path: counted.append(path) or count_file(path))
+    write_dataset(datasets / "b.csv", 1)
+    historical.refresh_historical_index()
+
+    assert [p.rsplit("/", 1)[-1] for p in counted] == ["b.csv"]
+    assert historical.get_average_crowd("200")["crowd_levels"] == scan_counts(datasets, "200")
+
+
+def test_index_saved_by_another_process_is_picked_up(datasets):
+    write_dataset(datasets / "a.csv", 0)
+    first = historical.get_historical_index()
+    assert historical.get_historical_index() is first
+
+    # Another worker's refresh rewrites the index file; this process never re-counts
+    write_dataset(datasets / "b.csv", 1)
+    refresh_partials(historical.index_file, datasets, historical._count_file)
+
+    assert historical.get_average_crowd("200")["crowd_levels"] == scan_counts(datasets, "200")
+    assert historical.get_historical_index() is historical.get_historical_index()
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.utils import http_client
+
+
+class StubUpstream:
+    """Answers with the queued status codes (then 200), tracking concurrency."""
+
+    def __init__(self, statuses=(), delay=0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    status = stub.statuses.pop(0) if stub.statuses else 200
+                time.sleep(stub.delay)
+                body = b'{"ok": true}'
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with lock:
+                    stub.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(http_client, "BACKOFF_SECONDS", 0.01)
+
+
+def test_retries_transient_statuses_then_succeeds():
+    upstream = StubUpstream(statuses=[503, 502])
+    try:
+        response = asyncio.run(http_client.get(upstream.url, retries=2))
+        assert response.status_code == 200
+        assert upstream.requests == 3
+    finally:
+        upstream.close()
+
+
+def test_returns_last_response_when_retries_run_out():
+    upstream = StubUpstream(statuses=[503, 503, 503])
+    try:
+        response = asyncio.run(http_client.get(upstream.url, retries=1))
+        assert response.status_code == 503
+        assert upstream.requests == 2
+    finally:
+        upstream.close()
+
+
+def test_connection_errors_raise_after_retries():
+    upstream = StubUpstream()
+    url = upstream.url
+    upstream.close()
+    with pytest.raises(httpx.TransportError):
+        asyncio.run(http_client.get(url, retries=1))
+
+
+def test_per_host_limit_caps_concurrent_requests(monkeypatch):
+    monkeypatch.setattr(http_client, "PER_HOST_LIMIT", 3)
+    upstream = StubUpstream(delay=0.05)
+
+    async def burst():
+        responses = await asyncio.gather(*(http_client.get(upstream.url) for _ in range(12)))
+        await http_client.close_client()
+        return responses
+
+    try:
+        responses = asyncio.run(burst())
+        assert all(r.status_code == 200 for r in responses)
+        assert upstream.max_in_flight <= 3
+    finally:
+        upstream.close()
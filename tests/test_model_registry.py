@@ -0,0 +1,200 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import LabelEncoder
+
+from app.models import model_registry
+from app.models.feature_encoder import FeatureEncoder
+
+
+def training_frame(rows=400):
+    rng = np.random.default_rng(0)
+    hours = rng.integers(0, 24, rows)
+    return pd.DataFrame({
+        "ROUTE": rng.choice(["100", "200", "333"], rows),
+        "TRIP_POINT": rng.choice(["Mid Trip", "Trip Origin"], rows),
+        "TIMETABLE_HOUR_BAND": [f"{h:02d}:00 to {(h + 1) % 24:02d}:00" for h in hours],
+        "CAPACITY_BUCKET_ENCODED": hours // 6,
+    })
+
+
+def write_artifacts(model_dir, version, df=None):
+    """Train a small model the way prepare_features does and write the artifacts train_models writes."""
+    df = training_frame() if df is None else df
+    route_encoder = LabelEncoder().fit(np.append(df["ROUTE"].unique(), model_registry.UNKNOWN_ROUTE))
+    encoder = FeatureEncoder.fit(df)
+    X = encoder.encode_frame(df, route_encoder.transform(df["ROUTE"]))
+    model = LogisticRegression(max_iter=500).fit(X, df["CAPACITY_BUCKET_ENCODED"])
+
+    joblib.dump(route_encoder, os.path.join(model_dir, "route_label_encoder.pkl"))
+    joblib.dump(encoder, os.path.join(model_dir, "feature_encoder.pkl"))
+    joblib.dump(model, os.path.join(model_dir, "best_model.pkl"))
+    joblib.dump(encoder.feature_columns, os.path.join(model_dir, "feature_columns.pkl"))
+    with open(os.path.join(model_dir, "model_version.txt"), "w") as f:
+        f.write(f"Last retrained: {version}")
+    # Distinct mtimes even on filesystems with coarse timestamps
+    stat = os.stat(os.path.join(model_dir, "model_version.txt"))
+    os.utime(os.path.join(model_dir, "model_version.txt"), ns=(stat.st_atime_ns, stat.st_mtime_ns + version * 10 ** 9))
+    return model
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    for name, filename in [("model_path", "best_model.pkl"), ("feature_path", "feature_columns.pkl"),
+                           ("route_encoder_path", "route_label_encoder.pkl"),
+                           ("feature_encoder_path", "feature_encoder.pkl"), ("version_path", "model_version.txt")]:
+        monkeypatch.setattr(model_registry, name, str(tmp_path / filename))
+    monkeypatch.setattr(model_registry, "_bundle", None)
+    monkeypatch.setattr(model_registry, "_failed_signature", None)
+    monkeypatch.setattr(model_registry, "_stats",
+                        dict(model_registry._stats, loads=0, swaps=0, failed_loads=0, unseen_route_hits=0))
+    return tmp_path
+
+
+def test_bundle_is_loaded_once_and_reused(model_dir):
+    write_artifacts(model_dir, 1)
+    first = model_registry.get_model_bundle()
+    assert model_registry.get_model_bundle() is first
+    assert model_registry.get_registry_stats()["loads"] == 1
+
+
+def test_new_artifacts_are_hot_swapped(model_dir):
+    write_artifacts(model_dir, 1)
+    first = model_registry.get_model_bundle()
+    write_artifacts(model_dir, 2)
+
+    second = model_registry.refresh()
+    assert second is not first and second.version == "Last retrained: 2"
+    stats = model_registry.get_registry_stats()
+    assert stats["loads"] == 2 and stats["swaps"] == 1
+
+
+def test_failed_reload_keeps_serving_the_last_good_model(model_dir):
+    write_artifacts(model_dir, 1)
+    first = model_registry.get_model_bundle()
+
+    # A broken retrain: new version file, unreadable model
+    (model_dir / "best_model.pkl").write_bytes(b"not a pickle")
+    version_file = model_dir / "model_version.txt"
+    version_file.write_text("Last retrained: broken")
+    os.utime(version_file, ns=(0, os.stat(version_file).st_mtime_ns + 10 ** 10))
+
+    assert model_registry.get_model_bundle() is first
+    assert model_registry.get_model_bundle() is first
+    assert model_registry.get_registry_stats()["failed_loads"] == 1
+
+    # The next good set of artifacts is picked up
+    write_artifacts(model_dir, 3)
+    assert model_registry.get_model_bundle().version == "Last retrained: 3"
+
+
+def test_first_load_failure_raises(model_dir):
+    with pytest.raises(FileNotFoundError):
+        model_registry.get_model_bundle()
+
+
+def test_batch_prediction_matches_single_predictions(model_dir):
+    from app.models.bus_occupancy_prediction_model import predict, predict_batch
+
+    write_artifacts(model_dir, 1)
+    rows = [{"ROUTE": route, "TRIP_POINT": trip_point, "TIMETABLE_HOUR_BAND": f"{h:02d}:00 to {h + 1:02d}:00",
+             "TIMETABLE_TIME": f"{h:02d}:00", "ACTUAL_TIME": f"{h:02d}:00"}
+            for route in ["100", "333", "never-seen"] for trip_point in ["Mid Trip", "Somewhere"]
+            for h in range(0, 23, 4)]
+
+    assert predict_batch(rows) == [predict(row) for row in rows]
+
+
+def test_predict_each_skips_only_the_failing_rows(model_dir, monkeypatch):
+    from app.models import bus_occupancy_prediction_model as occupancy
+
+    def fake_predict_batch(rows):
+        if len(rows) > 1 or rows[0]["ROUTE"] == "bad":
+            raise ValueError("bad route")
+        return [int(rows[0]["ROUTE"])]
+
+    monkeypatch.setattr(occupancy, "predict_batch", fake_predict_batch)
+    rows = [{"ROUTE": "1"}, {"ROUTE": "bad"}, {"ROUTE": "3"}]
+    assert occupancy.predict_each(rows) == [1, None, 3]
+    assert occupancy.predict_each(rows, default=-1) == [1, -1, 3]
+
+
+def test_batch_endpoint_rejects_oversized_batches(model_dir, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.routes import predict as predict_routes
+
+    write_artifacts(model_dir, 1)
+    monkeypatch.setattr(predict_routes, "MAX_BATCH_ROWS", 2)
+    app = FastAPI()
+    app.include_router(predict_routes.router)
+    client = TestClient(app)
+    row = {"ROUTE": "100", "TIMETABLE_HOUR_BAND": "07:00 to 08:00", "TRIP_POINT": "Mid Trip",
+           "TIMETABLE_TIME": "07:00", "ACTUAL_TIME": "07:00"}
+
+    response = client.post("/predict-crowd/batch", json={"rows": [row, row]})
+    assert response.status_code == 200 and len(response.json()["predicted_capacity_bucket_encoded"]) == 2
+    assert client.post("/predict-crowd/batch", json={"rows": [row] * 3}).status_code == 400
+
+
+def test_unseen_routes_map_to_unknown_without_touching_the_encoder(model_dir):
+    write_artifacts(model_dir, 1)
+    bundle = model_registry.get_model_bundle()
+    classes_before = list(bundle.route_encoder.classes_)
+
+    codes, unseen = bundle.encode_routes(["333", "999", "100", "999"])
+    assert list(codes) == [*bundle.route_encoder.transform(["333"]), bundle.unknown_route_code,
+                           *bundle.route_encoder.transform(["100"]), bundle.unknown_route_code]
+    assert bundle.unknown_route_code == list(bundle.route_encoder.classes_).index(model_registry.UNKNOWN_ROUTE)
+    assert unseen == ["999", "999"]
+    assert list(bundle.route_encoder.classes_) == classes_before
+
+
+def test_legacy_encoder_without_unknown_maps_past_the_last_class(model_dir):
+    write_artifacts(model_dir, 1)
+    joblib.dump(LabelEncoder().fit(["100", "200", "333"]), model_dir / "route_label_encoder.pkl")
+    bundle = model_registry.get_model_bundle()
+    assert bundle.encode_routes(["new"])[0][0] == 3
+
+
+@pytest.mark.parametrize("out_of_core", [False, True])
+def test_training_writes_every_artifact_before_the_version_file(model_dir, tmp_path, monkeypatch, out_of_core):
+    from app.models import bus_occupancy_prediction_model as occupancy
+    from app.models import streaming_training
+
+    df = training_frame(rows=600)
+    csv_path = tmp_path / "training.csv"
+    df.to_csv(csv_path, index=False)
+    monkeypatch.setattr(occupancy, "load_all_data", lambda: df)
+    monkeypatch.setattr(streaming_training, "training_sources", lambda *args: [(str(csv_path), None)])
+    monkeypatch.setattr(streaming_training, "XGB_ROUNDS", 5)
+    monkeypatch.setattr(occupancy, "model_dir", str(model_dir))
+    monkeypatch.setattr(occupancy, "report_dir", str(tmp_path / "reports"))
+    monkeypatch.setattr(occupancy, "route_encoder_path", model_registry.route_encoder_path)
+    monkeypatch.setattr(occupancy, "feature_encoder_path", model_registry.feature_encoder_path)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "reports").mkdir()
+
+    save_training_results = occupancy.save_training_results
+
+    def checked_save(*args):
+        # Nothing the registry loads is written while training is still running
+        assert not os.path.exists(model_registry.route_encoder_path)
+        assert not os.path.exists(model_registry.feature_encoder_path)
+        save_training_results(*args)
+
+    monkeypatch.setattr(occupancy, "save_training_results", checked_save)
+    occupancy.train_models(out_of_core=out_of_core)
+
+    version_mtime = os.stat(model_registry.version_path).st_mtime_ns
+    for path in [model_registry.model_path, model_registry.feature_path, model_registry.route_encoder_path,
+                 model_registry.feature_encoder_path]:
+        assert os.stat(path).st_mtime_ns <= version_mtime
+    bundle = model_registry.get_model_bundle()
+    assert bundle.version.startswith("Last retrained:")
+    assert occupancy.predict({"ROUTE": "100", "TRIP_POINT": "Mid Trip", "TIMETABLE_HOUR_BAND": "13:00 to 14:00",
+                              "TIMETABLE_TIME": "13:00", "ACTUAL_TIME": "13:00"}) in set(df["CAPACITY_BUCKET_ENCODED"])
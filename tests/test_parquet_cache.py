@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from app.utils import parquet_cache
+
+
+@pytest.fixture
+def dataset_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(parquet_cache, "base_dir", tmp_path)
+    monkeypatch.setattr(parquet_cache, "cache_root", tmp_path / "parquet_cache")
+    folder = tmp_path / "datasets"
+    folder.mkdir()
+    for k in range(2):
+        pd.DataFrame({
+            "ROUTE": [f"{k}{i % 7}" for i in range(50)],
+            "CAPACITY_BUCKET": ["Few seats available", None] * 25,
+            "TIMETABLE_TIME": [f"{i % 24:02d}:00" for i in range(50)],
+        }).to_csv(folder / f"part{k}.csv", index=False)
+    return folder
+
+
+def read_csv_directly(path, columns):
+    return pd.read_csv(path, dtype=str, usecols=columns)
+
+
+def test_csv_fallback_reads_in_chunks_and_matches_pandas(dataset_folder, monkeypatch):
+    monkeypatch.setattr(parquet_cache, "CHUNK_SIZE", 7)
+    path = str(dataset_folder / "part0.csv")
+    expected = read_csv_directly(path, ["ROUTE", "CAPACITY_BUCKET"])
+
+    # Without a Parquet part callers get the same object columns as read_csv
+    pd.testing.assert_frame_equal(parquet_cache.read_columns(path, ["ROUTE", "CAPACITY_BUCKET"]), expected)
+    chunks = list(parquet_cache.iter_chunks(path, ["ROUTE", "CAPACITY_BUCKET"], 20))
+    assert [len(chunk) for chunk in chunks] == [20, 20, 10]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+
+def test_parquet_parts_match_the_csv_and_are_refreshed_on_change(dataset_folder):
+    assert parquet_cache.convert_folder("datasets") == {"converted": 2, "skipped": 0}
+    assert parquet_cache.convert_folder("datasets") == {"converted": 0, "skipped": 2}
+
+    frames = dict(parquet_cache.iter_frames("datasets", ["ROUTE", "TIMETABLE_TIME"]))
+    for path, df in frames.items():
+        expected = read_csv_directly(path, ["ROUTE", "TIMETABLE_TIME"])
+        pd.testing.assert_frame_equal(df.astype(object), expected.astype(object))
+
+    pd.DataFrame({"ROUTE": ["new"], "CAPACITY_BUCKET": ["x"], "TIMETABLE_TIME": ["01:00"]}).to_csv(
+        dataset_folder / "part1.csv", index=False)
+    df = parquet_cache.read_columns(str(dataset_folder / "part1.csv"), ["ROUTE"])
+    assert list(df["ROUTE"]) == ["new"]
+    assert parquet_cache.convert_folder("datasets") == {"converted": 1, "skipped": 1}
@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from google.transit import gtfs_realtime_pb2
+
+from app.routes import bus, live_buses
+from app.services import tfnsw_bus
+from app.services.realtime_feed import FeedPoller
+from app.utils import http_client
+
+
+def make_feed(version, vehicles):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.timestamp = 1700000000 + version
+    for vehicle_id, trip_id, lat, lon in vehicles:
+        entity = feed.entity.add()
+        entity.id = vehicle_id
+        entity.vehicle.vehicle.id = vehicle_id
+        entity.vehicle.vehicle.label = f"Bus {vehicle_id}"
+        entity.vehicle.trip.trip_id = trip_id
+        entity.vehicle.trip.route_id = "2441_100"
+        entity.vehicle.position.latitude = lat
+        entity.vehicle.position.longitude = lon
+        entity.vehicle.timestamp = 1700000000
+    return feed.SerializeToString()
+
+
+class StubFeed:
+    """Local stand-in for the TfNSW vehiclepos endpoint, with ETag support."""
+
+    def __init__(self):
+        self.version = 1
+        self.body = make_feed(1, [("v1", "t1", -33.87, 151.21)])
+        self.requests = 0
+        self.not_modified = 0
+        self.fail = False
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                if stub.fail:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                etag = f'"v{stub.version}"'
+                if self.headers.get("If-None-Match") == etag:
+                    stub.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/x-protobuf")
+                self.send_header("Content-Length", str(len(stub.body)))
+                self.end_headers()
+                self.wfile.write(stub.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/vehiclepos/buses"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def publish(self, vehicles):
+        self.version += 1
+        self.body = make_feed(self.version, vehicles)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_feed():
+    stub = StubFeed()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def poller(stub_feed, monkeypatch):
+    poller = FeedPoller("test vehicle positions", stub_feed.url, tfnsw_bus.parse_vehicle_positions, interval=0.05)
+    monkeypatch.setattr(tfnsw_bus, "TFNSW_API_KEY", "test-key")
+    monkeypatch.setattr(tfnsw_bus, "vehicle_positions", poller)
+    monkeypatch.setattr(tfnsw_bus, "get_trip_route_map", lambda: {
+        "t1": {"route_short_name": "100", "route_long_name": "City - Bondi"}
+    })
+    monkeypatch.setattr(http_client, "RETRIES", 0)
+    return poller
+
+
+@pytest.fixture
+def client(poller):
+    app = FastAPI()
+    app.include_router(bus.router)
+    app.include_router(live_buses.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def poll(poller):
+    return asyncio.run(poller.poll_once())
+
+
+def test_conditional_requests_skip_unchanged_feed(stub_feed, poller):
+    assert poll(poller) is True
+    first = poller.snapshot
+    assert poll(poller) is False
+    assert stub_feed.not_modified == 1
+    assert poller.snapshot is first
+
+    stub_feed.publish([("v1", "t1", -33.88, 151.22), ("v2", "t2", -33.9, 151.2)])
+    assert poll(poller) is True
+    assert len(poller.snapshot["live_buses"]) == 2
+
+
+def test_endpoints_share_one_upstream_fetch(stub_feed, client):
+    for _ in range(20):
+        positions = client.get("/getBusPositions")
+        live = client.get("/live_buses")
+        assert positions.status_code == 200 and live.status_code == 200
+        assert "Age" in positions.headers and "Age" in live.headers
+
+    assert stub_feed.requests == 1
+    bus_row = positions.json()["buses"][0]
+    assert bus_row["route_short"] == "100"
+    assert bus_row["label"] == "Bus v1"
+    assert live.json()["live_buses"][0]["route_id"] == "2441_100"
+
+
+def test_background_poller_picks_up_new_feed(stub_feed, poller):
+    async def scenario():
+        poller.start()
+        deadline = time.time() + 5
+        while poller.snapshot is None and time.time() < deadline:
+            await asyncio.sleep(0.01)
+
+        stub_feed.publish([("v1", "t1", -33.88, 151.22), ("v2", "t2", -33.9, 151.2), ("v3", "t3", -33.8, 151.1)])
+        while len(poller.snapshot["live_buses"]) != 3 and time.time() < deadline:
+            await asyncio.sleep(0.01)
+        await poller.stop()
+
+    asyncio.run(scenario())
+    assert len(poller.snapshot["live_buses"]) == 3
+    assert stub_feed.requests >= 2
+    assert not poller.running
+
+
+def test_nearby_and_bbox_queries(stub_feed, client):
+    stub_feed.publish([("v1", "t1", -33.8700, 151.2100), ("v2", "t2", -33.8710, 151.2110), ("v3", "t3", -33.95, 151.0)])
+
+    nearby = client.get("/buses/nearby", params={"lat": -33.8700, "lon": 151.2100, "radius": 500})
+    assert nearby.status_code == 200 and "Age" in nearby.headers
+    assert [b["label"] for b in nearby.json()["buses"]] == ["Bus v1", "Bus v2"]
+    assert nearby.json()["buses"][0]["distance_m"] < 1  # float32 positions
+
+    bbox = client.get("/buses/bbox", params={"min_lat": -34.0, "min_lon": 150.9, "max_lat": -33.9, "max_lon": 151.1})
+    assert [b["label"] for b in bbox.json()["buses"]] == ["Bus v3"]
+    assert stub_feed.requests == 1
+
+
+def test_upstream_failure_keeps_serving_last_snapshot(stub_feed, poller, client):
+    assert poll(poller) is True
+    stub_feed.fail = True
+    assert poll(poller) is False
+    assert poller.last_error is not None
+
+    response = client.get("/live_buses")
+    assert response.status_code == 200
+    assert len(response.json()["live_buses"]) == 1
+
+
+def test_no_snapshot_returns_error(stub_feed, client):
+    stub_feed.fail = True
+    assert client.get("/live_buses").status_code == 500
+    assert client.get("/getBusPositions").json()["error"]
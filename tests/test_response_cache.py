@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.routes import trip
+from app.utils.response_cache import ResponseCache, estimate_size
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = ResponseCache("test", ttl=60, max_bytes=10_000)
+    cache.put("a", {"x": 1})
+    now[0] += 59
+    assert cache.get("a") == {"x": 1}
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats["expired"] == 1 and cache.bytes == 0
+
+
+def test_byte_budget_evicts_least_recently_used():
+    value = {"payload": "x" * 100}
+    cache = ResponseCache("test", ttl=60, max_bytes=estimate_size(value) * 3)
+    for key in "abc":
+        cache.put(key, value)
+    cache.get("a")
+    cache.put("d", value)
+    assert [key for key in "abcd" if cache.get(key) is not None] == ["a", "c", "d"]
+    assert cache.stats["evictions"] == 1 and cache.bytes <= cache.max_bytes
+
+    cache.put("huge", {"payload": "x" * 10_000})
+    assert cache.get("huge") is None and len(cache) == 3
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = ResponseCache("test", ttl=60, max_bytes=10_000)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"journeys": []}
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(10)))
+        results.append(await cache.get_or_fetch("k", fetch))
+        return results
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1 and all(result == {"journeys": []} for result in results)
+    assert cache.metrics()["misses"] == 1 and cache.stats["coalesced"] == 9 and cache.stats["hits"] == 1
+
+
+def test_failed_fetch_is_not_cached():
+    cache = ResponseCache("test", ttl=60, max_bytes=10_000)
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_fetch("k", failing) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(scenario()))
+    assert len(cache) == 0 and cache.stats["errors"] == 1
+
+
+def test_cancelling_the_first_caller_does_not_fail_the_others():
+    cache = ResponseCache("test", ttl=60, max_bytes=10_000)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"journeys": []}
+
+    async def scenario():
+        first = asyncio.ensure_future(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0)
+        others = [asyncio.ensure_future(cache.get_or_fetch("k", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        first.cancel()
+        results = await asyncio.gather(*others)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return results
+
+    assert asyncio.run(scenario()) == [{"journeys": []}] * 3
+    assert len(calls) == 1 and cache.get("k") == {"journeys": []} and cache.stats["coalesced"] == 3
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    calls = []
+
+    async def fake_fetch(origin, destination, date, time_):
+        calls.append((origin, destination, date, time_))
+        await asyncio.sleep(0.05)
+        if origin == "bad":
+            raise trip.TripPlannerError("Trip planner returned 503")
+        return {"journeys": [[{"mode": "Bus", "from": origin, "to": destination}]]}
+
+    monkeypatch.setattr(trip, "fetch_journeys", fake_fetch)
+    monkeypatch.setattr(trip, "trip_cache", ResponseCache("trip planner", ttl=60, max_bytes=1_000_000))
+    return calls
+
+
+def test_trip_endpoint_normalizes_and_coalesces(planner):
+    app = FastAPI()
+    app.include_router(trip.router)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            bodies = [
+                {"origin": "200060", "destination": "2000338", "date": "2025-03-10", "time": "08:30"},
+                {"origin": " 200060", "destination": "2000338", "date": "20250310", "time": "0830"},
+                {"origin": "200060", "destination": "2000338", "date": "20250310", "time": "08:30:45"},
+            ]
+            responses = await asyncio.gather(*(client.post("/trip", json=body) for body in bodies * 3))
+            failed = await client.post("/trip", json={"origin": "bad", "destination": "x"})
+            stats = (await client.get("/trip/cache-stats")).json()
+            return responses, failed, stats
+
+    responses, failed, stats = asyncio.run(scenario())
+    assert all(response.status_code == 200 for response in responses)
+    assert responses[0].json() == {"journeys": [[{"mode": "Bus", "from": "200060", "to": "2000338"}]]}
+    assert planner[0] == ("200060", "2000338", "20250310", "0830")
+    assert len(planner) == 2
+    assert failed.status_code == 500 and failed.json() == {"error": "Failed to fetch journey"}
+    assert stats["misses"] == 2 and stats["coalesced"] == 8 and stats["entries"] == 1
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.models import generate_route_lookup as lookup
+
+TIME_TOLERANCE = lookup.TIME_TOLERANCE
+
+
+def reference_match(stop_times_df, trip_to_route, route_to_name, keys_df):
+    """The row-by-row matcher generate_route_lookup used before vectorizing, kept as the spec."""
+    stop_times_df = stop_times_df.copy()
+    stop_times_df["departure_minutes"] = stop_times_df["departure_time"].astype(str).str.split(":").apply(
+        lambda x: int(x[0]) * 60 + int(x[1]) if len(x) >= 2 and x[0].isdigit() else -1
+    )
+    stop_times_df["stop_sequence"] = pd.to_numeric(stop_times_df["stop_sequence"], errors="coerce")
+    stop_times_df.dropna(subset=["stop_sequence"], inplace=True)
+    stop_times_dict = {stop_id: group.copy() for stop_id, group in stop_times_df.groupby("stop_id")}
+
+    def match_route(stop_id, timetable_time):
+        target_min = lookup.time_to_minutes(timetable_time)
+        group = stop_times_dict.get(str(stop_id))
+        if target_min is None or group is None or group.empty:
+            return None, None
+        candidates = group[
+            (group["departure_minutes"] >= target_min - TIME_TOLERANCE) &
+            (group["departure_minutes"] <= target_min + TIME_TOLERANCE)
+        ]
+        if not candidates.empty:
+            closest_row = candidates.loc[candidates["stop_sequence"].idxmin()]
+        else:
+            group["abs_diff"] = (group["departure_minutes"] - target_min).abs()
+            closest_row = group.loc[group["abs_diff"].idxmin()]
+        route_id = trip_to_route.get(closest_row["trip_id"])
+        return route_id, route_to_name.get(route_id)
+
+    return [match_route(stop, time) for stop, time in keys_df.itertuples(index=False)]
+
+
+def random_gtfs(seed, rows=4000, stops=40, trips=300):
+    rng = np.random.default_rng(seed)
+    minutes = rng.integers(0, 27 * 60, rows)
+    departure = [f"{m // 60:02d}:{m % 60:02d}:00" for m in minutes]
+    # A few departures the parser has to reject, and unusable stop sequences
+    for i in rng.choice(rows, 20, replace=False):
+        departure[i] = rng.choice(["xx:10:00", "", "7"])
+    sequence = rng.integers(1, 60, rows).astype(object)
+    sequence[rng.choice(rows, 15, replace=False)] = "n/a"
+    stop_times_df = pd.DataFrame({
+        "trip_id": [f"T{t}" for t in rng.integers(0, trips, rows)],
+        # Coarse times and few stops, so windows hold several departures and ties happen
+        "stop_id": [str(2000 + s) for s in rng.integers(0, stops, rows)],
+        "departure_time": departure,
+        "stop_sequence": sequence,
+    })
+    trip_to_route = {f"T{t}": f"R{t % 25}" for t in range(trips)}
+    route_to_name = {f"R{r}": f"Route {r}" for r in range(25)}
+
+    key_minutes = rng.integers(0, 27 * 60, 3000)
+    keys_df = pd.DataFrame({
+        "TRANSIT_STOP": [str(2000 + s) for s in rng.integers(0, stops + 5, 3000)],
+        "TIMETABLE_TIME": [f"{m // 60}:{m % 60:02d}" for m in key_minutes],
+    })
+    keys_df.loc[rng.choice(3000, 30, replace=False), "TIMETABLE_TIME"] = "bad"
+    return stop_times_df, trip_to_route, route_to_name, keys_df
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("workers,shards", [(1, 1), (2, 5)])
+def test_vectorized_matcher_follows_the_row_by_row_rules(seed, workers, shards):
+    stop_times_df, trip_to_route, route_to_name, keys_df = random_gtfs(seed)
+    departures = lookup.build_stop_departures(stop_times_df, shards=shards)
+    matched = lookup.match_routes(keys_df, departures, trip_to_route, route_to_name, workers=workers)
+
+    expected = reference_match(stop_times_df, trip_to_route, route_to_name, keys_df)
+    actual = list(zip(matched["ROUTE"].where(matched["ROUTE"].notna(), None),
+                      matched["matched_route_name"].where(matched["matched_route_name"].notna(), None)))
+    assert actual == expected
+    assert sum(route is not None for route, _ in actual) > 2000
@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.models import fast_route_mapper as mapper
+from app.models import route_lookup_index
+
+
+def write_lookup(path, seed=0):
+    rng = np.random.default_rng(seed)
+    keys = {(str(3000 + s), f"{m // 60:02d}:{m % 60:02d}") for s, m in
+            zip(rng.integers(0, 30, 2000), rng.integers(0, 24 * 60, 2000))}
+    lookup = pd.DataFrame(sorted(keys), columns=["TRANSIT_STOP", "TIMETABLE_TIME"])
+    lookup["ROUTE"] = [f"R{i % 17}" if i % 11 else None for i in range(len(lookup))]
+    lookup["matched_route_name"] = lookup["ROUTE"].map(lambda r: f"Route {r[1:]}" if r else None)
+    lookup.to_csv(path, index=False)
+    return lookup
+
+
+def write_dataset(path, lookup, seed, rows=1500):
+    rng = np.random.default_rng(seed)
+    picked = lookup.sample(rows, replace=True, random_state=seed).reset_index(drop=True)
+    df = pd.DataFrame({
+        "ROUTE": rng.choice(["100", "200"], rows),
+        "TRANSIT_STOP": picked["TRANSIT_STOP"],
+        "TIMETABLE_TIME": picked["TIMETABLE_TIME"],
+        "CAPACITY_BUCKET": rng.choice(["MANY_SEATS_AVAILABLE", "CRUSH_CAPACITY", "?"], rows),
+    })
+    # Keys the lookup does not have
+    misses = rng.choice(rows, 100, replace=False)
+    df.loc[misses[:50], "TRANSIT_STOP"] = "9999"
+    df.loc[misses[50:], "TIMETABLE_TIME"] = "bad"
+    df.to_csv(path, index=False)
+
+
+def merge_join(dataset_path, lookup_path):
+    # The merge-based mapper the binary index replaced
+    lookup_df = pd.read_csv(lookup_path, dtype=str)
+    df = pd.read_csv(dataset_path, dtype=str)
+    df["dataset_route_id"] = df["ROUTE"]
+    df = df.drop(columns=["ROUTE"]).merge(lookup_df, on=["TRANSIT_STOP", "TIMETABLE_TIME"], how="left")
+    df["CAPACITY_BUCKET_ENCODED"] = df["CAPACITY_BUCKET"].map(mapper.CAPACITY_BUCKET_CODES).fillna(-1).astype(int)
+    return df
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    datasets, output = tmp_path / "datasets", tmp_path / "processed_with_route"
+    datasets.mkdir()
+    for name, value in [("LOOKUP_PATH", tmp_path / "lookup.csv"), ("DATASET_FOLDER", datasets),
+                        ("OUTPUT_FOLDER", output), ("UNMATCHED_LOG_PATH", output / "unmatched_route_log.txt"),
+                        ("UNMATCHED_FOLDER", output / "unmatched"), ("MANIFEST_PATH", output / "manifest.json"),
+                        ("SUMMARY_PATH", output / "summary.json")]:
+        monkeypatch.setattr(mapper, name, str(value))
+    index_dir = str(tmp_path / "lookup_index")
+    monkeypatch.setattr(mapper, "load_index", lambda path: route_lookup_index.load_index(path, index_dir))
+    monkeypatch.setattr(mapper, "CHUNK_SIZE", 200)
+    return tmp_path
+
+
+def test_indexed_join_matches_the_merge(workspace):
+    lookup = write_lookup(mapper.LOOKUP_PATH)
+    write_dataset(os.path.join(mapper.DATASET_FOLDER, "a.csv"), lookup, 1)
+    mapper.main()
+
+    mapped = pd.read_csv(os.path.join(mapper.OUTPUT_FOLDER, "a.csv"), dtype=str)
+    expected = merge_join(os.path.join(mapper.DATASET_FOLDER, "a.csv"), mapper.LOOKUP_PATH)
+    expected.to_csv(workspace / "expected.csv", index=False)
+    pd.testing.assert_frame_equal(mapped, pd.read_csv(workspace / "expected.csv", dtype=str))
+    unmatched = pd.read_csv(mapper.UNMATCHED_LOG_PATH, dtype=str)
+    assert len(unmatched) == expected["ROUTE"].isna().sum() >= 100
+
+
+def test_times_are_joined_by_minute(tmp_path):
+    # Unlike the exact-string merge, '5:30' and '05:30' (or '05:30:00') are the same key
+    pd.DataFrame({"TRANSIT_STOP": ["3000", "3001"], "TIMETABLE_TIME": ["05:30", "7:05"],
+                  "ROUTE": ["R1", "R2"], "matched_route_name": ["Route 1", "Route 2"]}).to_csv(
+        tmp_path / "lookup.csv", index=False)
+    index = route_lookup_index.load_index(str(tmp_path / "lookup.csv"), str(tmp_path / "index"))
+
+    codes = index.lookup(["3000", "3000", "3000", "3001", "3001", "3001"],
+                         ["5:30", "05:30", "05:30:00", "07:05", "7:06", None])
+    routes, _ = index.route_columns(codes)
+    assert list(routes) == ["R1", "R1", "R1", "R2", None, None]
+
+
+def test_only_new_or_changed_files_are_remapped(workspace, monkeypatch):
+    lookup = write_lookup(mapper.LOOKUP_PATH)
+    for k, name in enumerate(["a.csv", "b.csv"]):
+        write_dataset(os.path.join(mapper.DATASET_FOLDER, name), lookup, k)
+    mapped = []
+    map_file = mapper.map_file
+    monkeypatch.setattr(mapper, "map_file",
+                        lambda source, *args: mapped.append(os.path.basename(source)) or map_file(source, *args))
+
+    mapper.main()
+    assert sorted(mapped) == ["a.csv", "b.csv"]
+
+    # Touched but identical content, a changed file and a new one
+    os.utime(os.path.join(mapper.DATASET_FOLDER, "a.csv"))
+    write_dataset(os.path.join(mapper.DATASET_FOLDER, "b.csv"), lookup, 5)
+    write_dataset(os.path.join(mapper.DATASET_FOLDER, "c.csv"), lookup, 6)
+    mapped.clear()
+    mapper.main()
+    assert sorted(mapped) == ["b.csv", "c.csv"]
+
+    # Removing a file drops its unmatched rows from the combined log
+    os.remove(os.path.join(mapper.DATASET_FOLDER, "c.csv"))
+    mapped.clear()
+    mapper.main()
+    assert mapped == []
+    unmatched = pd.read_csv(mapper.UNMATCHED_LOG_PATH, dtype=str)
+    expected = sum(merge_join(os.path.join(mapper.DATASET_FOLDER, name), mapper.LOOKUP_PATH)["ROUTE"].isna().sum()
+                   for name in ["a.csv", "b.csv"])
+    assert len(unmatched) == expected
+
+    # A new lookup remaps everything
+    write_lookup(mapper.LOOKUP_PATH, seed=1)
+    mapper.main()
+    assert sorted(mapped) == ["a.csv", "b.csv"]
@@ -0,0 +1,30 @@
+import numpy as np
+
+from app.services.route_performance_service import delay_minutes, times_to_minutes
+
+
+def to_minutes(t):
+    # The per-value parser route performance used before vectorizing
+    try:
+        h, m = map(int, str(t).split(":"))
+        return h * 60 + m
+    except Exception:
+        return None
+
+
+def test_vectorized_parser_agrees_with_the_scalar_one_on_clock_times():
+    values = [f"{h}:{m:02d}" for h in range(24) for m in range(0, 60, 7)]
+    values += [f"{h:02d}:{m:02d}" for h in range(24) for m in range(0, 60, 11)]
+    expected = [to_minutes(value) for value in values]
+    np.testing.assert_array_equal(times_to_minutes(values), np.array(expected, dtype=float))
+
+
+def test_unparseable_times_become_nan():
+    values = ["", None, "7", "ab:cd", "12:3", "123:45", "07-30", float("nan")]
+    assert np.isnan(times_to_minutes(values)).all()
+
+
+def test_delays_wrap_across_midnight():
+    delays = delay_minutes(["23:55", "00:05", "08:00", "bad"], ["00:04", "23:58", "08:12", "08:00"])
+    np.testing.assert_array_equal(delays[:3], [9, -7, 12])
+    assert np.isnan(delays[3])
@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+
+from app.utils.spatial_index import GridIndex, haversine_m
+
+
+def random_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # Roughly the Sydney metro area
+    return rng.uniform(-34.2, -33.5, n), rng.uniform(150.6, 151.4, n)
+
+
+def test_nearby_matches_brute_force():
+    lats, lons = random_points(5000)
+    index = GridIndex(lats, lons)
+    for lat, lon, radius in [(-33.87, 151.21, 500), (-33.9, 151.0, 2500), (-34.19, 150.61, 800), (-30.0, 150.0, 1000)]:
+        indices, distances = index.nearby(lat, lon, radius)
+        expected = np.flatnonzero(haversine_m(lat, lon, lats, lons) <= radius)
+        assert sorted(indices.tolist()) == sorted(expected.tolist())
+        assert np.all(np.diff(distances) >= 0)
+
+
+def test_nearby_limit_keeps_nearest():
+    lats, lons = random_points(2000, seed=1)
+    index = GridIndex(lats, lons)
+    all_indices, all_distances = index.nearby(-33.87, 151.21, 5000)
+    indices, distances = index.nearby(-33.87, 151.21, 5000, limit=5)
+    assert indices.tolist() == all_indices[:5].tolist()
+    assert distances.tolist() == all_distances[:5].tolist()
+
+
+def test_bbox_matches_brute_force():
+    lats, lons = random_points(5000, seed=2)
+    index = GridIndex(lats, lons)
+    box = (-33.95, 151.05, -33.8, 151.25)
+    expected = np.flatnonzero((lats >= box[0]) & (lats <= box[2]) & (lons >= box[1]) & (lons <= box[3]))
+    assert sorted(index.within_bbox(*box).tolist()) == expected.tolist()
+    assert len(index.within_bbox(10, 10, 11, 11)) == 0
+
+
+def test_empty_index():
+    index = GridIndex([], [])
+    assert len(index.nearby(-33.87, 151.21, 500)[0]) == 0
+    assert len(index.within_bbox(-34, 151, -33, 152)) == 0
+
+
+def test_query_is_sub_millisecond():
+    lats, lons = random_points(10000, seed=3)
+    index = GridIndex(lats, lons)
+    start = time.perf_counter()
+    for _ in range(200):
+        index.nearby(-33.87, 151.21, 500)
+    assert (time.perf_counter() - start) / 200 < 0.001
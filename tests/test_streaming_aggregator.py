@@ -0,0 +1,193 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services import forecast_service, route_performance_service
+from app.utils import parquet_cache, streaming_aggregator
+from app.utils.file_manifest import load_manifest
+
+
+def write_processed(path, seed, rows=400):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2024-03-04") + pd.to_timedelta(rng.integers(0, 14, rows), unit="D")
+    pd.DataFrame({
+        "CALENDAR_DATE": dates.strftime("%d/%b/%y"),
+        "TIMETABLE_HOUR_BAND": rng.choice(["07:00 to 08:00", "08:00 to 09:00", "17:00 to 18:00"], rows),
+        "CAPACITY_BUCKET_ENCODED": rng.choice(["0", "1", "2", "3", "bad"], rows),
+    }).to_csv(path, index=False)
+
+
+def write_dataset(path, seed, rows=400):
+    rng = np.random.default_rng(seed)
+    minutes = rng.integers(0, 24 * 60, rows)
+    actual = (minutes + rng.integers(-5, 20, rows)) % (24 * 60)
+    pd.DataFrame({
+        "ROUTE": rng.choice(["100", "200", "0333", "M30"], rows),
+        "TIMETABLE_TIME": [f"{m // 60}:{m % 60:02d}" for m in minutes],
+        "ACTUAL_TIME": [f"{m // 60:02d}:{m % 60:02d}" for m in actual],
+        "CAPACITY_BUCKET": rng.choice(["MANY_SEATS_AVAILABLE", "CRUSH_CAPACITY", "N/A"], rows),
+        "TRANSIT_STOP_DESCRIPTION": rng.choice(["Stop A", "Stop B", "Stop C"], rows),
+    }).to_csv(path, index=False)
+
+
+def expected_forecast(folder):
+    df = pd.concat([pd.read_csv(path, dtype=str) for path in sorted(folder.glob("*.csv"))])
+    df["weekday"] = pd.to_datetime(df["CALENDAR_DATE"], format="%d/%b/%y").dt.day_name()
+    df["value"] = pd.to_numeric(df["CAPACITY_BUCKET_ENCODED"], errors="coerce")
+    df = df.dropna(subset=["value"])
+    weekly = df.groupby("weekday")["value"].mean().round(2).to_dict()
+    bands = df.groupby(["weekday", "TIMETABLE_HOUR_BAND"])["value"].mean().round(2)
+    return weekly, {day: bands[day].to_dict() for day in weekly}
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    processed, datasets = tmp_path / "processed_with_route", tmp_path / "datasets"
+    processed.mkdir()
+    datasets.mkdir()
+    monkeypatch.setattr(parquet_cache, "cache_root", tmp_path / "parquet_cache")
+    for module, folder in ((forecast_service, processed), (route_performance_service, datasets)):
+        monkeypatch.setattr(module, "data_dir", folder)
+        monkeypatch.setattr(module, "cache_file", tmp_path / "out" / f"{module.__name__}.json")
+        monkeypatch.setattr(module, "partials_file", tmp_path / "out" / f"{module.__name__}_partials.json")
+        monkeypatch.setattr(module, "_cached", None)
+    monkeypatch.setattr(streaming_aggregator, "CHUNK_SIZE", 64)
+    return processed, datasets
+
+
+def count_calls(monkeypatch, module):
+    calls = []
+    aggregate = module._aggregate_file
+
+    def counted(path):
+        calls.append(path.rsplit("/", 1)[-1])
+        return aggregate(path)
+
+    monkeypatch.setattr(module, "_aggregate_file", counted)
+    return calls
+
+
+def test_forecast_partials_match_a_full_scan_and_only_new_files_are_read(folders, monkeypatch):
+    processed, _ = folders
+    write_processed(processed / "a.csv", 0)
+    write_processed(processed / "b.csv", 1)
+    calls = count_calls(monkeypatch, forecast_service)
+
+    result = forecast_service.get_weekly_forecast()
+    weekly, bands = expected_forecast(processed)
+    assert {day: value for day, value in result["weekly_forecast"].items() if value} == weekly
+    assert result["time_band_forecast"] == bands
+    assert sorted(calls) == ["a.csv", "b.csv"]
+
+    write_processed(processed / "c.csv", 2)
+    result = forecast_service.get_weekly_forecast()
+    assert calls[2:] == ["c.csv"]
+    assert result["time_band_forecast"] == expected_forecast(processed)[1]
+
+
+def test_route_performance_incremental_merge_matches_a_full_recompute(folders, monkeypatch):
+    _, datasets = folders
+    write_dataset(datasets / "a.csv", 0)
+    route_performance_service.get_route_performance()
+    write_dataset(datasets / "b.csv", 1)
+    incremental = route_performance_service.get_route_performance()
+
+    route_performance_service.partials_file.unlink()
+    monkeypatch.setattr(route_performance_service, "_cached", None)
+    route_performance_service.cache_file.unlink()
+    assert route_performance_service.get_route_performance() == incremental
+
+
+def test_failed_files_are_recorded_and_not_rescanned(folders, monkeypatch):
+    processed, _ = folders
+    write_processed(processed / "good.csv", 0)
+    (processed / "broken.csv").write_text("SOMETHING_ELSE\n1\n")
+    calls = count_calls(monkeypatch, forecast_service)
+
+    forecast_service.get_weekly_forecast()
+    monkeypatch.setattr(forecast_service, "_cached", None)
+    forecast_service.get_weekly_forecast()
+
+    assert sorted(calls) == ["broken.csv", "good.csv"]
+    assert "broken.csv" in load_manifest(forecast_service.partials_file)["failed"]
+
+
+def test_a_file_that_changes_and_then_fails_drops_its_old_partial(folders, tmp_path, monkeypatch):
+    processed, _ = folders
+    write_processed(processed / "good.csv", 0)
+    write_processed(processed / "changing.csv", 1)
+    forecast_service.get_weekly_forecast()
+
+    (processed / "changing.csv").write_text("SOMETHING_ELSE\n1\n")
+    partials, changed = streaming_aggregator.refresh_partials(
+        forecast_service.partials_file, processed, forecast_service._aggregate_file
+    )
+    assert changed and sorted(partials) == ["good.csv"]
+
+    only_good = tmp_path / "only_good"
+    only_good.mkdir()
+    write_processed(only_good / "good.csv", 0)
+    monkeypatch.setattr(forecast_service, "_cached", None)
+    assert forecast_service.get_weekly_forecast()["time_band_forecast"] == expected_forecast(only_good)[1]
+
+
+def test_concurrent_first_requests_share_one_refresh(folders, monkeypatch):
+    processed, _ = folders
+    write_processed(processed / "a.csv", 0)
+    calls = count_calls(monkeypatch, forecast_service)
+    aggregate = forecast_service._aggregate_file
+    monkeypatch.setattr(forecast_service, "_aggregate_file", lambda path: time.sleep(0.2) or aggregate(path))
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(forecast_service.get_weekly_forecast()))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["a.csv"]
+    assert len(results) == 6 and all(result == results[0] for result in results)
+    assert not list((forecast_service.cache_file.parent).glob("*.tmp"))
+
+
+@pytest.mark.parametrize("module", [forecast_service, route_performance_service])
+def test_chunked_aggregation_does_not_depend_on_chunk_size(folders, monkeypatch, module):
+    processed, datasets = folders
+    folder = processed if module is forecast_service else datasets
+    (write_processed if module is forecast_service else write_dataset)(folder / "a.csv", 3, rows=1000)
+
+    partials = []
+    for chunksize in (1000, 97, 13):
+        monkeypatch.setattr(streaming_aggregator, "CHUNK_SIZE", chunksize)
+        partials.append(module._aggregate_file(str(folder / "a.csv")))
+    assert partials[0] and partials[1] == partials[0] and partials[2] == partials[0]
+
+
+def write_stops(path, route_stops):
+    pd.DataFrame({
+        "ROUTE": [route for route, _ in route_stops],
+        "TIMETABLE_TIME": "08:00",
+        "ACTUAL_TIME": "08:05",
+        "CAPACITY_BUCKET": "MANY_SEATS_AVAILABLE",
+        "TRANSIT_STOP_DESCRIPTION": [stop for _, stop in route_stops],
+    }).to_csv(path, index=False)
+
+
+def test_tied_stops_go_to_the_one_seen_first(folders):
+    _, datasets = folders
+    # Route 100: tie across files, "Stop A" first. Route 200: tie inside one
+    # file, "Stop B" first but in a later chunk (CHUNK_SIZE is 64) than padding.
+    write_stops(datasets / "a.csv", [("100", "Stop A"), ("100", "Stop C")] + [("300", "Pad")] * 70
+                + [("200", "Stop B"), ("200", "Stop A")])
+    write_stops(datasets / "b.csv", [("100", "Stop C"), ("100", "Stop A"), ("200", "Stop A"), ("200", "Stop B")])
+
+    result = route_performance_service.get_route_performance()["route_performance"]
+
+    df = pd.concat([pd.read_csv(path, dtype=str) for path in sorted(datasets.glob("*.csv"))])
+    baseline = {route: group["TRANSIT_STOP_DESCRIPTION"].value_counts().idxmax() for route, group in df.groupby("ROUTE")}
+    assert {route: stats["most_common_stop"] for route, stats in result.items()} == baseline
+    assert result["100"]["most_common_stop"] == "Stop A" and result["200"]["most_common_stop"] == "Stop B"
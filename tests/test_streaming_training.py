@@ -0,0 +1,105 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from app.models import streaming_training
+from app.models.feature_encoder import FeatureEncoder
+from app.models.streaming_training import CategoricalBooster, build_coded_dataset, split_indices
+
+
+def write_sources(tmp_path, rows=3000, files=3):
+    rng = np.random.default_rng(0)
+    sources = []
+    for k in range(files):
+        hours = rng.integers(0, 24, rows)
+        df = pd.DataFrame({
+            "ROUTE": rng.choice(["100", "200", "0011", "N/A", "", None], rows),
+            "TRIP_POINT": rng.choice(["Mid Trip", "Trip Origin", None], rows),
+            "TIMETABLE_HOUR_BAND": [f"{h:02d}:00 to {(h + 1) % 24:02d}:00" for h in hours],
+            # Learnable from the hour band, with some unparseable labels to drop
+            "CAPACITY_BUCKET_ENCODED": np.where(rng.random(rows) < 0.05, "bad", (hours // 6).astype(str)),
+        })
+        path = tmp_path / f"file{k}.csv"
+        df.to_csv(path, index=False)
+        sources.append((str(path), None))
+    return sources
+
+
+def expected_frame(sources):
+    # What load_all_data + prepare_features keep
+    df = pd.concat([pd.read_csv(path, dtype=str, keep_default_na=True) for path, _ in sources], ignore_index=True)
+    df = df[df["ROUTE"].notna() & (df["ROUTE"] != "N/A") & (df["ROUTE"] != "")].fillna("Unknown")
+    df["CAPACITY_BUCKET_ENCODED"] = pd.to_numeric(df["CAPACITY_BUCKET_ENCODED"], errors="coerce")
+    return df.dropna(subset=["CAPACITY_BUCKET_ENCODED"])
+
+
+def test_codes_match_in_memory_encoding(tmp_path):
+    sources = write_sources(tmp_path)
+    dataset = build_coded_dataset(sources, "Unknown", chunksize=700)
+    df = expected_frame(sources)
+
+    assert len(dataset) == len(df) and dataset.codes.dtype == np.uint8
+    assert list(dataset.route_encoder.classes_) == sorted(set(df["ROUTE"]) | {"Unknown"})
+    np.testing.assert_array_equal(dataset.codes[:, 0], dataset.route_encoder.transform(df["ROUTE"]))
+    np.testing.assert_array_equal(dataset.classes[dataset.labels], df["CAPACITY_BUCKET_ENCODED"].astype(int))
+
+    one_hot = FeatureEncoder.fit(df)
+    encoder = dataset.feature_encoder
+    assert encoder.layout == "ordinal"
+    assert list(encoder.category_positions["TRIP_POINT"]) == [
+        name[len("TRIP_POINT_"):] for name in one_hot.feature_columns if name.startswith("TRIP_POINT_")
+    ]
+    np.testing.assert_array_equal(encoder.encode_frame(df, dataset.codes[:, 0]).to_numpy(),
+                                  dataset.codes.astype(np.float32))
+
+
+def test_index_splits_are_disjoint_and_stratified(tmp_path):
+    dataset = build_coded_dataset(write_sources(tmp_path), "Unknown")
+    train, val, test = split_indices(dataset.labels)
+    assert train.dtype == np.uint32
+    assert len(train) + len(val) + len(test) == len(dataset)
+    assert len(np.union1d(np.union1d(train, val), test)) == len(dataset)
+    overall = np.bincount(dataset.labels) / len(dataset)
+    np.testing.assert_allclose(np.bincount(dataset.labels[val]) / len(val), overall, atol=0.01)
+
+
+def test_external_memory_falls_back_without_ext_mem_quantile_matrix(tmp_path, monkeypatch):
+    # xgboost 2.0.x, as pinned in requirements.txt, has no ExtMemQuantileDMatrix
+    monkeypatch.delattr(xgb, "ExtMemQuantileDMatrix", raising=False)
+    monkeypatch.setattr(streaming_training, "XGB_ROUNDS", 10)
+    dataset = build_coded_dataset(write_sources(tmp_path), "Unknown")
+    train, val, _ = split_indices(dataset.labels)
+
+    model = streaming_training.train_booster(dataset, train, val, cache_dir=str(tmp_path), external_memory=True)
+    accuracy = (streaming_training.predict_indices(model, dataset, val) == dataset.classes[dataset.labels[val]]).mean()
+    assert accuracy > 0.95
+    assert not [p for p in tmp_path.iterdir() if p.is_dir()]
+
+
+def test_booster_trains_from_batches_and_predicts_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming_training, "XGB_ROUNDS", 10)
+    dataset = build_coded_dataset(write_sources(tmp_path), "Unknown")
+    train, val, _ = split_indices(dataset.labels)
+
+    for external_memory in (False, True):
+        model = streaming_training.train_booster(dataset, train, val, cache_dir=str(tmp_path),
+                                                 external_memory=external_memory)
+        accuracy = (streaming_training.predict_indices(model, dataset, val, batch_rows=500)
+                    == dataset.classes[dataset.labels[val]]).mean()
+        assert accuracy > 0.95
+    assert not [p for p in tmp_path.iterdir() if p.is_dir()]  # external memory pages cleaned up
+
+    model = pickle.loads(pickle.dumps(model))
+    assert isinstance(model, CategoricalBooster)
+    encoder = dataset.feature_encoder
+    rows = [
+        {"ROUTE": "100", "TRIP_POINT": "Mid Trip", "TIMETABLE_HOUR_BAND": "13:00 to 14:00"},
+        {"ROUTE": "100", "TRIP_POINT": None, "TIMETABLE_HOUR_BAND": "02:00 to 03:00"},
+        {"ROUTE": "100", "TRIP_POINT": "never seen", "TIMETABLE_HOUR_BAND": "20:00 to 21:00"},
+    ]
+    route_codes = dataset.route_encoder.transform(["100"] * 3)
+    features = encoder.to_frame(encoder.encode_rows(rows, route_codes))
+    assert np.isnan(features["TRIP_POINT"].iloc[2])
+    assert model.predict(features).tolist() == [2, 0, 3]
@@ -0,0 +1,43 @@
+import pandas as pd
+
+from app.utils.gtfs_static_loader import TripRouteMap
+
+
+def gtfs_frames():
+    routes = pd.DataFrame({
+        "route_id": ["2441_100", "2441_200", "2509_M30"],
+        "route_short_name": ["100", "200", None],
+        "route_long_name": ["City - Bondi", "Chatswood - Bondi", "Mosman - Sydenham"],
+    })
+    trips = pd.DataFrame({
+        "trip_id": [f"{i}.T2.1-100" for i in range(500)] + ["orphan", "ünïcode.1"],
+        "route_id": ["2441_100", "2441_200", "2509_M30", "2441_100", "2441_200"] * 100 + ["9999_X", "2509_M30"],
+    })
+    return trips, routes
+
+
+def test_matches_merged_dict_mapping():
+    trips, routes = gtfs_frames()
+    expected = trips.merge(routes, on="route_id")[["trip_id", "route_short_name", "route_long_name"]]
+    expected = expected.fillna("").set_index("trip_id").to_dict(orient="index")
+
+    trip_map = TripRouteMap.from_frames(trips, routes)
+    assert len(trip_map) == len(expected)
+    for trip_id, info in expected.items():
+        assert trip_map.get(trip_id) == info
+        assert trip_map[trip_id] == info
+    assert "orphan" not in trip_map
+    assert trip_map.get("orphan", {}) == {}
+
+
+def test_round_trips_through_npz(tmp_path):
+    trips, routes = gtfs_frames()
+    trip_map = TripRouteMap.from_frames(trips, routes)
+    path = tmp_path / "trip_route_map.npz"
+    trip_map.save(path, source=[1.0, 2.0])
+
+    loaded, source = TripRouteMap.load(path)
+    assert source == [1.0, 2.0]
+    assert len(loaded) == len(trip_map)
+    assert loaded.get("ünïcode.1") == {"route_short_name": "", "route_long_name": "Mosman - Sydenham"}
+    assert loaded.get("7.T2.1-100") == trip_map.get("7.T2.1-100")
@@ -0,0 +1,106 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from google.transit import gtfs_realtime_pb2
+
+from app.routes import trip_updates
+from app.services import trip_updates_service
+from app.services.realtime_feed import FeedPoller
+from app.services.trip_updates_service import TripUpdateStore, trip_updates_delta
+
+
+def make_feed(trips):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.timestamp = int(time.time())
+    for trip_id, route_id, delays in trips:
+        entity = feed.entity.add()
+        entity.id = trip_id
+        entity.trip_update.trip.trip_id = trip_id
+        entity.trip_update.trip.route_id = route_id
+        for sequence, delay in enumerate(delays, start=1):
+            stop = entity.trip_update.stop_time_update.add()
+            stop.stop_sequence = sequence
+            stop.stop_id = f"20{sequence:02d}"
+            stop.arrival.delay = delay
+    return feed.SerializeToString()
+
+
+def test_every_stop_delay_is_kept():
+    snapshot = TripUpdateStore().apply(make_feed([("t1", "r1", [60, 120, -30])]))
+    entry = snapshot["trips"]["t1"]
+    assert entry["delay_seconds"] == 60
+    assert [stop["arrival_delay"] for stop in entry["stops"]] == [60, 120, -30]
+    assert [stop["stop_id"] for stop in entry["stops"]] == ["2001", "2002", "2003"]
+    assert entry["stops"][0]["departure_delay"] is None
+
+
+def test_delta_returns_only_changed_and_removed_trips():
+    store = TripUpdateStore()
+    first = store.apply(make_feed([("t1", "r1", [60]), ("t2", "r1", [0]), ("t3", "r2", [30])]))
+    unchanged = store.apply(make_feed([("t1", "r1", [60]), ("t2", "r1", [0]), ("t3", "r2", [30])]))
+    assert unchanged["version"] == first["version"]
+    assert unchanged["trips"]["t1"] is first["trips"]["t1"]
+
+    second = store.apply(make_feed([("t1", "r1", [90]), ("t3", "r2", [30]), ("t4", "r2", [5])]))
+    delta = trip_updates_delta(second, since=first["version"])
+    assert not delta["full"] and delta["version"] == second["version"]
+    assert sorted(entry["trip_id"] for entry in delta["trips"]) == ["t1", "t4"]
+    assert delta["removed"] == ["t2"]
+
+    routed = trip_updates_delta(second, since=first["version"], route="r2")
+    assert [entry["trip_id"] for entry in routed["trips"]] == ["t4"] and routed["removed"] == []
+
+    assert trip_updates_delta(second, since=second["version"])["trips"] == []
+
+
+def test_unknown_or_expired_version_gets_full_resync():
+    store = TripUpdateStore(history=2)
+    first = store.apply(make_feed([("t1", "r1", [0])]))
+    for delay in (10, 20, 30):
+        latest = store.apply(make_feed([("t1", "r1", [delay]), ("t2", "r2", [0])]))
+
+    for since in (first["version"], 0, latest["version"] + 1):
+        delta = trip_updates_delta(latest, since=since)
+        assert delta["full"]
+        assert sorted(entry["trip_id"] for entry in delta["trips"]) == ["t1", "t2"]
+    assert [entry["trip_id"] for entry in trip_updates_delta(latest, route="r2")["trips"]] == ["t2"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = TripUpdateStore()
+    poller = FeedPoller("test trip updates", "http://127.0.0.1:9/unused", store.apply, interval=30)
+    poller.snapshot = store.apply(make_feed([("t1", "r1", [60, 90]), ("t2", "r2", [0])]))
+    poller.fetched_at = time.time()
+    monkeypatch.setattr(trip_updates_service, "TFNSW_API_KEY", "test-key")
+    monkeypatch.setattr(trip_updates_service, "trip_updates", poller)
+
+    app = FastAPI()
+    app.include_router(trip_updates.router)
+    with TestClient(app) as client:
+        client.store, client.poller = store, poller
+        yield client
+
+
+def test_endpoint_keeps_list_format_and_serves_deltas(client):
+    listing = client.get("/trip-updates")
+    assert listing.status_code == 200 and "Age" in listing.headers
+    assert listing.json() == [
+        {"trip_id": "t1", "route_id": "r1", "start_time": "", "start_date": "", "delay_seconds": 60},
+        {"trip_id": "t2", "route_id": "r2", "start_time": "", "start_date": "", "delay_seconds": 0},
+    ]
+
+    full = client.get("/trip-updates", params={"route": "r1"}).json()
+    assert full["full"] and [entry["trip_id"] for entry in full["trips"]] == ["t1"]
+
+    client.poller.snapshot = client.store.apply(make_feed([("t1", "r1", [60, 120]), ("t2", "r2", [0])]))
+    delta = client.get("/trip-updates", params={"since": full["version"]}).json()
+    assert not delta["full"]
+    assert [entry["trip_id"] for entry in delta["trips"]] == ["t1"]
+    assert delta["trips"][0]["stops"][1]["arrival_delay"] == 120
+
+    assert client.get("/trip-updates/t2").json()["stops"][0]["arrival_delay"] == 0
+    assert client.get("/trip-updates/missing").status_code == 404
@@ -0,0 +1,70 @@
+import time
+import threading
+
+from app.services import warmup
+from app.utils import gtfs_static_loader
+
+
+def test_concurrent_first_loads_share_one_build(monkeypatch):
+    builds = []
+
+    def slow_build():
+        builds.append(1)
+        time.sleep(0.2)
+        return {"trip": {"route_short_name": "100"}}
+
+    monkeypatch.setattr(gtfs_static_loader, "_trip_route_map_cache", None)
+    monkeypatch.setattr(gtfs_static_loader, "_build_trip_route_map", slow_build)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gtfs_static_loader.load_trip_route_map()))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert len(results) == 8 and all(result is results[0] for result in results)
+
+
+def test_warmup_loads_components_in_parallel(monkeypatch):
+    monkeypatch.setattr(warmup, "WARMUP_RETRIES", 0)
+    monkeypatch.setattr(warmup, "COMPONENTS", {
+        "slow_a": lambda: time.sleep(0.3),
+        "slow_b": lambda: time.sleep(0.3),
+        "broken": lambda: 1 / 0
+    })
+    monkeypatch.setattr(warmup, "_status", {name: {"status": "pending"} for name in warmup.COMPONENTS})
+
+    ready, state, components = warmup.get_readiness()
+    assert not ready and state == "warming_up" and components["slow_a"]["status"] == "pending"
+
+    start_time = time.perf_counter()
+    warmup.run_warmup()
+    assert time.perf_counter() - start_time < 0.55
+
+    # The broken component gave up, so the service is ready but degraded rather than stuck on 503
+    ready, state, components = warmup.get_readiness()
+    assert ready and state == "degraded"
+    assert components["slow_a"]["status"] == "ready" and components["slow_a"]["seconds"] >= 0.3
+    assert components["broken"]["status"] == "failed" and "division" in components["broken"]["error"]
+
+
+def test_failed_components_are_retried(monkeypatch):
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FileNotFoundError("gtfs_data/trips.txt")
+
+    monkeypatch.setattr(warmup, "WARMUP_RETRIES", 2)
+    monkeypatch.setattr(warmup, "WARMUP_RETRY_DELAY", 0)
+    monkeypatch.setattr(warmup, "COMPONENTS", {"flaky": flaky})
+    monkeypatch.setattr(warmup, "_status", {"flaky": {"status": "pending"}})
+
+    warmup.run_warmup()
+    ready, state, components = warmup.get_readiness()
+    assert ready and state == "ready"
+    assert len(attempts) == 3 and components["flaky"]["attempt"] == 3